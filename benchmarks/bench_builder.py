@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: environment builder scaling.                                              #
+#                                                                                        #
+#  Builds synthetic estates of 3, 100 and 1,000 environments and reports wall time and  #
+#  peak traced memory. Per-environment cost should stay flat as the estate grows.       #
+#                                                                                        #
+#  CloudFormation caps a template at 500 resources, so every environment is rendered    #
+#  into its own template here, the way large estates are split into stacks.             #
+##########################################################################################
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc.builder import build_environment  # noqa: E402
+from cfvpc.spec import synthetic_estate  # noqa: E402
+from troposphere import Template  # noqa: E402
+
+
+def generate(estate):
+    templates = []
+    for spec in estate.environments:
+        t = Template()
+        build_environment(t, spec)
+        templates.append(t.to_dict())
+    return templates
+
+
+def measure(count):
+    estate = synthetic_estate(count)
+
+    start = time.perf_counter()
+    generate(estate)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    generate(estate)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", nargs="*", type=int, default=[3, 100, 1000])
+    args = parser.parse_args()
+
+    print("%8s %10s %12s %12s %12s" % ("envs", "time (s)", "ms/env", "peak (MiB)", "KiB/env"))
+    for count in args.sizes:
+        elapsed, peak = measure(count)
+        print("%8d %10.3f %12.3f %12.2f %12.1f" % (
+            count, elapsed, elapsed * 1000 / count, peak / 2**20, peak / 1024 / count,
+        ))
+
+
+if __name__ == "__main__":
+    main()
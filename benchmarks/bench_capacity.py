@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: capacity planning over synthetic estates.                                 #
+#                                                                                        #
+#  Plans subnet sizes for estates of 100 to 10,000 VPCs under a fixed workload, the     #
+#  what-if loop the planner is meant for: gathering the subnet columns, the per-subnet  #
+#  and per-VPC math, and turning the result into report rows. Uses numpy when it is     #
+#  installed, plain lists otherwise; the header says which.                             #
+##########################################################################################
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc import capacity  # noqa: E402
+from cfvpc.spec import synthetic_estate  # noqa: E402
+
+WORKLOAD = capacity.Workload(
+    growth=1.5,
+    tiers={"private": {"db": 12, "cache": 6}, "public": {"alb": 8}, "protected": {"app": 48, "lambda": 150}},
+)
+
+
+def measure(estate, growth):
+    workload = capacity.Workload(growth, WORKLOAD.tiers)
+    start = time.perf_counter()
+    columns = capacity.subnet_columns(estate, workload)
+    gathered = time.perf_counter()
+    subnets = capacity.fit_subnets(columns["demand"], columns["growth"], columns["prefix"])
+    capacity.fit_vpcs(columns["vpc"], len(estate.environments), columns["prefix"], subnets[0], subnets[2], subnets[4])
+    computed = time.perf_counter()
+    plan = capacity.plan_capacity(estate, workload)
+    planned = time.perf_counter()
+    rows = sum(1 for _ in plan.vpc_rows())
+    reported = time.perf_counter()
+    return gathered - start, computed - gathered, reported - planned, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacity planning over synthetic estates.")
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--growth", type=float, nargs="+", default=[1.0, 1.5, 3.0], help="what-if growth factors")
+    args = parser.parse_args()
+
+    print("numpy: %s" % ("yes" if capacity._numpy() is not None else "no, plain lists"))
+    print("%8s %8s %8s %12s %12s %12s" % ("vpcs", "subnets", "growth", "gather (s)", "math (s)", "vpc rows (s)"))
+    for count in args.sizes:
+        estate = synthetic_estate(count)
+        for growth in args.growth:
+            gathered, computed, reported, _ = measure(estate, growth)
+            subnets = sum(len(cidrs) for spec in estate.environments for _, cidrs in spec.subnets)
+            print("%8d %8d %8.1f %12.4f %12.4f %12.4f" % (count, subnets, growth, gathered, computed, reported))
+
+
+if __name__ == "__main__":
+    main()
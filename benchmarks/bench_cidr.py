@@ -0,0 +1,48 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: CIDR allocator.                                                           #
+#                                                                                        #
+#  Plans an org-wide address space: one /20 VPC per team out of 10.0.0.0/8, each        #
+#  carved into private, public and protected /24s over three AZs, with every block      #
+#  checked for overlap against the estate-wide interval index.                          #
+##########################################################################################
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc.cidr import CidrAllocator, CidrIndex  # noqa: E402
+from cfvpc.spec import TIERS  # noqa: E402
+
+
+def plan(vpc_count, az_count=3):
+    vpcs = CidrAllocator("10.0.0.0/8")
+    subnets = CidrIndex()
+    for n in range(vpc_count):
+        vpc = vpcs.allocate(20, "team%d" % n)
+        carver = CidrAllocator(vpc)
+        for tier in TIERS:
+            for az in range(az_count):
+                subnets.add(carver.allocate(24, (n, tier, az)), (n, tier, az))
+    return subnets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 1000, 4000])
+    args = parser.parse_args()
+
+    print("%8s %10s %10s %12s" % ("vpcs", "subnets", "time (ms)", "us/subnet"))
+    for count in args.sizes:
+        start = time.perf_counter()
+        subnets = plan(count)
+        elapsed = time.perf_counter() - start
+        print("%8d %10d %10.1f %12.2f" % (count, len(subnets), elapsed * 1000, elapsed * 1e6 / len(subnets)))
+
+
+if __name__ == "__main__":
+    main()
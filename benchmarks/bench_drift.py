@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: drift detection across many accounts.                                     #
+#                                                                                        #
+#  Deploys the Dev/Stg/Prod template to --accounts accounts in each of --regions        #
+#  regions of the fake backend, drifts every 10th target and checks them all with a    #
+#  growing worker pool. Every describe call waits --latency seconds, as an AWS API     #
+#  call would. Reports wall time, targets per second and whether the drift was found.  #
+##########################################################################################
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc.api import render  # noqa: E402
+from cfvpc.drift import DRIFTED, FakeBackend, detect_drift  # noqa: E402
+from cfvpc.spec import DEFAULT_ESTATE  # noqa: E402
+
+
+def setup(accounts, regions, latency):
+    template = json.loads(render(DEFAULT_ESTATE))
+    backend = FakeBackend(latency=lambda account, region: latency)
+    targets, drifted = [], set()
+    for n in range(accounts):
+        for region in regions:
+            account = "%012d" % (100000000000 + n)
+            ids = backend.deploy(account, region, template)
+            if len(targets) % 10 == 0:
+                subnet = backend.subnets[account, region][ids["prodprotectedsubnet1"]]
+                subnet["CidrBlock"] = "10.99.0.0/24"
+                drifted.add((account, region))
+            targets.append((account, region, template))
+    return backend, targets, drifted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drift detection across many accounts.")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--regions", nargs="+", default=["eu-central-1", "eu-west-1"])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per describe call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    args = parser.parse_args()
+
+    print("%12s %8s %10s %12s %10s %8s" % ("concurrency", "targets", "seconds", "targets/s", "peak calls", "found"))
+    failed = False
+    for concurrency in args.concurrency:
+        backend, targets, drifted = setup(args.accounts, args.regions, args.latency)
+        report = asyncio.run(detect_drift(backend, targets, concurrency))
+        found = {(t.account, t.region) for t in report.targets if t.status == DRIFTED}
+        print("%12d %8d %10.2f %12.0f %10d %8s" % (
+            concurrency, len(targets), report.seconds, len(targets) / report.seconds, backend.peak,
+            "ok" if found == drifted else "WRONG"))
+        failed = failed or found != drifted
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: Template.to_json() against the streaming serializer.                      #
+#                                                                                        #
+#  to_json and stream write a built troposphere Template; estate is the script's own    #
+#  path, stream_estate() straight from the spec. Each mode runs in a fresh interpreter  #
+#  so peak RSS is measured on its own. The 500-resource template cap is lifted so the   #
+#  paths can be compared at estate scale.                                                #
+##########################################################################################
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run(mode, count):
+    from cfvpc import budget
+    from cfvpc.spec import synthetic_estate
+
+    budget.MAX_RESOURCES = sys.maxsize
+    if mode == "estate":
+        from cfvpc.emit import stream_estate
+
+        with open(os.devnull, "w") as out:
+            start = time.perf_counter()
+            stream_estate(synthetic_estate(count), out)
+            elapsed = time.perf_counter() - start
+        print("%f %d" % (elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+        return
+
+    import troposphere
+
+    from cfvpc.builder import build_environment
+    from cfvpc.emit import stream_template
+
+    troposphere.MAX_RESOURCES = sys.maxsize
+    t = troposphere.Template()
+    for spec in synthetic_estate(count).environments:
+        build_environment(t, spec)
+
+    with open(os.devnull, "w") as out:
+        start = time.perf_counter()
+        if mode == "to_json":
+            out.write(t.to_json())
+        else:
+            stream_template(t, out)
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("%f %d" % (elapsed, peak))
+
+
+def measure(mode, count):
+    output = subprocess.check_output(
+        [sys.executable, __file__, "--child", mode, str(count)], cwd=ROOT,
+    )
+    elapsed, peak = output.split()
+    return float(elapsed), int(peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", nargs="*", type=int, default=[20, 200, 1000])
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        run(args.child[0], int(args.child[1]))
+        return
+
+    print("%8s %10s %12s %14s" % ("envs", "mode", "write (s)", "peak RSS (MiB)"))
+    for count in args.sizes:
+        for mode in ("to_json", "stream", "estate"):
+            elapsed, peak = measure(mode, count)
+            print("%8d %10s %12.3f %14.1f" % (count, mode, elapsed, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: IR records against troposphere objects.                                   #
+#                                                                                        #
+#  Builds every resource of synthetic estates and keeps them alive, as the planner and  #
+#  the sharder do, once as IR records and once materialized as troposphere objects.    #
+#  Reports construction time, memory held by the resources and encode-to-JSON time.    #
+##########################################################################################
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc import ir  # noqa: E402
+from cfvpc.builder import estate_groups  # noqa: E402
+from cfvpc.spec import synthetic_estate  # noqa: E402
+from troposphere import encode_to_dict  # noqa: E402
+
+
+def records(estate):
+    return [r for _, resources in estate_groups(estate) for r in resources]
+
+
+def objects(estate):
+    return [ir.materialize(r) for r in records(estate)]
+
+
+def encode(resources):
+    for r in resources:
+        r.to_dict() if isinstance(r, ir.Resource) else encode_to_dict(r.to_dict())
+
+
+def measure(build, estate):
+    start = time.perf_counter()
+    resources = build(estate)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    encode(resources)
+    encoded = time.perf_counter() - start
+    del resources
+    gc.collect()
+
+    tracemalloc.start()
+    resources = build(estate)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, encoded, held, len(resources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print("%8s %12s %10s %12s %12s %12s" % ("envs", "mode", "resources", "build (s)", "encode (s)", "held (MiB)"))
+    for count in args.sizes:
+        estate = synthetic_estate(count)
+        for mode, build in (("troposphere", objects), ("ir", records)):
+            built, encoded, held, resources = measure(build, estate)
+            print("%8d %12s %10d %12.3f %12.3f %12.2f" % (count, mode, resources, built, encoded, held / 2**20))
+
+
+if __name__ == "__main__":
+    main()
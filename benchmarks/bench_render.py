@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Load test: the in-process render API under concurrent callers.                       #
+#                                                                                        #
+#  --threads workers call Renderer.render() back to back for --seconds:                 #
+#                                                                                        #
+#  cold     - every request is a new estate with new CIDRs, nothing to reuse            #
+#  partial  - every request is a new estate, but only Dev's CIDR differs               #
+#  warm     - the same few estates over and over                                         #
+#                                                                                        #
+#  Reports requests per second and latency percentiles, and checks every 25th response #
+#  byte for byte against an uncached render of the same estate.                         #
+##########################################################################################
+
+import argparse
+import dataclasses
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc.api import Renderer, render  # noqa: E402
+from cfvpc.spec import DEFAULT_ESTATE, EnvironmentSpec  # noqa: E402
+
+
+def _variant(n, changed=None):
+    """The Dev/Stg/Prod layout with new CIDRs for estate ``n``; only ``changed`` environments move."""
+    specs = []
+    for i, spec in enumerate(DEFAULT_ESTATE.environments):
+        if changed is None:
+            cidr = "10.%d.%d.0/24" % (n // 85 % 256, n % 85 * 3 + i)
+        elif i in changed:
+            cidr = "172.%d.%d.0/24" % (16 + n // 256 % 16, n % 256)
+        else:
+            specs.append(spec)
+            continue
+        specs.append(EnvironmentSpec(name=spec.name, cidr=cidr, tags=spec.tags, dns_hostnames=spec.dns_hostnames))
+    return dataclasses.replace(DEFAULT_ESTATE, environments=tuple(specs))
+
+
+SCENARIOS = {
+    "cold": lambda n: _variant(n),
+    "partial": lambda n: _variant(n, changed={0}),
+    "warm": lambda n: _variant(n % 4),
+}
+
+
+def run(scenario, threads, seconds):
+    renderer = Renderer(max_entries=10000)
+    make = SCENARIOS[scenario]
+    counter = iter(range(10**9))
+    lock = threading.Lock()
+    latencies, mismatches = [], []
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                n = next(counter)
+            estate = make(n)
+            start = time.perf_counter()
+            body = renderer.render(estate)
+            elapsed = time.perf_counter() - start
+            mismatch = body != render(estate) if n % 25 == 0 else None
+            with lock:
+                latencies.append(elapsed)
+                if mismatch is not None:
+                    mismatches.append(mismatch)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / wall,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+        "checked": len(mismatches),
+        "mismatches": sum(mismatches),
+        "stats": renderer.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render API load test.")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help="any of %s" % ", ".join(SCENARIOS))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print("%-8s %8s %10s %10s %10s %10s" % ("scenario", "threads", "requests", "req/s", "p50 ms", "p99 ms"))
+    failed = False
+    for scenario in args.scenarios:
+        result = run(scenario, args.threads, args.seconds)
+        print("%-8s %8d %10d %10.0f %10.2f %10.2f   %d checked, %d mismatched" % (
+            scenario, args.threads, result["requests"], result["rps"], result["p50"] * 1000,
+            result["p99"] * 1000, result["checked"], result["mismatches"]))
+        failed = failed or result["mismatches"] > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Benchmark: command line startup and watch-mode rebuilds.                             #
+#                                                                                        #
+#  Each case runs the CLI in a fresh interpreter (best of --repeat):                    #
+#                                                                                        #
+#  python       - an empty interpreter, the floor                                       #
+#  eager        - importing troposphere and every cfvpc module up front, as before      #
+#  help         - --help                                                                 #
+#  cold         - the default template with an empty cache                              #
+#  warm         - the same build served from --cache-dir                                 #
+#                                                                                        #
+#  rebuild times the in-process rebuild --watch does after one environment changed.    #
+##########################################################################################
+
+import argparse
+import dataclasses
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCRIPT = os.path.join(ROOT, "build-cloudformation-vpc.py")
+
+EAGER = (
+    "import troposphere, troposphere.ec2, cfvpc.batch, cfvpc.budget, cfvpc.cache, cfvpc.emit, "
+    "cfvpc.parameterize, cfvpc.profiling, cfvpc.shard"
+)
+
+
+def best(command, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def rebuild(repeat):
+    """Best in-process rebuild after one environment's tags changed."""
+    sys.path.insert(0, ROOT)
+    from cfvpc.cache import MemoryCache
+    from cfvpc.emit import stream_estate
+    from cfvpc.spec import DEFAULT_ESTATE
+
+    cache = MemoryCache()
+    stream_estate(DEFAULT_ESTATE, io.StringIO(), cache=cache)
+    times = []
+    for i in range(repeat):
+        specs = list(DEFAULT_ESTATE.environments)
+        specs[0] = dataclasses.replace(specs[0], tags=specs[0].tags + (("Revision", str(i)),))
+        estate = dataclasses.replace(DEFAULT_ESTATE, environments=tuple(specs))
+        start = time.perf_counter()
+        stream_estate(estate, io.StringIO(), cache=cache)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup benchmark.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        def clear():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        eager = [sys.executable, "-c", "import sys; sys.path.insert(0, %r); %s" % (ROOT, EAGER)]
+        cases = [
+            ("python", best([sys.executable, "-c", "pass"], args.repeat)),
+            ("eager", best(eager, args.repeat)),
+            ("help", best([sys.executable, SCRIPT, "--help"], args.repeat)),
+            ("cold", best([sys.executable, SCRIPT, "--cache-dir", cache_dir], args.repeat, clear)),
+            ("warm", best([sys.executable, SCRIPT, "--cache-dir", cache_dir], args.repeat)),
+            ("rebuild", rebuild(args.repeat)),
+        ]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    for name, seconds in cases:
+        print("%-10s %9.1f ms" % (name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+
+##########################################################################################
+#  Template generation benchmark suite.                                                 #
+#                                                                                        #
+#  Cases: the Dev/Stg/Prod layout and synthetic estates of 10, 100 and 1,000 VPCs.      #
+#  Estates that do not fit one stack are rendered as nested stacks, the way the         #
+#  generator ships them. Each case records wall time (best of --repeat), peak traced    #
+#  memory and output size.                                                               #
+#                                                                                        #
+#  python3 benchmarks/suite.py run [-o results.json]                                    #
+#  python3 benchmarks/suite.py compare benchmarks/baseline.json results.json            #
+#  python3 benchmarks/suite.py run --compare benchmarks/baseline.json                   #
+#                                                                                        #
+#  compare exits 1 when any metric grew by more than --threshold (default 20%), or      #
+#  when the baseline was recorded with another GENERATOR_VERSION: refresh it then.      #
+##########################################################################################
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cfvpc.builder import GENERATOR_VERSION  # noqa: E402
+from cfvpc.emit import stream_estate  # noqa: E402
+from cfvpc.shard import MAX_RESOURCES, parent_template, plan_shards, render_shards  # noqa: E402
+from cfvpc.spec import DEFAULT_ESTATE, synthetic_estate  # noqa: E402
+
+CASES = {
+    "default": lambda: DEFAULT_ESTATE,
+    "synthetic-10": lambda: synthetic_estate(10),
+    "synthetic-100": lambda: synthetic_estate(100),
+    "synthetic-1000": lambda: synthetic_estate(1000),
+}
+
+METRICS = ("seconds", "peak_bytes", "output_bytes")
+
+
+def generate(estate):
+    """Rendered output size of ``estate`` as a single template or as nested stacks."""
+    shards = plan_shards(estate, MAX_RESOURCES)
+    if len(shards) == 1:
+        out = io.StringIO()
+        stream_estate(estate, out)
+        return len(out.getvalue().encode())
+    texts = render_shards(estate, shards, processes=1)
+    texts.append(parent_template(estate, shards).to_json())
+    return sum(len(text.encode()) for text in texts)
+
+
+def run_case(name, repeat):
+    estate = CASES[name]()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = generate(estate)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    generate(estate)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak, "output_bytes": size}
+
+
+def run(names, repeat):
+    return {
+        "generator_version": GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": {name: run_case(name, repeat) for name in names},
+    }
+
+
+def compare(baseline, current, threshold):
+    """Lines describing every metric, and whether any regressed past ``threshold``.
+
+    Results of different generator versions are not comparable; that counts
+    as a regression.
+    """
+    lines, regressed = [], False
+    versions = baseline.get("generator_version"), current.get("generator_version")
+    if versions[0] != versions[1]:
+        lines.append("GENERATOR VERSION MISMATCH: baseline %s, current %s; refresh the baseline" % versions)
+        regressed = True
+    for name, metrics in sorted(current["cases"].items()):
+        before = baseline["cases"].get(name)
+        if before is None:
+            lines.append("%-16s (no baseline)" % name)
+            continue
+        for metric in METRICS:
+            old, new = before[metric], metrics[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > threshold:
+                flag, regressed = "  REGRESSION", True
+            lines.append("%-16s %-13s %14.4g -> %-14.4g %+7.1f%%%s" % (
+                name, metric, old, new, change * 100, flag))
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Template generation benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite")
+    run_parser.add_argument("cases", nargs="*", default=list(CASES), help="any of %s" % ", ".join(CASES))
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("-o", "--output", help="write results here")
+    run_parser.add_argument("--compare", metavar="BASELINE", help="compare against these results")
+    run_parser.add_argument("--threshold", type=float, default=0.2)
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.command == "run" and set(args.cases) - set(CASES):
+        parser.error("unknown cases: %s" % ", ".join(sorted(set(args.cases) - set(CASES))))
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.cases, args.repeat)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=1, sort_keys=True)
+                f.write("\n")
+        for name, metrics in current["cases"].items():
+            print("%-16s %9.3fs %10.1f MiB %12d bytes" % (
+                name, metrics["seconds"], metrics["peak_bytes"] / 2**20, metrics["output_bytes"]))
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    lines, regressed = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
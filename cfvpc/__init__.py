@@ -0,0 +1,27 @@
+"""Generate CloudFormation VPC templates from declarative environment specs."""
+
+from cfvpc.spec import DEFAULT_ESTATE, EnvironmentSpec, Estate, load_estate
+
+__all__ = [
+    "DEFAULT_ESTATE",
+    "EnvironmentSpec",
+    "Estate",
+    "Renderer",
+    "build_environment",
+    "build_template",
+    "load_estate",
+    "render",
+]
+
+
+def __getattr__(name):
+    # Loaded on first use so importing the package stays cheap.
+    if name in ("build_environment", "build_template"):
+        from cfvpc import builder
+
+        return getattr(builder, name)
+    if name in ("Renderer", "render"):
+        from cfvpc import api
+
+        return getattr(api, name)
+    raise AttributeError("module 'cfvpc' has no attribute %r" % name)
@@ -0,0 +1,5 @@
+import sys
+
+from cfvpc.cli import main
+
+sys.exit(main())
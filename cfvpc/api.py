@@ -0,0 +1,119 @@
+##########################################################################################
+#  In-process render API, for embedding the generator in a service.                     #
+#                                                                                        #
+#  render(spec) turns an estate (an Estate or its JSON dict) into template bytes,       #
+#  exactly as the command line writes them. It keeps no state between calls, so any    #
+#  number of threads may call it at once.                                                #
+#                                                                                        #
+#  A Renderer adds memoization: finished templates in a bounded LRU keyed by a hash of  #
+#  the canonical spec, and rendered environments in a shared fragment cache so estates  #
+#  that differ in one environment only render that one. Concurrent requests for the     #
+#  same spec render it once and share the result.                                       #
+#                                                                                        #
+#      renderer = Renderer(max_entries=256)                                             #
+#      body = renderer.render({"environments": [...]}, fmt="compact")                   #
+##########################################################################################
+
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from cfvpc.cache import MemoryCache
+from cfvpc.emit import FORMATS, stream_estate
+from cfvpc.groups import GENERATOR_VERSION
+from cfvpc.spec import Estate
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_FRAGMENTS = 4096
+
+
+def _estate(spec):
+    if isinstance(spec, Estate):
+        return spec
+    return Estate.from_dict(spec)
+
+
+def spec_key(spec, fmt="json"):
+    """SHA-256 of the canonical form of ``spec`` and everything else that shapes its template."""
+    canonical = json.dumps(
+        [GENERATOR_VERSION, fmt, _estate(spec).to_dict()], sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def render(spec, fmt="json", cache=None):
+    """Template of ``spec`` as bytes, as build-cloudformation-vpc.py writes it.
+
+    ``cache`` is an optional thread-safe fragment cache such as MemoryCache.
+    """
+    if fmt not in FORMATS:
+        raise ValueError("unknown format %r, expected one of %s" % (fmt, ", ".join(FORMATS)))
+    out = io.StringIO()
+    stream_estate(_estate(spec), out, fmt, cache)
+    if fmt != "yaml":
+        out.write("\n")
+    return out.getvalue().encode()
+
+
+class Renderer:
+    """render() with a bounded LRU of finished templates; safe to share between threads."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, fragments=DEFAULT_FRAGMENTS):
+        self.max_entries = max_entries
+        self.fragments = MemoryCache(fragments) if fragments else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def render(self, spec, fmt="json"):
+        """Template bytes of ``spec``, from the LRU when it was rendered before."""
+        estate = _estate(spec)
+        key = spec_key(estate, fmt)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            body = render(estate, fmt, self.fragments)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._pending[key]
+        if self.fragments is not None:
+            self.fragments.evict()
+        future.set_result(body)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.fragments is not None:
+            with self.fragments.lock:
+                self.fragments.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
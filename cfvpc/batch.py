@@ -0,0 +1,141 @@
+##########################################################################################
+#  Batch rendering for many accounts and regions.                                       #
+#                                                                                        #
+#  A targets file lists every account/region pair with its overrides on top of a base   #
+#  estate. Each target is rendered in a process pool to its own template and a          #
+#  manifest records what was written. Output does not depend on the number of workers. #
+#                                                                                        #
+#  {                                                                                     #
+#    "estate": "estate.json",                          (optional, default Dev/Stg/Prod) #
+#    "targets": [                                                                        #
+#      {"account": "123456789012", "region": "eu-central-1",                             #
+#       "tags": {"CostCenter": "999"},                  (added to every environment)    #
+#       "environments": {"Prod": {"cidr": "10.20.0.0/18", "az_count": 3}}}              #
+#    ]                                                                                   #
+#  }                                                                                     #
+##########################################################################################
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from cfvpc.cache import BuildCache
+from cfvpc.emit import EXTENSIONS, stream_estate
+from cfvpc.spec import DEFAULT_ESTATE, Estate, load_estate
+
+# Overrides that change the address layout; the base subnets are re-carved. AZ count,
+# tiers and (with neither overridden) subnet size are the base's unless overridden.
+_LAYOUT_KEYS = {"cidr", "az_count", "tiers", "subnet_prefix"}
+
+
+@dataclass(frozen=True)
+class Target:
+    """One account and region with its own variant of the estate."""
+
+    account: str
+    region: str
+    estate: Estate
+
+    @property
+    def name(self):
+        return "%s-%s" % (self.account, self.region)
+
+    def filename(self, fmt="json"):
+        return "%s.%s" % (self.name, EXTENSIONS[fmt])
+
+
+def apply_overrides(estate, tags=None, environments=None):
+    """Copy of ``estate`` with per-target tags and per-environment overrides."""
+    overrides = environments or {}
+    unknown = set(overrides) - {spec.name for spec in estate.environments}
+    if unknown:
+        raise ValueError("overrides for unknown environments: %s" % ", ".join(sorted(unknown)))
+    specs = []
+    for spec in estate.environments:
+        data = spec.to_dict()
+        override = dict(overrides.get(spec.name, {}))
+        if _LAYOUT_KEYS & set(override) and "subnets" not in override:
+            del data["subnets"]
+            data["tiers"] = [tier for tier, _ in spec.subnets]
+            data["az_count"] = spec.az_count
+            # The base subnet size only fits while there are as many subnets
+            prefixes = {cidr.partition("/")[2] for _, cidrs in spec.subnets for cidr in cidrs}
+            if len(prefixes) == 1 and not {"az_count", "tiers"} & set(override):
+                data["subnet_prefix"] = int(prefixes.pop())
+        data["tags"] = {**data["tags"], **(tags or {}), **override.pop("tags", {})}
+        data.update(override)
+        specs.append(data)
+    data = dict(estate.to_dict(), environments=specs)
+    if "transit_gateway" in data:
+        data["transit_gateway"]["tags"].update(tags or {})
+    return Estate.from_dict(data)
+
+
+def load_targets(path):
+    """Targets of a targets file, sorted by account and region."""
+    with open(path) as f:
+        data = json.load(f)
+    base = DEFAULT_ESTATE
+    if data.get("estate"):
+        base = load_estate(os.path.join(os.path.dirname(path), data["estate"]))
+    targets = []
+    for entry in data["targets"]:
+        targets.append(Target(
+            account=str(entry["account"]),
+            region=entry["region"],
+            estate=apply_overrides(base, entry.get("tags"), entry.get("environments")),
+        ))
+    targets.sort(key=lambda target: (target.account, target.region))
+    names = [target.name for target in targets]
+    if len(set(names)) != len(names):
+        raise ValueError("a target is listed more than once")
+    return targets
+
+
+def render_target(target, cache_dir=None, fmt="json", cache=None):
+    """The template of ``target`` in ``fmt``, as the generator script prints it.
+
+    ``cache`` is a cache object to use instead of a BuildCache in ``cache_dir``.
+    """
+    if cache is None and cache_dir:
+        cache = BuildCache(cache_dir)
+    out = io.StringIO()
+    stream_estate(target.estate, out, fmt, cache)
+    if fmt != "yaml":
+        out.write("\n")
+    return out.getvalue()
+
+
+def render_targets(targets, out_dir, processes=None, cache_dir=None, fmt="json", cache=None):
+    """Write one template per target and manifest.json; returns the manifest.
+
+    With ``cache``, an in-process cache such as --watch's MemoryCache, the
+    targets are rendered in this process so they can share it.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if processes == 1 or len(targets) < 2 or cache is not None:
+        texts = [render_target(target, cache_dir, fmt, cache) for target in targets]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            texts = list(pool.map(render_target, targets, [cache_dir] * len(targets), [fmt] * len(targets)))
+
+    entries = []
+    for target, text in zip(targets, texts):
+        body = text.encode()
+        with open(os.path.join(out_dir, target.filename(fmt)), "wb") as f:
+            f.write(body)
+        entries.append({
+            "account": target.account,
+            "region": target.region,
+            "template": target.filename(fmt),
+            "bytes": len(body),
+            "sha256": hashlib.sha256(body).hexdigest(),
+        })
+    manifest = {"targets": entries}
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+    return manifest
@@ -0,0 +1,47 @@
+##########################################################################################
+#  Template size budget.                                                                #
+#                                                                                        #
+#  CloudFormation takes at most 51,200 bytes of template body inline (--template-body)  #
+#  and 1 MB from S3 (--template-url, nested stacks). Templates are checked against the  #
+#  limit that applies to them: past WARN_RATIO of it a warning is reported, past the    #
+#  limit itself the build fails.                                                         #
+##########################################################################################
+
+# Resources per stack, as troposphere.MAX_RESOURCES
+MAX_RESOURCES = 500
+
+INLINE_LIMIT = 51200
+S3_LIMIT = 1024 * 1024
+LIMITS = {"inline": INLINE_LIMIT, "s3": S3_LIMIT}
+
+WARN_RATIO = 0.9
+
+
+class TemplateTooLarge(ValueError):
+    pass
+
+
+def check_size(name, size, limit="s3", warn_ratio=WARN_RATIO):
+    """Warnings about template ``name`` of ``size`` bytes; raises TemplateTooLarge past ``limit``."""
+    maximum = LIMITS[limit]
+    if size > maximum:
+        raise TemplateTooLarge("%s is %d bytes, over the %s limit of %d bytes" % (name, size, limit, maximum))
+    warnings = []
+    if size > maximum * warn_ratio:
+        warnings.append("%s is %d bytes, %d%% of the %s limit of %d bytes" % (
+            name, size, size * 100 // maximum, limit, maximum))
+    if limit == "s3" and size > INLINE_LIMIT:
+        warnings.append("%s is %d bytes, too large for --template-body; upload it to S3" % (name, size))
+    return warnings
+
+
+class CountingWriter:
+    """File wrapper that counts the bytes written through it."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text.encode())
+        return self.fp.write(text)
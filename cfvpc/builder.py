@@ -0,0 +1,554 @@
+##########################################################################################
+#  Turn environment specs into template resources (cfvpc/ir.py records).              #
+#                                                                                        #
+#  Every environment gets one VPC, a route table per subnet tier and one subnet per     #
+#  tier and AZ. Public subnets route through an Internet gateway, protected subnets     #
+#  through a NAT gateway that lives in the first public subnet. Optional VPC endpoints  #
+#  keep S3, DynamoDB and other AWS service traffic off the NAT gateway; dual-stack VPCs  #
+#  send IPv6 traffic from protected subnets through an egress-only Internet gateway.    #
+#                                                                                        #
+#  With a Transit Gateway the estate is hub-and-spoke: the hub is a group of its own,   #
+#  each environment attaches to it and routes the summarized estate blocks to it, so    #
+#  connections and route entries grow linearly with the number of VPCs. Reachability    #
+#  rules replace the default routes with summarized ones plus network ACLs.             #
+#                                                                                        #
+#  Optional telemetry: VPC Flow Logs (per VPC or per subnet of chosen tiers) and        #
+#  CloudWatch alarms on the metrics of every NAT gateway.                               #
+##########################################################################################
+
+import ipaddress
+
+from cfvpc import ir
+from cfvpc.cidr import check_estate
+from cfvpc.groups import GENERATOR_VERSION, estate_plan, group_specs, tier_policies, transit_hub  # noqa: F401
+
+Alarm = ir.kind("AWS::CloudWatch::Alarm")
+EIP = ir.kind("AWS::EC2::EIP")
+FlowLog = ir.kind("AWS::EC2::FlowLog")
+LogGroup = ir.kind("AWS::Logs::LogGroup")
+Role = ir.kind("AWS::IAM::Role")
+VPC = ir.kind("AWS::EC2::VPC")
+EgressOnlyInternetGateway = ir.kind("AWS::EC2::EgressOnlyInternetGateway")
+InternetGateway = ir.kind("AWS::EC2::InternetGateway")
+NatGateway = ir.kind("AWS::EC2::NatGateway")
+NetworkAcl = ir.kind("AWS::EC2::NetworkAcl")
+NetworkAclEntry = ir.kind("AWS::EC2::NetworkAclEntry")
+Route = ir.kind("AWS::EC2::Route")
+RouteTable = ir.kind("AWS::EC2::RouteTable")
+SecurityGroup = ir.kind("AWS::EC2::SecurityGroup")
+Subnet = ir.kind("AWS::EC2::Subnet")
+SubnetNetworkAclAssociation = ir.kind("AWS::EC2::SubnetNetworkAclAssociation")
+SubnetRouteTableAssociation = ir.kind("AWS::EC2::SubnetRouteTableAssociation")
+TransitGateway = ir.kind("AWS::EC2::TransitGateway")
+TransitGatewayAttachment = ir.kind("AWS::EC2::TransitGatewayAttachment")
+TransitGatewayRouteTable = ir.kind("AWS::EC2::TransitGatewayRouteTable")
+TransitGatewayRouteTableAssociation = ir.kind("AWS::EC2::TransitGatewayRouteTableAssociation")
+TransitGatewayRouteTablePropagation = ir.kind("AWS::EC2::TransitGatewayRouteTablePropagation")
+VPCEndpoint = ir.kind("AWS::EC2::VPCEndpoint")
+VPCCidrBlock = ir.kind("AWS::EC2::VPCCidrBlock")
+VPCGatewayAttachment = ir.kind("AWS::EC2::VPCGatewayAttachment")
+
+
+def _tags(spec, name):
+    return ir.tags(Name=name, Application=ir.STACK_ID, **dict(spec.tags))
+
+
+def _service_name(service):
+    return ir.join("", ["com.amazonaws.", ir.REGION, ".%s" % service])
+
+
+def _service_title(service):
+    """"ecr.api" gives "EcrApi"."""
+    return "".join(part.capitalize() for part in service.replace("-", ".").split("."))
+
+
+# NAT gateway metrics alarmed on: (NatAlarmSpec field, logical ID suffix, metric, what it means)
+NAT_ALARMS = (
+    ("bytes_out", "BytesAlarm", "BytesOutToDestination", "bytes sent through"),
+    ("packets_dropped", "DropsAlarm", "PacketsDropCount", "packets dropped by"),
+    ("port_allocation_errors", "PortAllocationAlarm", "ErrorPortAllocation", "source port allocation errors of"),
+)
+
+
+def flow_log_resources(spec, vpc, subnets):
+    """Flow logs of the VPC or of the subnets of ``spec.flow_logs.tiers``, and their log group and role."""
+    title, logs = spec.name, spec.flow_logs
+    resources = []
+    if logs.destination == "s3":
+        destination = {"LogDestination": logs.destination_arn}
+    else:
+        group = LogGroup(
+            "%sFlowLogGroup" % title,
+            RetentionInDays=logs.retention_days,
+            Tags=_tags(spec, "%s_Flow_Logs" % title),
+        )
+        role = Role(
+            "%sFlowLogRole" % title,
+            AssumeRolePolicyDocument=ir.Struct(
+                Version="2012-10-17",
+                Statement=(ir.Struct(
+                    Effect="Allow",
+                    Principal=ir.Struct(Service="vpc-flow-logs.amazonaws.com"),
+                    Action="sts:AssumeRole",
+                ),),
+            ),
+            Policies=(ir.Struct(
+                PolicyName="flow-logs",
+                PolicyDocument=ir.Struct(
+                    Version="2012-10-17",
+                    Statement=(ir.Struct(
+                        Effect="Allow",
+                        Action=(
+                            "logs:CreateLogStream", "logs:DescribeLogGroups",
+                            "logs:DescribeLogStreams", "logs:PutLogEvents",
+                        ),
+                        Resource=ir.get_att(group, "Arn"),
+                    ),),
+                ),
+            ),),
+            Tags=_tags(spec, "%s_Flow_Log_Role" % title),
+        )
+        resources += [group, role]
+        destination = {"LogGroupName": ir.ref(group), "DeliverLogsPermissionArn": ir.get_att(role, "Arn")}
+    if logs.log_format:
+        destination["LogFormat"] = logs.log_format
+
+    if logs.tiers:
+        targets = [
+            ("%s%sSubnet%dFlowLog" % (title, tier.capitalize(), n), "Subnet", subnet,
+             "%s_%s_Subnet_%d_Flow_Log" % (title, tier.capitalize(), n))
+            for tier in logs.tiers for n, subnet in enumerate(subnets[tier], 1)
+        ]
+    else:
+        targets = [("%sFlowLog" % title, "VPC", vpc, "%s_Flow_Log" % title)]
+    for name, resource_type, target, tag in targets:
+        resources.append(FlowLog(
+            name,
+            ResourceId=ir.ref(target),
+            ResourceType=resource_type,
+            TrafficType=logs.traffic_type,
+            LogDestinationType=logs.destination,
+            MaxAggregationInterval=logs.max_aggregation_interval,
+            Tags=_tags(spec, tag),
+            **destination,
+        ))
+    return resources
+
+
+def nat_alarm_resources(spec, nats):
+    """CloudWatch alarms on the metrics of each NAT gateway."""
+    alarms = spec.nat_alarms
+    resources = []
+    for nat in nats:
+        for field, suffix, metric, meaning in NAT_ALARMS:
+            threshold = getattr(alarms, field)
+            if threshold is None:
+                continue
+            extra = {"AlarmActions": alarms.alarm_actions} if alarms.alarm_actions else {}
+            resources.append(Alarm(
+                "%s%s" % (nat.title, suffix),
+                AlarmDescription="%s %s above %s per %d s" % (
+                    meaning.capitalize(), nat.title, threshold, alarms.period),
+                Namespace="AWS/NATGateway",
+                MetricName=metric,
+                Dimensions=(ir.Struct(Name="NatGatewayId", Value=ir.ref(nat)),),
+                Statistic="Sum",
+                Period=alarms.period,
+                EvaluationPeriods=alarms.evaluation_periods,
+                Threshold=threshold,
+                ComparisonOperator="GreaterThanThreshold",
+                TreatMissingData="notBreaching",
+                Tags=_tags(spec, "%s_%s" % (nat.title, suffix)),
+                **extra,
+            ))
+    return resources
+
+
+def hub_resources(hub):
+    """The Transit Gateway and its route table."""
+    tgw = TransitGateway(
+        "%sTransitGateway" % hub.name,
+        AmazonSideAsn=hub.asn,
+        DefaultRouteTableAssociation="disable",
+        DefaultRouteTablePropagation="disable",
+        Description="%s, hub for traffic between the VPCs" % hub.name,
+        Tags=_tags(hub, "%s_TGW" % hub.name),
+    )
+    table = TransitGatewayRouteTable(
+        "%sTransitGatewayRouteTable" % hub.name,
+        TransitGatewayId=ir.ref(tgw),
+        Tags=_tags(hub, "%s_TGW_Route_Table" % hub.name),
+    )
+    return [tgw, table]
+
+
+def environment_resources(spec, hub=None, policy=None):
+    """All resources of one environment, in dependency order.
+
+    ``hub`` is the estate's TransitGatewaySpec, routes filled in, if any.
+    ``policy`` maps tiers to their compiled TierPolicy; when given, only
+    those tiers route to the hub, and each gets a network ACL.
+    """
+    title, upper, lower = spec.name, spec.name.upper(), spec.name.lower()
+    resources, nats = [], []
+    add = resources.append
+
+    extra = {"EnableDnsHostnames": True} if spec.dns_hostnames else {}
+    vpc = VPC(
+        "%sVPC" % upper,
+        CidrBlock=spec.cidr,
+        InstanceTenancy="default",
+        EnableDnsSupport=True,
+        Tags=_tags(spec, "%s_VPC" % upper),
+        **extra,
+    )
+    add(vpc)
+
+    if spec.ipv6:
+        ipv6_block = VPCCidrBlock(
+            "%sIpv6CidrBlock" % title,
+            VpcId=ir.ref(vpc),
+            AmazonProvidedIpv6CidrBlock=True,
+        )
+        add(ipv6_block)
+        # One /64 per subnet out of the /56, numbered across tiers
+        ipv6_subnets = ir.cidr(ir.select(0, ir.get_att(vpc, "Ipv6CidrBlocks")), len(spec.subnets) * spec.az_count, 64)
+
+    def tier_subnets(tier, route_tables):
+        """Subnets of a tier; subnet n is associated with route_tables[n - 1]."""
+        Tier = tier.capitalize()
+        subnets = []
+        for n, cidr in enumerate(spec.tier(tier), 1):
+            extra = {}
+            if spec.ipv6:
+                extra = {
+                    "Ipv6CidrBlock": ir.select(spec.tiers.index(tier) * spec.az_count + n - 1, ipv6_subnets),
+                    "AssignIpv6AddressOnCreation": True,
+                    "DependsOn": ipv6_block.title,
+                }
+            subnet = Subnet(
+                "%s%ssubnet%d" % (lower, tier, n),
+                AvailabilityZone=ir.az(n - 1),
+                CidrBlock=cidr,
+                VpcId=ir.ref(vpc),
+                Tags=_tags(spec, "%s_%s_Subnet_%d" % (title, Tier, n)),
+                **extra,
+            )
+            add(subnet)
+            add(SubnetRouteTableAssociation(
+                "%s%sSubnet%dRouteTable" % (title, Tier, n),
+                RouteTableId=ir.ref(route_tables[n - 1]),
+                SubnetId=ir.ref(subnet),
+            ))
+            subnets.append(subnet)
+        return subnets
+
+    def route_table(tier, n=None):
+        Tier, suffix = tier.capitalize(), "" if n is None else str(n)
+        table = RouteTable(
+            "%s%sRouteTable%s" % (title, Tier, suffix),
+            VpcId=ir.ref(vpc),
+            Tags=_tags(spec, "%s_%s_Route_Table%s" % (title, Tier, suffix and "_" + suffix)),
+        )
+        add(table)
+        return table
+
+    def nat_gateway(subnet, n=None):
+        suffix = "" if n is None else str(n)
+        eip = EIP(
+            "%sNatEip%s" % (title, suffix),
+            Domain="%svpc" % lower,
+            Tags=_tags(spec, "%s_EIP%s" % (title, suffix and "_" + suffix)),
+        )
+        add(eip)
+        nat = NatGateway(
+            "%sNat%s" % (title, suffix),
+            AllocationId=ir.get_att(eip, "AllocationId"),
+            SubnetId=ir.ref(subnet),
+            Tags=_tags(spec, "%s_NAT%s" % (title, suffix and "_" + suffix)),
+        )
+        add(nat)
+        nats.append(nat)
+        return nat
+
+    def nat_route(table, nat, n=None):
+        add(Route(
+            "%sNatRoute%s" % (title, "" if n is None else n),
+            RouteTableId=ir.ref(table),
+            DestinationCidrBlock="0.0.0.0/0",
+            NatGatewayId=ir.ref(nat),
+        ))
+
+    def egress_route(table, n=None):
+        add(Route(
+            "%sEgressRouteIpv6%s" % (title, "" if n is None else n),
+            RouteTableId=ir.ref(table),
+            DestinationIpv6CidrBlock="::/0",
+            EgressOnlyInternetGatewayId=ir.ref(egress),
+        ))
+
+    # Private subnets, no route out of the VPC
+
+    # Route tables VPC endpoints are attached to, subnets of each tier,
+    # route tables of each tier
+    endpoint_tables, subnets, tables = [], {}, {}
+
+    if spec.tier("private"):
+        private = route_table("private")
+        tables["private"] = [private]
+        endpoint_tables.append(private)
+        subnets["private"] = tier_subnets("private", [private] * spec.az_count)
+
+    # Public subnets, default route through the Internet gateway
+
+    if spec.tier("public"):
+        igw = InternetGateway(
+            "%sInternetGateway" % title,
+            Tags=_tags(spec, "%s_IGW" % title),
+        )
+        add(igw)
+        attachment = VPCGatewayAttachment(
+            "%sInternetGatewayAttachment" % title,
+            InternetGatewayId=ir.ref(igw),
+            VpcId=ir.ref(vpc),
+        )
+        add(attachment)
+        public = route_table("public")
+        tables["public"] = [public]
+        add(Route(
+            "%sRouteToInternet" % title,
+            DestinationCidrBlock="0.0.0.0/0",
+            GatewayId=ir.ref(igw),
+            RouteTableId=ir.ref(public),
+            DependsOn=attachment.title,
+        ))
+        if spec.ipv6:
+            add(Route(
+                "%sRouteToInternetIpv6" % title,
+                DestinationIpv6CidrBlock="::/0",
+                GatewayId=ir.ref(igw),
+                RouteTableId=ir.ref(public),
+                DependsOn=attachment.title,
+            ))
+        public_subnets = tier_subnets("public", [public] * spec.az_count)
+
+    # Protected subnets, default route through a NAT gateway in the first public subnet,
+    # or with nat_per_az through the NAT gateway in the public subnet of their own AZ.
+    # IPv6 leaves through an egress-only Internet gateway.
+
+    if spec.tier("protected") and spec.ipv6:
+        egress = EgressOnlyInternetGateway(
+            "%sEgressOnlyInternetGateway" % title,
+            VpcId=ir.ref(vpc),
+            Tags=_tags(spec, "%s_EIGW" % title),
+        )
+        add(egress)
+
+    if spec.tier("protected") and spec.nat_per_az:
+        protected = tables["protected"] = []
+        for n, subnet in enumerate(public_subnets, 1):
+            nat = nat_gateway(subnet, n)
+            protected.append(route_table("protected", n))
+            nat_route(protected[-1], nat, n)
+            if spec.ipv6:
+                egress_route(protected[-1], n)
+        endpoint_tables += protected
+        subnets["protected"] = tier_subnets("protected", protected)
+    elif spec.tier("protected"):
+        add(VPCGatewayAttachment(
+            "%sNatgtw" % lower,
+            VpcId=ir.ref(vpc),
+            InternetGatewayId=ir.ref(igw),
+        ))
+        nat = nat_gateway(public_subnets[0])
+        protected = route_table("protected")
+        nat_route(protected, nat)
+        if spec.ipv6:
+            egress_route(protected)
+        tables["protected"] = [protected]
+        endpoint_tables.append(protected)
+        subnets["protected"] = tier_subnets("protected", [protected] * spec.az_count)
+
+    # VPC endpoints, AWS service traffic that bypasses the NAT gateway
+
+    for service in spec.gateway_endpoints:
+        add(VPCEndpoint(
+            "%s%sEndpoint" % (title, _service_title(service)),
+            ServiceName=_service_name(service),
+            VpcEndpointType="Gateway",
+            VpcId=ir.ref(vpc),
+            RouteTableIds=tuple(ir.ref(table) for table in endpoint_tables),
+        ))
+
+    if spec.interface_endpoints:
+        group = SecurityGroup(
+            "%sEndpointSecurityGroup" % title,
+            GroupDescription="HTTPS from %s to VPC interface endpoints" % title,
+            VpcId=ir.ref(vpc),
+            SecurityGroupIngress=(ir.Struct(
+                IpProtocol="tcp", FromPort=443, ToPort=443, CidrIp=spec.cidr,
+            ),),
+            Tags=_tags(spec, "%s_Endpoint_SG" % title),
+        )
+        add(group)
+        for service in spec.interface_endpoints:
+            add(VPCEndpoint(
+                "%s%sEndpoint" % (title, _service_title(service)),
+                ServiceName=_service_name(service),
+                VpcEndpointType="Interface",
+                VpcId=ir.ref(vpc),
+                SubnetIds=tuple(ir.ref(s) for s in subnets.get("private") or subnets["protected"]),
+                SecurityGroupIds=(ir.ref(group),),
+                PrivateDnsEnabled=spec.dns_hostnames,
+            ))
+
+    # Transit Gateway spoke, estate blocks outside this VPC routed to the hub
+
+    if hub is not None:
+        # Private subnets, else protected, else public ones
+        attached = subnets.get("private") or subnets.get("protected") or public_subnets
+        attachment = TransitGatewayAttachment(
+            "%sTransitGatewayAttachment" % title,
+            TransitGatewayId=ir.ref("%sTransitGateway" % hub.name),
+            VpcId=ir.ref(vpc),
+            SubnetIds=tuple(ir.ref(s) for s in attached),
+            Tags=_tags(spec, "%s_TGW_Attachment" % title),
+        )
+        add(attachment)
+        add(TransitGatewayRouteTableAssociation(
+            "%sTransitGatewayAssociation" % title,
+            TransitGatewayAttachmentId=ir.ref(attachment),
+            TransitGatewayRouteTableId=ir.ref("%sTransitGatewayRouteTable" % hub.name),
+        ))
+        add(TransitGatewayRouteTablePropagation(
+            "%sTransitGatewayPropagation" % title,
+            TransitGatewayAttachmentId=ir.ref(attachment),
+            TransitGatewayRouteTableId=ir.ref("%sTransitGatewayRouteTable" % hub.name),
+        ))
+        own = ipaddress.ip_network(spec.cidr)
+        if policy is None:
+            tier_routes = {tier: hub.routes for tier in hub.tiers}
+        else:
+            tier_routes = {tier: p.routes for tier, p in policy.items()}
+        for tier, routes in tier_routes.items():
+            routes = [r for r in routes if not ipaddress.ip_network(r).subnet_of(own)]  # local already
+            for table in tables.get(tier, ()):
+                for n, destination in enumerate(routes, 1):
+                    add(Route(
+                        "%sTransit%d" % (table.title, n),
+                        RouteTableId=ir.ref(table),
+                        DestinationCidrBlock=destination,
+                        TransitGatewayId=ir.ref("%sTransitGateway" % hub.name),
+                        DependsOn=attachment.title,
+                    ))
+
+    # Network ACLs of the tiers with reachability rules
+
+    for tier, p in (policy or {}).items():
+        Tier = tier.capitalize()
+        acl = NetworkAcl(
+            "%s%sNetworkAcl" % (title, Tier),
+            VpcId=ir.ref(vpc),
+            Tags=_tags(spec, "%s_%s_NACL" % (title, Tier)),
+        )
+        add(acl)
+        for number, action, cidr, protocol, ports in p.acl:
+            extra = {"PortRange": ir.Struct(From=ports[0], To=ports[1])} if ports else {}
+            add(NetworkAclEntry(
+                "%s%sAclIn%d" % (title, Tier, number),
+                NetworkAclId=ir.ref(acl),
+                RuleNumber=number,
+                RuleAction=action,
+                Egress=False,
+                CidrBlock=cidr,
+                Protocol=protocol,
+                **extra,
+            ))
+        add(NetworkAclEntry(
+            "%s%sAclOut" % (title, Tier),
+            NetworkAclId=ir.ref(acl),
+            RuleNumber=100,
+            RuleAction="allow",
+            Egress=True,
+            CidrBlock="0.0.0.0/0",
+            Protocol=-1,
+        ))
+        if p.acl_ipv6:
+            for number, action, cidr, protocol, ports in p.acl_ipv6:
+                extra = {"PortRange": ir.Struct(From=ports[0], To=ports[1])} if ports else {}
+                add(NetworkAclEntry(
+                    "%s%sAclIn%d" % (title, Tier, number),
+                    NetworkAclId=ir.ref(acl),
+                    RuleNumber=number,
+                    RuleAction=action,
+                    Egress=False,
+                    Ipv6CidrBlock=cidr or ir.select(0, ir.get_att(vpc, "Ipv6CidrBlocks")),
+                    Protocol=protocol,
+                    DependsOn=ipv6_block.title,
+                    **extra,
+                ))
+            add(NetworkAclEntry(
+                "%s%sAclOutIpv6" % (title, Tier),
+                NetworkAclId=ir.ref(acl),
+                RuleNumber=110,
+                RuleAction="allow",
+                Egress=True,
+                Ipv6CidrBlock="::/0",
+                Protocol=-1,
+            ))
+        # ``subnets`` leaves the public tier out, its ACL still goes on the public subnets
+        for n, subnet in enumerate(public_subnets if tier == "public" else subnets.get(tier, ()), 1):
+            add(SubnetNetworkAclAssociation(
+                "%s%sSubnet%dNetworkAcl" % (title, Tier, n),
+                NetworkAclId=ir.ref(acl),
+                SubnetId=ir.ref(subnet),
+            ))
+
+    # Telemetry, flow logs and NAT gateway alarms
+
+    if spec.flow_logs is not None:
+        # ``subnets`` leaves the public tier out so attachments avoid it; flow logs may cover it
+        if spec.tier("public"):
+            subnets = dict(subnets, public=public_subnets)
+        resources += flow_log_resources(spec, vpc, subnets)
+    if spec.nat_alarms is not None:
+        resources += nat_alarm_resources(spec, nats)
+
+    return resources
+
+
+def estate_groups(estate, names=None, plan=None):
+    """Yield ``(name, resources)`` for every self-contained group of the estate.
+
+    A group is the dependency closure that has to stay in one stack when the
+    estate is split up: one environment, or the Transit Gateway hub.
+    ``names`` limits the groups that are built; ``plan`` is estate_plan(),
+    worked out here when not given.
+    """
+    hub, policies = plan or estate_plan(estate)
+    if hub is not None and (names is None or hub.name in names):
+        yield hub.name, hub_resources(hub)
+    for spec in estate.environments:
+        if names is None or spec.name in names:
+            yield spec.name, environment_resources(spec, hub, policies[spec.name])
+
+
+def build_environment(t, spec):
+    """Add one environment to template ``t``."""
+    for resource in environment_resources(spec):
+        t.add_resource(ir.materialize(resource))
+    return t
+
+
+def build_template(estate):
+    """A new template holding every environment of ``estate``."""
+    from troposphere import Template
+
+    check_estate(estate)
+    t = Template()
+    t.set_version("2010-09-09")
+    t.set_description(estate.description)
+    for _, resources in estate_groups(estate):
+        for resource in resources:
+            t.add_resource(ir.materialize(resource))
+    return t
@@ -0,0 +1,147 @@
+##########################################################################################
+#  Content-addressed build cache.                                                       #
+#                                                                                        #
+#  Rendered fragments (the serialized resources of one environment, or a whole nested   #
+#  stack) are stored on disk under a hash of everything that went into them: the spec,  #
+#  the output format and the generator and troposphere versions. A rebuild only renders #
+#  what changed and splices the rest in from the cache. The least recently used         #
+#  entries are evicted once the cache holds more than ``max_entries``.                  #
+##########################################################################################
+
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from cfvpc.groups import GENERATOR_VERSION
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+@functools.lru_cache(maxsize=None)
+def troposphere_version():
+    """troposphere's __version__, read from its source when it is not imported yet.
+
+    A cache hit then needs neither troposphere nor the slow importlib.metadata.
+    """
+    if "troposphere" in sys.modules:
+        return sys.modules["troposphere"].__version__
+    spec = importlib.util.find_spec("troposphere")
+    with open(spec.origin) as f:
+        match = re.search(r"^__version__\s*=\s*[\"']([^\"']+)", f.read(), re.M)
+    if match is None:
+        import troposphere
+
+        return troposphere.__version__
+    return match.group(1)
+
+
+class BuildCache:
+    """Fragments on disk, keyed by content hash."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """Hash of ``parts`` (anything JSON can encode) and the generator versions."""
+        canonical = json.dumps(
+            [GENERATOR_VERSION, troposphere_version(), parts],
+            sort_keys=True, separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key):
+        """Cached value for ``key``, or None."""
+        path = self._file(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch the entry so eviction sees it as recently used.
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def fetch(self, key, build):
+        """Cached value for ``key``, building and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """Drop the least recently used entries beyond ``max_entries``."""
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    entries.append((os.stat(path).st_mtime, path))
+        if len(entries) <= self.max_entries:
+            return 0
+        entries.sort()
+        stale = entries[:len(entries) - self.max_entries]
+        for _, path in stale:
+            os.remove(path)
+        return len(stale)
+
+
+class MemoryCache(BuildCache):
+    """BuildCache held in memory, for a long-running process such as --watch.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+    def evict(self):
+        with self.lock:
+            stale = max(0, len(self.entries) - self.max_entries)
+            for _ in range(stale):
+                self.entries.popitem(last=False)
+            return stale
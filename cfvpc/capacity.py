@@ -0,0 +1,297 @@
+##########################################################################################
+#  IP capacity planner.                                                                  #
+#                                                                                        #
+#  A workload file gives the network interfaces (ENIs) each tier is expected to hold,    #
+#  per service, and a growth factor. Every subnet gets its tier's share, spread evenly   #
+#  over the AZs and grown, plus the 5 addresses AWS reserves in each subnet. From that   #
+#  the planner works out:                                                                #
+#                                                                                        #
+#  - the smallest prefix each subnet could have, and its headroom as carved today        #
+#  - per VPC: addresses reserved, projected, free inside subnets and outside any         #
+#    subnet, the subnet_prefix that fits every tier and the smallest VPC block for it    #
+#                                                                                        #
+#  The math runs column-wise over every subnet of the estate at once, with numpy when    #
+#  it is installed, so what-if runs over thousands of VPCs stay interactive.             #
+#                                                                                        #
+#  {"growth": 1.5,                                                                       #
+#   "tiers": {"private": {"db": 12}, "protected": {"app": 48, "lambda": 150}},           #
+#   "environments": {"Dev": {"growth": 1.2, "tiers": {"protected": {"app": 4}}}}}        #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.capacity [estate.json] --workload workload.json [--json]      #
+##########################################################################################
+
+import argparse
+import json
+import math
+import sys
+from dataclasses import dataclass, field
+
+from cfvpc.spec import DEFAULT_ESTATE, TIERS, load_estate
+
+# Addresses AWS keeps in every subnet: network, router, DNS, future use and broadcast
+RESERVED = 5
+
+# Subnet sizes AWS allows
+MIN_PREFIX, MAX_PREFIX = 16, 28
+
+
+def _numpy():
+    """numpy, or None when it is not installed and plain lists have to do."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _list(column):
+    return column.tolist() if hasattr(column, "tolist") else list(column)
+
+
+@dataclass(frozen=True)
+class Workload:
+    """ENIs expected per tier and service, grown by ``growth``.
+
+    ``tiers`` maps each tier to ``{service: ENIs}`` across all of its AZs.
+    ``environments`` overrides ``growth`` and the services of single tiers
+    per environment: ``{"Dev": {"growth": 1.2, "tiers": {...}}}``.
+    """
+
+    growth: float = 1.0
+    tiers: dict = field(default_factory=dict)
+    environments: dict = field(default_factory=dict)
+    reserved: int = RESERVED
+
+    def __post_init__(self):
+        layers = [("workload", self.tiers, self.growth)] + [
+            (name, override.get("tiers", {}), override.get("growth", self.growth))
+            for name, override in self.environments.items()
+        ]
+        for name, tiers, growth in layers:
+            if growth <= 0:
+                raise ValueError("%s: growth factor %r is not positive" % (name, growth))
+            for tier, services in tiers.items():
+                if tier not in TIERS:
+                    raise ValueError("%s: unknown subnet tier %r" % (name, tier))
+                for service, enis in services.items():
+                    if enis < 0:
+                        raise ValueError("%s: %s %s needs %r ENIs" % (name, tier, service, enis))
+
+    def demand(self, name, tier):
+        """``(ENIs, growth)`` of ``tier`` in environment ``name``."""
+        override = self.environments.get(name, {})
+        services = override.get("tiers", {}).get(tier, self.tiers.get(tier, {}))
+        return sum(services.values()), override.get("growth", self.growth)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def load_workload(path):
+    """Read a workload from a JSON file."""
+    with open(path) as f:
+        return Workload.from_dict(json.load(f))
+
+
+def subnet_columns(estate, workload):
+    """Every subnet of ``estate`` as columns: VPC index, tier, AZ, CIDR, prefix, demand and growth."""
+    columns = {name: [] for name in ("vpc", "tier", "az", "cidr", "prefix", "demand", "growth")}
+    for index, spec in enumerate(estate.environments):
+        for tier, cidrs in spec.subnets:
+            enis, growth = workload.demand(spec.name, tier)
+            for az, cidr in enumerate(cidrs, 1):
+                columns["vpc"].append(index)
+                columns["tier"].append(tier)
+                columns["az"].append(az)
+                columns["cidr"].append(cidr)
+                columns["prefix"].append(int(cidr.partition("/")[2]))
+                columns["demand"].append(enis / len(cidrs))
+                columns["growth"].append(growth)
+    return columns
+
+
+def fit_subnets(demand, growth, prefix, reserved=RESERVED):
+    """Per-subnet columns: projected ENIs, addresses needed, smallest prefix, usable addresses, headroom.
+
+    Takes and returns numpy arrays when numpy is installed, lists otherwise.
+    The smallest prefix is that of the smallest block holding the projected
+    ENIs and the reserved addresses, at most MAX_PREFIX; below MIN_PREFIX no
+    subnet is large enough.
+    """
+    np = _numpy()
+    if np is None:
+        # Rounded first, or 10 ENIs grown by 1.1 would need 12
+        projected = [math.ceil(round(d * g, 6)) for d, g in zip(demand, growth)]
+        needed = [p + reserved for p in projected]
+        smallest = [min(32 - (n - 1).bit_length(), MAX_PREFIX) for n in needed]
+        usable = [(1 << (32 - p)) - reserved for p in prefix]
+        return projected, needed, smallest, usable, [u - p for u, p in zip(usable, projected)]
+    projected = np.ceil(np.round(np.asarray(demand, dtype=float) * np.asarray(growth, dtype=float), 6))
+    projected = projected.astype(np.int64)
+    needed = projected + reserved
+    # frexp's exponent of n - 1 is its bit length, exact below 2**53
+    smallest = np.minimum(32 - np.frexp(needed - 1)[1], MAX_PREFIX)
+    usable = np.left_shift(1, 32 - np.asarray(prefix, dtype=np.int64)) - reserved
+    return projected, needed, smallest, usable, usable - projected
+
+
+def fit_vpcs(owners, count, prefix, projected, smallest, headroom, reserved=RESERVED):
+    """Per-VPC columns from the per-subnet ones, ``owners`` giving each subnet's VPC index."""
+    np = _numpy()
+    if np is None:
+        vpcs = {
+            name: [0] * count for name in ("subnets", "allocated", "reserved", "projected", "headroom", "short")
+        }
+        vpcs["subnet_prefix"] = [MAX_PREFIX] * count
+        vpcs["current_prefix"] = [32] * count
+        for owner, p, used, fits, free in zip(owners, prefix, projected, smallest, headroom):
+            vpcs["subnets"][owner] += 1
+            vpcs["allocated"][owner] += 1 << (32 - p)
+            vpcs["reserved"][owner] += reserved
+            vpcs["projected"][owner] += used
+            vpcs["headroom"][owner] += free
+            vpcs["short"][owner] += free < 0
+            vpcs["subnet_prefix"][owner] = min(vpcs["subnet_prefix"][owner], fits)
+            vpcs["current_prefix"][owner] = min(vpcs["current_prefix"][owner], p)
+        vpcs["vpc_prefix"] = [
+            32 - ((n << (32 - p)) - 1).bit_length() if n else 32
+            for n, p in zip(vpcs["subnets"], vpcs["subnet_prefix"])
+        ]
+        return vpcs
+
+    owners = np.asarray(owners, dtype=np.int64)
+    prefix = np.asarray(prefix, dtype=np.int64)
+
+    def total(values):
+        return np.bincount(owners, weights=values, minlength=count).astype(np.int64)
+
+    subnets = np.bincount(owners, minlength=count)
+    subnet_prefix = np.full(count, MAX_PREFIX, dtype=np.int64)
+    np.minimum.at(subnet_prefix, owners, smallest)
+    current_prefix = np.full(count, 32, dtype=np.int64)
+    np.minimum.at(current_prefix, owners, prefix)
+    # One subnet_prefix block per subnet, in the smallest block holding them all
+    span = np.left_shift(subnets, 32 - subnet_prefix)
+    return {
+        "subnets": subnets,
+        "allocated": total(np.left_shift(1, 32 - prefix)),
+        "reserved": subnets * reserved,
+        "projected": total(projected),
+        "headroom": total(headroom),
+        "short": total(headroom < 0),
+        "subnet_prefix": subnet_prefix,
+        "current_prefix": current_prefix,
+        "vpc_prefix": np.where(subnets > 0, 32 - np.frexp(span - 1)[1], 32),
+    }
+
+
+@dataclass
+class CapacityPlan:
+    """Per-subnet and per-VPC columns of an estate's capacity plan."""
+
+    names: list
+    cidrs: list
+    subnets: dict
+    vpcs: dict
+
+    def subnet_rows(self):
+        columns = {name: _list(column) for name, column in self.subnets.items()}
+        for i in range(len(columns["cidr"])):
+            usable, projected = columns["usable"][i], columns["projected"][i]
+            yield {
+                "environment": self.names[columns["vpc"][i]],
+                "tier": columns["tier"][i],
+                "az": columns["az"][i],
+                "cidr": columns["cidr"][i],
+                "projected": projected,
+                "usable": usable,
+                "headroom": columns["headroom"][i],
+                "utilization": round(100.0 * projected / usable, 1) if usable > 0 else None,
+                "smallest_prefix": columns["smallest"][i],
+                "fits": columns["smallest"][i] >= MIN_PREFIX,
+            }
+
+    def vpc_rows(self):
+        columns = {name: _list(column) for name, column in self.vpcs.items()}
+        for i, (name, cidr) in enumerate(zip(self.names, self.cidrs)):
+            addresses = 1 << (32 - int(cidr.partition("/")[2]))
+            yield {
+                "environment": name,
+                "cidr": cidr,
+                "addresses": addresses,
+                "subnets": columns["subnets"][i],
+                "unallocated": addresses - columns["allocated"][i],
+                "reserved": columns["reserved"][i],
+                "projected": columns["projected"][i],
+                "headroom": columns["headroom"][i],
+                "short_subnets": columns["short"][i],
+                "current_subnet_prefix": columns["current_prefix"][i],
+                "subnet_prefix": columns["subnet_prefix"][i],
+                "vpc_prefix": columns["vpc_prefix"][i],
+                "fits": columns["vpc_prefix"][i] >= int(cidr.partition("/")[2]),
+            }
+
+    def to_dict(self):
+        return {"vpcs": list(self.vpc_rows()), "subnets": list(self.subnet_rows())}
+
+
+def plan_capacity(estate, workload):
+    """CapacityPlan of ``estate`` under ``workload``."""
+    columns = subnet_columns(estate, workload)
+    projected, needed, smallest, usable, headroom = fit_subnets(
+        columns["demand"], columns["growth"], columns["prefix"], workload.reserved,
+    )
+    columns.update(projected=projected, needed=needed, smallest=smallest, usable=usable, headroom=headroom)
+    vpcs = fit_vpcs(
+        columns["vpc"], len(estate.environments), columns["prefix"], projected, smallest, headroom,
+        workload.reserved,
+    )
+    return CapacityPlan(
+        names=[spec.name for spec in estate.environments],
+        cidrs=[spec.cidr for spec in estate.environments],
+        subnets=columns,
+        vpcs=vpcs,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Subnet sizes and address headroom of an estate.")
+    parser.add_argument("estate", nargs="?", help="JSON estate spec (default: Dev, Stg and Prod)")
+    parser.add_argument("--workload", help="expected ENIs per tier and service (default: none)")
+    parser.add_argument("--growth", type=float, help="growth factor, in place of the workload's default")
+    parser.add_argument("--subnets", action="store_true", help="list every subnet, not only VPC totals")
+    parser.add_argument("--json", action="store_true", help="machine-readable report")
+    args = parser.parse_args(argv)
+
+    estate = load_estate(args.estate) if args.estate else DEFAULT_ESTATE
+    workload = load_workload(args.workload) if args.workload else Workload()
+    if args.growth is not None:
+        workload = Workload(args.growth, workload.tiers, workload.environments, workload.reserved)
+    plan = plan_capacity(estate, workload)
+
+    if args.json:
+        print(json.dumps(plan.to_dict(), indent=1, sort_keys=True))
+        return 0
+    print("%-16s %-18s %8s %11s %9s %10s %9s %6s %15s %7s" % (
+        "environment", "cidr", "subnets", "unallocated", "reserved", "projected", "headroom", "short",
+        "subnet prefix", "vpc"))
+    for r in plan.vpc_rows():
+        print("%-16s %-18s %8d %11d %9d %10d %9d %6d %8s -> %-4s %7s" % (
+            r["environment"], r["cidr"], r["subnets"], r["unallocated"], r["reserved"], r["projected"],
+            r["headroom"], r["short_subnets"], "/%d" % r["current_subnet_prefix"], "/%d" % r["subnet_prefix"],
+            "/%d" % r["vpc_prefix"] + ("" if r["fits"] else "!")))
+    if args.subnets:
+        print()
+        print("%-16s %-10s %3s %-18s %10s %8s %9s %6s %9s" % (
+            "environment", "tier", "az", "cidr", "projected", "usable", "headroom", "used", "smallest"))
+        for r in plan.subnet_rows():
+            used = "-" if r["utilization"] is None else "%.1f%%" % r["utilization"]
+            print("%-16s %-10s %3d %-18s %10d %8d %9d %6s %9s" % (
+                r["environment"], r["tier"], r["az"], r["cidr"], r["projected"], r["usable"], r["headroom"],
+                used, "/%d" % r["smallest_prefix"] + ("" if r["fits"] else "!")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+##########################################################################################
+#  CIDR allocation and overlap detection.                                               #
+#                                                                                        #
+#  Allocated blocks are kept in an interval index: a list of non-overlapping            #
+#  [start, end) address ranges sorted by start. Overlap and containment checks are a    #
+#  binary search against the neighbouring ranges, so planning tens of thousands of      #
+#  subnets stays fast.                                                                   #
+##########################################################################################
+
+import bisect
+import ipaddress
+import math
+
+_NETWORKS = (ipaddress.IPv4Network, ipaddress.IPv6Network)
+
+
+class CidrError(ValueError):
+    """An address plan that does not fit or overlaps."""
+
+
+def _range(cidr):
+    network = cidr if isinstance(cidr, _NETWORKS) else ipaddress.ip_network(cidr)
+    start = int(network.network_address)
+    return network, start, start + (1 << (network.max_prefixlen - network.prefixlen))
+
+
+class CidrIndex:
+    """Non-overlapping CIDR blocks, each with the name of its owner."""
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._owners = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def find(self, cidr):
+        """Owner of the first allocated block that overlaps ``cidr``, else None."""
+        _, start, end = _range(cidr)
+        return self._find(start, end)
+
+    def _find(self, start, end):
+        i = bisect.bisect_right(self._starts, start)
+        # Blocks never overlap each other, so only the block starting at or before
+        # ``start`` and the one right after it can intersect [start, end).
+        if i and self._ends[i - 1] > start:
+            return self._owners[i - 1]
+        if i < len(self._starts) and self._starts[i] < end:
+            return self._owners[i]
+        return None
+
+    def _insert(self, start, end, owner):
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._owners.insert(i, owner)
+
+    def add(self, cidr, owner):
+        """Record ``cidr`` for ``owner``; raises CidrError on overlap."""
+        _, start, end = _range(cidr)
+        clash = self._find(start, end)
+        if clash is not None:
+            raise CidrError("%s (%s) overlaps %s" % (cidr, owner, clash))
+        self._insert(start, end, owner)
+
+
+class CidrAllocator(CidrIndex):
+    """Carve aligned blocks out of a pool, first fit.
+
+    Nothing is ever released, so everything below the last block handed out for
+    a prefix length is known to be full for that length. Remembering that point
+    keeps repeated allocations of one size from rescanning the pool.
+    """
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool, self._pool_start, self._pool_end = _range(pool)
+        self._hints = {}
+
+    def allocate(self, prefix, owner):
+        """Reserve the first free /``prefix`` block of the pool."""
+        if prefix < self.pool.prefixlen or prefix > self.pool.max_prefixlen:
+            raise CidrError("/%d does not fit in %s" % (prefix, self.pool))
+        size = 1 << (self.pool.max_prefixlen - prefix)
+        start = self._hints.get(prefix, self._pool_start)
+        while start + size <= self._pool_end:
+            i = bisect.bisect_right(self._starts, start)
+            if i and self._ends[i - 1] > start:
+                blocked_until = self._ends[i - 1]
+            elif i < len(self._starts) and self._starts[i] < start + size:
+                blocked_until = self._ends[i]
+            else:
+                break
+            # Skip past the blocking range, realigned to the block size.
+            start = -(-blocked_until // size) * size
+        else:
+            raise CidrError("%s has no free /%d left for %s" % (self.pool, prefix, owner))
+        self._insert(start, start + size, owner)
+        self._hints[prefix] = start + size
+        return type(self.pool)((start, prefix))
+
+    def reserve(self, cidr, owner):
+        """Record an existing block; it must lie inside the pool."""
+        network, start, end = _range(cidr)
+        if start < self._pool_start or end > self._pool_end:
+            raise CidrError("%s (%s) is outside %s" % (cidr, owner, self.pool))
+        self.add(cidr, owner)
+        return network
+
+
+def subnet_prefix(vpc_cidr, count):
+    """Longest prefix that fits ``count`` equal subnets into ``vpc_cidr``."""
+    network = ipaddress.ip_network(vpc_cidr)
+    prefix = network.prefixlen + math.ceil(math.log2(count)) if count > 1 else network.prefixlen
+    if prefix > network.max_prefixlen - 4:
+        # AWS subnets are at most /28.
+        raise CidrError("%s is too small for %d subnets" % (vpc_cidr, count))
+    return prefix
+
+
+def carve_subnets(vpc_cidr, tiers, az_count, prefix=None):
+    """One /``prefix`` subnet per tier and AZ, packed from the start of the VPC.
+
+    Tiers are laid out one after the other, AZ 1 before AZ 2, which is the
+    layout the Dev/Stg/Prod VPCs were planned with.
+    """
+    prefix = prefix or subnet_prefix(vpc_cidr, len(tiers) * az_count)
+    allocator = CidrAllocator(vpc_cidr)
+    return {
+        tier: tuple(str(allocator.allocate(prefix, "%s%d" % (tier, n))) for n in range(1, az_count + 1))
+        for tier in tiers
+    }
+
+
+def supernet(cidrs):
+    """Smallest single block that covers every one of ``cidrs``."""
+    networks = [ipaddress.ip_network(cidr) for cidr in cidrs]
+    low = min(int(n.network_address) for n in networks)
+    high = max(int(n.broadcast_address) for n in networks)
+    prefix = networks[0].max_prefixlen - (low ^ high).bit_length()
+    return str(ipaddress.ip_network((low, prefix), strict=False))
+
+
+def check_estate(estate):
+    """Check that subnets sit inside their VPC and no two blocks overlap.
+
+    VPCs are checked against each other across the whole estate, subnets
+    against the other subnets of their own VPC.
+    """
+    vpcs = CidrIndex()
+    for spec in estate.environments:
+        vpcs.add(spec.cidr, spec.name)
+        subnets = CidrAllocator(spec.cidr)
+        for tier, cidrs in spec.subnets:
+            for n, cidr in enumerate(cidrs, 1):
+                subnets.reserve(cidr, "%s %s subnet %d" % (spec.name, tier, n))
+    return vpcs
@@ -0,0 +1,220 @@
+##########################################################################################
+#  Command line of build-cloudformation-vpc.py (also python3 -m cfvpc).                #
+#                                                                                        #
+#  Startup matters when the generator runs per commit or per keystroke: each mode only #
+#  imports what it needs. Single templates are built without troposphere; only nested  #
+#  stacks and --profile load it.                                                         #
+#                                                                                        #
+#  --watch keeps the process (and an in-memory cache) alive and rebuilds whenever the  #
+#  spec or targets file changes; only environments whose spec changed are re-rendered. #
+##########################################################################################
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from cfvpc.budget import LIMITS, MAX_RESOURCES, CountingWriter, TemplateTooLarge, check_size
+from cfvpc.cache import DEFAULT_MAX_ENTRIES
+from cfvpc.emit import FORMATS
+
+DEFAULT_INTERVAL = 0.5
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the VPC CloudFormation template.")
+    parser.add_argument("spec", nargs="?", help="JSON estate spec (default: Dev, Stg and Prod)")
+    parser.add_argument("-o", "--output", help="write the template here instead of stdout")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="compact is minified JSON")
+    parser.add_argument("--stack-tags", metavar="FILE",
+                        help="leave the tags every resource shares to the stack and write them here")
+    parser.add_argument("--size-limit", choices=sorted(LIMITS), default="s3",
+                        help="fail past this template size limit, warn close to it (default: s3)")
+    parser.add_argument("--shard-dir", help="split into a parent stack and nested stacks written here")
+    parser.add_argument("--max-resources", type=int, default=MAX_RESOURCES, help="resources per nested stack")
+    parser.add_argument("--targets", help="render one template per account/region of this targets file")
+    parser.add_argument("--out-dir", default="build", help="where --targets writes templates and manifest.json")
+    parser.add_argument("--parameterized", action="store_true",
+                        help="one template for the estate or every --targets entry, CIDRs and tags in an AddressPlans mapping")
+    parser.add_argument("--processes", type=int, help="rendering processes (default: all CPUs)")
+    parser.add_argument("--cache-dir", help="reuse unchanged environments and nested stacks from this cache")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_ENTRIES, help="cache entries kept")
+    parser.add_argument("--profile", action="store_true", help="report time and memory per phase on stderr")
+    parser.add_argument("--profile-json", metavar="FILE", help="write the profile report as JSON")
+    parser.add_argument("--watch", action="store_true", help="rebuild whenever the spec or targets file changes")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between checks for changes with --watch (default: %s)" % DEFAULT_INTERVAL)
+    args = parser.parse_args(argv)
+    if (args.profile or args.profile_json) and (args.format != "json" or args.shard_dir or args.targets):
+        parser.error("--profile profiles the single JSON template build")
+    if args.parameterized and (args.shard_dir or args.profile or args.profile_json):
+        parser.error("--parameterized writes one template, not nested stacks or a profile")
+    if args.stack_tags and (args.shard_dir or args.targets or args.parameterized or args.profile or args.profile_json):
+        parser.error("--stack-tags works on the single template build")
+    if args.watch:
+        if args.profile or args.profile_json:
+            parser.error("--watch does not profile")
+        if not (args.spec or args.targets):
+            parser.error("--watch needs a spec or --targets file to watch")
+        if not (args.output or args.shard_dir or args.targets):
+            parser.error("--watch writes to files: pass -o, --shard-dir or --targets")
+    return args
+
+
+def _open_output(args):
+    return CountingWriter(open(args.output, "w") if args.output else sys.stdout)
+
+
+def build(args, cache=None):
+    """Run one build as ``args`` ask; returns the profile report, if any."""
+    from cfvpc.spec import DEFAULT_ESTATE, load_estate
+
+    estate = load_estate(args.spec) if args.spec else DEFAULT_ESTATE
+    sizes = []
+    report = None
+
+    if args.parameterized:
+        from cfvpc.batch import load_targets
+        from cfvpc.parameterize import write_parameterized
+
+        if args.targets:
+            plans = {target.name: target.estate for target in load_targets(args.targets)}
+        else:
+            plans = {"Default": estate}
+        out = _open_output(args)
+        try:
+            write_parameterized(plans, out, args.format)
+            if args.format != "yaml":
+                out.write("\n")
+        finally:
+            if out.fp is not sys.stdout:
+                out.fp.close()
+        sizes.append((args.output or "template", out.size, args.size_limit))
+    elif args.targets:
+        from cfvpc.batch import load_targets, render_targets
+
+        # Worker processes open --cache-dir themselves; --watch's MemoryCache stays in this one
+        manifest = render_targets(
+            load_targets(args.targets), args.out_dir, args.processes, args.cache_dir, args.format,
+            None if args.cache_dir else cache,
+        )
+        for entry in manifest["targets"]:
+            print(os.path.join(args.out_dir, entry["template"]))
+            sizes.append((entry["template"], entry["bytes"], args.size_limit))
+    elif args.shard_dir:
+        from cfvpc.shard import write_shards
+
+        paths = write_shards(estate, args.shard_dir, args.max_resources, args.processes, cache, args.format)
+        for path in paths:
+            print(path)
+            # Nested stacks always come from S3, only the parent may be passed inline.
+            sizes.append((path, os.path.getsize(path), args.size_limit if path == paths[0] else "s3"))
+    else:
+        from cfvpc.emit import common_tags, stream_estate
+
+        stack_tags = common_tags(estate) if args.stack_tags else None
+        out = _open_output(args)
+        try:
+            if args.profile or args.profile_json:
+                from cfvpc.profiling import profile_estate
+
+                report = profile_estate(estate, out)
+            else:
+                stream_estate(estate, out, args.format, cache, stack_tags)
+            if args.format != "yaml":
+                out.write("\n")
+        finally:
+            if out.fp is not sys.stdout:
+                out.fp.close()
+        sizes.append((args.output or "template", out.size, args.size_limit))
+        if args.stack_tags:
+            with open(args.stack_tags, "w") as f:
+                json.dump([{"Key": k, "Value": v} for k, v in stack_tags.items()], f, indent=1)
+                f.write("\n")
+
+    if cache is not None:
+        cache.evict()
+
+    for name, size, limit in sizes:
+        for warning in check_size(name, size, limit):
+            print("warning: %s" % warning, file=sys.stderr)
+    return report
+
+
+def watched_files(args):
+    """The input files of a build: spec, targets file and the estate the targets file names."""
+    paths = [path for path in (args.spec, args.targets) if path]
+    if args.targets:
+        try:
+            with open(args.targets) as f:
+                estate = json.load(f).get("estate")
+        except (OSError, ValueError, AttributeError):
+            estate = None
+        if estate:
+            paths.append(os.path.join(os.path.dirname(args.targets), estate))
+    return paths
+
+
+def _mtimes(paths):
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamps[path] = None
+    return stamps
+
+
+def watch(args, cache):
+    """Rebuild on every change to the watched files until interrupted."""
+    stamps = None
+    while True:
+        current = _mtimes(watched_files(args))
+        if current != stamps:
+            stamps = current
+            start = time.perf_counter()
+            try:
+                build(args, cache)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # A half-saved spec is normal while editing; wait for the next save.
+                print("error: %s" % e, file=sys.stderr)
+            else:
+                print("built in %.0f ms" % ((time.perf_counter() - start) * 1000), file=sys.stderr)
+            sys.stdout.flush()
+        time.sleep(args.interval)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = None
+    if args.cache_dir:
+        from cfvpc.cache import BuildCache
+
+        cache = BuildCache(args.cache_dir, args.cache_size)
+    elif args.watch:
+        from cfvpc.cache import MemoryCache
+
+        cache = MemoryCache(args.cache_size)
+
+    if args.watch:
+        try:
+            watch(args, cache)
+        except KeyboardInterrupt:
+            return 0
+
+    try:
+        report = build(args, cache)
+    except TemplateTooLarge as e:
+        sys.exit("error: %s" % e)
+
+    if args.profile:
+        from cfvpc.profiling import format_report
+
+        print(format_report(report), file=sys.stderr)
+    if args.profile_json:
+        with open(args.profile_json, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write("\n")
+    return 0
@@ -0,0 +1,315 @@
+##########################################################################################
+#  Semantic template diff and selective rollout plan.                                   #
+#                                                                                        #
+#  Templates are compared resource by resource through hashes of their canonical JSON,  #
+#  so formatting (json, compact, yaml key order) never shows up as a change. Changed    #
+#  resources are compared property by property and classified the way CloudFormation   #
+#  will apply them:                                                                      #
+#                                                                                        #
+#  add      - new logical ID                                                             #
+#  modify   - updated in place                                                           #
+#  replace  - a property that requires replacement changed, or the type did; resources  #
+#             whose replacement-requiring properties point at a replaced resource are  #
+#             replaced too                                                               #
+#  remove   - logical ID gone                                                            #
+#                                                                                        #
+#  Given two --targets output directories the plan lists only the accounts and regions  #
+#  whose template changed (manifest SHA-256 first, then the semantic diff). It feeds    #
+#  python3 -m cfvpc.rollout --plan, which deploys the --parameterized template of the   #
+#  same targets: new instances pick their AddressPlan row through parameter overrides.  #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.diff OLD NEW [--json] [--exit-code]                           #
+#         OLD and NEW are both template files (JSON or YAML) or both --out-dir          #
+#         directories.                                                                   #
+##########################################################################################
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+
+from cfvpc.parameterize import PLAN_PARAMETER, plan_name
+from cfvpc.refs import references
+from cfvpc.validate import load_template
+
+ADD, MODIFY, REPLACE, REMOVE = "add", "modify", "replace", "remove"
+ACTIONS = (ADD, MODIFY, REPLACE, REMOVE)
+
+# Properties whose update requires replacement, per resource type (from the
+# CloudFormation resource reference). Changes to types not listed here are
+# assumed to replace the resource.
+REPLACEMENT = {
+    "AWS::CloudFormation::Stack": frozenset(),
+    "AWS::CloudWatch::Alarm": frozenset({"AlarmName"}),
+    "AWS::EC2::EIP": frozenset({"Domain"}),
+    "AWS::EC2::EgressOnlyInternetGateway": frozenset({"VpcId"}),
+    "AWS::EC2::FlowLog": frozenset({
+        "DeliverCrossAccountRole", "DeliverLogsPermissionArn", "DestinationOptions", "LogDestination",
+        "LogDestinationType", "LogFormat", "LogGroupName", "MaxAggregationInterval", "ResourceId",
+        "ResourceType", "TrafficType",
+    }),
+    "AWS::EC2::InternetGateway": frozenset(),
+    "AWS::EC2::NatGateway": frozenset({"AllocationId", "ConnectivityType", "PrivateIpAddress", "SubnetId"}),
+    "AWS::EC2::NetworkAcl": frozenset({"VpcId"}),
+    "AWS::EC2::NetworkAclEntry": frozenset({"Egress", "NetworkAclId", "RuleNumber"}),
+    "AWS::EC2::Route": frozenset({
+        "DestinationCidrBlock", "DestinationIpv6CidrBlock", "DestinationPrefixListId", "RouteTableId",
+    }),
+    "AWS::EC2::RouteTable": frozenset({"VpcId"}),
+    "AWS::EC2::SecurityGroup": frozenset({"GroupDescription", "GroupName", "VpcId"}),
+    "AWS::EC2::Subnet": frozenset({"AvailabilityZone", "AvailabilityZoneId", "CidrBlock", "OutpostArn", "VpcId"}),
+    "AWS::EC2::SubnetNetworkAclAssociation": frozenset({"NetworkAclId", "SubnetId"}),
+    "AWS::EC2::SubnetRouteTableAssociation": frozenset({"SubnetId"}),
+    "AWS::EC2::TransitGateway": frozenset({"AmazonSideAsn", "MulticastSupport"}),
+    "AWS::EC2::TransitGatewayAttachment": frozenset({"TransitGatewayId", "VpcId"}),
+    "AWS::EC2::TransitGatewayRouteTable": frozenset({"TransitGatewayId"}),
+    "AWS::EC2::TransitGatewayRouteTableAssociation": frozenset({
+        "TransitGatewayAttachmentId", "TransitGatewayRouteTableId",
+    }),
+    "AWS::EC2::TransitGatewayRouteTablePropagation": frozenset({
+        "TransitGatewayAttachmentId", "TransitGatewayRouteTableId",
+    }),
+    "AWS::EC2::VPC": frozenset({"CidrBlock", "InstanceTenancy", "Ipv4IpamPoolId", "Ipv4NetmaskLength"}),
+    "AWS::EC2::VPCCidrBlock": frozenset({
+        "AmazonProvidedIpv6CidrBlock", "CidrBlock", "Ipv6CidrBlock", "Ipv6Pool", "VpcId",
+    }),
+    "AWS::EC2::VPCEndpoint": frozenset({"ServiceName", "VpcEndpointType", "VpcId"}),
+    "AWS::EC2::VPCGatewayAttachment": frozenset({"VpcId"}),
+    "AWS::IAM::Role": frozenset({"Path", "RoleName"}),
+    "AWS::Logs::LogGroup": frozenset({"LogGroupName"}),
+}
+
+_MISSING = object()
+
+
+def digest(value):
+    """SHA-256 of ``value``'s canonical JSON."""
+    if value is _MISSING:
+        return None
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def requires_replacement(resource_type, properties):
+    """True if changing ``properties`` of a ``resource_type`` replaces it."""
+    replacing = REPLACEMENT.get(resource_type)
+    if replacing is None:
+        return bool(properties)
+    return bool(replacing & set(properties))
+
+
+@dataclass
+class Change:
+    logical_id: str
+    action: str
+    resource_type: str
+    # Changed properties; attributes such as DependsOn are listed by name
+    properties: list = field(default_factory=list)
+    # Replaced resource this change follows from, if any
+    cause: str = None
+
+    def to_dict(self):
+        data = {"logical_id": self.logical_id, "action": self.action, "type": self.resource_type}
+        if self.properties:
+            data["properties"] = self.properties
+        if self.cause:
+            data["cause"] = self.cause
+        return data
+
+
+@dataclass
+class TemplateDiff:
+    changes: list = field(default_factory=list)
+    # Other top-level sections that changed (Description, Outputs, ...)
+    sections: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.changes or self.sections)
+
+    def summary(self):
+        counts = dict.fromkeys(ACTIONS, 0)
+        for change in self.changes:
+            counts[change.action] += 1
+        return counts
+
+    def to_dict(self):
+        return {
+            "summary": self.summary(),
+            "sections": self.sections,
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+
+def _compare(title, old, new):
+    """The Change between two versions of one resource."""
+    resource_type = new.get("Type", "")
+    if old.get("Type") != resource_type:
+        return Change(title, REPLACE, resource_type, ["Type"])
+    old_properties, new_properties = old.get("Properties", {}), new.get("Properties", {})
+    properties = sorted(
+        name for name in set(old_properties) | set(new_properties)
+        if digest(old_properties.get(name, _MISSING)) != digest(new_properties.get(name, _MISSING))
+    )
+    attributes = sorted(
+        name for name in (set(old) | set(new)) - {"Type", "Properties"}
+        if digest(old.get(name, _MISSING)) != digest(new.get(name, _MISSING))
+    )
+    action = REPLACE if requires_replacement(resource_type, properties) else MODIFY
+    return Change(title, action, resource_type, properties + attributes)
+
+
+def diff_templates(old, new):
+    """TemplateDiff from template dict ``old`` to ``new``."""
+    old_resources, new_resources = old.get("Resources", {}), new.get("Resources", {})
+    changes = {}
+    for title in new_resources.keys() - old_resources.keys():
+        changes[title] = Change(title, ADD, new_resources[title].get("Type", ""))
+    for title in old_resources.keys() - new_resources.keys():
+        changes[title] = Change(title, REMOVE, old_resources[title].get("Type", ""))
+    for title in new_resources.keys() & old_resources.keys():
+        if digest(old_resources[title]) != digest(new_resources[title]):
+            changes[title] = _compare(title, old_resources[title], new_resources[title])
+
+    # A replaced resource gets a new physical ID; whatever points at it
+    # through a replacement-requiring property is replaced as well.
+    pointing = {}
+    for title, resource in new_resources.items():
+        for name, value in resource.get("Properties", {}).items():
+            for target, _ in references(value):
+                pointing.setdefault(target, {}).setdefault(title, set()).add(name)
+    replaced = [title for title, change in changes.items() if change.action == REPLACE]
+    while replaced:
+        target = replaced.pop()
+        for title, names in sorted(pointing.get(target, {}).items()):
+            change = changes.get(title)
+            if change is not None and change.action in (ADD, REPLACE):
+                continue
+            resource_type = new_resources[title].get("Type", "")
+            names = sorted(names | set(change.properties if change else ()))
+            if requires_replacement(resource_type, names):
+                changes[title] = Change(title, REPLACE, resource_type, names, cause=target)
+                replaced.append(title)
+            elif change is None:
+                changes[title] = Change(title, MODIFY, resource_type, names, cause=target)
+
+    sections = sorted(
+        key for key in (set(old) | set(new)) - {"Resources"}
+        if digest(old.get(key, _MISSING)) != digest(new.get(key, _MISSING))
+    )
+    return TemplateDiff([changes[title] for title in sorted(changes)], sections)
+
+
+def load_manifest(directory):
+    """``{(account, region): manifest entry}`` of a --targets output directory."""
+    with open(os.path.join(directory, "manifest.json")) as f:
+        entries = json.load(f)["targets"]
+    return {(entry["account"], entry["region"]): entry for entry in entries}
+
+
+@dataclass
+class Plan:
+    """Stack instances to create, update and delete between two batch builds."""
+
+    create: list = field(default_factory=list)
+    update: list = field(default_factory=list)
+    delete: list = field(default_factory=list)
+    unchanged: int = 0
+
+    def to_dict(self):
+        return {"create": self.create, "update": self.update, "delete": self.delete, "unchanged": self.unchanged}
+
+
+def address_plan(account, region):
+    """ParameterOverrides that pick a target's row of the --parameterized template."""
+    return [{"ParameterKey": PLAN_PARAMETER, "ParameterValue": plan_name("%s-%s" % (account, region))}]
+
+
+def plan_targets(old_dir, new_dir):
+    """Plan from the --targets output in ``old_dir`` to the one in ``new_dir``.
+
+    New instances carry the ParameterOverrides that select their row of the
+    --parameterized template, which is what the stack set itself deploys.
+    """
+    old, new = load_manifest(old_dir), load_manifest(new_dir)
+    plan = Plan()
+    for account, region in sorted(old.keys() | new.keys()):
+        before, after = old.get((account, region)), new.get((account, region))
+        target = {"account": account, "region": region}
+        if before is None:
+            plan.create.append(dict(target, template=after["template"], parameters=address_plan(account, region)))
+        elif after is None:
+            plan.delete.append(target)
+        elif before["sha256"] == after["sha256"]:
+            plan.unchanged += 1
+        else:
+            diff = diff_templates(
+                load_template(os.path.join(old_dir, before["template"])),
+                load_template(os.path.join(new_dir, after["template"])),
+            )
+            if diff.changed:
+                plan.update.append(dict(target, template=after["template"], **diff.to_dict()))
+            else:
+                plan.unchanged += 1
+    return plan
+
+
+def _format_diff(diff, indent=""):
+    lines = []
+    for change in diff.changes:
+        detail = ", ".join(change.properties)
+        if change.cause:
+            detail = "%s (follows %s)" % (detail, change.cause)
+        lines.append("%s%-8s %-40s %-40s %s" % (indent, change.action, change.logical_id, change.resource_type, detail))
+    for section in diff.sections:
+        lines.append("%s%-8s %s" % (indent, "section", section))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Semantic diff of generated templates or batch builds.")
+    parser.add_argument("old", help="previous template, or previous --targets output directory")
+    parser.add_argument("new", help="new template, or new --targets output directory")
+    parser.add_argument("--json", action="store_true", help="print the diff or plan as JSON")
+    parser.add_argument("--exit-code", action="store_true", help="exit 1 when anything changed")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.old) != os.path.isdir(args.new):
+        parser.error("compare two templates or two output directories")
+    try:
+        if os.path.isdir(args.old):
+            plan = plan_targets(args.old, args.new)
+        else:
+            diff = diff_templates(load_template(args.old), load_template(args.new))
+    except (OSError, ValueError, KeyError) as e:
+        print("error: %s" % e, file=sys.stderr)
+        return 2
+
+    if os.path.isdir(args.old):
+        changed = bool(plan.create or plan.update or plan.delete)
+        if args.json:
+            print(json.dumps(plan.to_dict(), indent=1, sort_keys=True))
+        else:
+            for entry in plan.create:
+                print("create   %s %s" % (entry["account"], entry["region"]))
+            for entry in plan.update:
+                counts = ", ".join("%d %s" % (n, action) for action, n in entry["summary"].items() if n)
+                print("update   %s %s (%s)" % (entry["account"], entry["region"], counts or "sections only"))
+            for entry in plan.delete:
+                print("delete   %s %s" % (entry["account"], entry["region"]))
+            print("%d to create, %d to update, %d to delete, %d unchanged" % (
+                len(plan.create), len(plan.update), len(plan.delete), plan.unchanged))
+    else:
+        changed = diff.changed
+        if args.json:
+            print(json.dumps(diff.to_dict(), indent=1, sort_keys=True))
+        else:
+            lines = _format_diff(diff)
+            print("\n".join(lines) if lines else "no changes")
+    return 1 if args.exit_code and changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,670 @@
+##########################################################################################
+#  Drift detection: generated templates against what is deployed.                        #
+#                                                                                        #
+#  For every account and region the stack's resources are listed and the VPCs, subnets   #
+#  and route tables behind them described, then compared with the template: CIDR         #
+#  blocks, AZs, tenancy, tags, route entries and subnet associations. Targets are        #
+#  checked concurrently by a bounded pool of asyncio tasks, so checking hundreds of      #
+#  accounts takes about as long as the slowest few, not the sum of all of them.          #
+#                                                                                        #
+#  As in cfvpc/rollout.py the AWS calls sit behind a small backend interface:            #
+#  Boto3Backend finds each stack set instance and describes it from inside its account   #
+#  through the stack set execution role, FakeBackend deploys templates in-process with   #
+#  no network, for tests and dry runs. Resources in nested stacks are not checked.       #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.drift --stack-set DemoVPC build/          (--targets output)  #
+#         python3 -m cfvpc.drift --stack-set DemoVPC cloudformation.json                 #
+#             --accounts 111 222 --regions eu-central-1 [--concurrency 32] [--fake]      #
+##########################################################################################
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from cfvpc.refs import is_pseudo
+
+IN_SYNC, MODIFIED, DELETED = "IN_SYNC", "MODIFIED", "DELETED"
+# Target statuses besides IN_SYNC
+DRIFTED, NO_STACK, ERROR = "DRIFTED", "NO_STACK", "ERROR"
+
+VPC, SUBNET, ROUTE_TABLE = "AWS::EC2::VPC", "AWS::EC2::Subnet", "AWS::EC2::RouteTable"
+# Resource types compared with live state; routes and associations are checked as
+# part of their route table, everything else is counted as not checked.
+CHECKED = (VPC, SUBNET, ROUTE_TABLE)
+PART_OF_ROUTE_TABLE = ("AWS::EC2::Route", "AWS::EC2::SubnetRouteTableAssociation")
+
+# Route properties naming where traffic goes
+ROUTE_TARGETS = (
+    "GatewayId", "NatGatewayId", "TransitGatewayId", "EgressOnlyInternetGatewayId",
+    "VpcPeeringConnectionId", "NetworkInterfaceId", "InstanceId", "VpcEndpointId",
+    "CarrierGatewayId", "LocalGatewayId", "CoreNetworkArn",
+)
+
+EXECUTION_ROLE = "AWSCloudFormationStackSetExecutionRole"
+
+# Expected values that cannot be worked out from outside CloudFormation
+# (GetAtt, FindInMap, ...); they match anything.
+_UNKNOWN = object()
+
+
+@dataclass
+class Stack:
+    """A deployed stack: its ID, logical to physical resource IDs and its region's AZs.
+
+    ``tags`` are the stack's own tags, which CloudFormation copies onto every
+    resource unless the template sets the same key.
+    """
+
+    stack_id: str
+    region: str
+    resources: dict
+    azs: list = field(default_factory=list)
+    tags: dict = field(default_factory=dict)
+
+
+def resolve(value, stack):
+    """Template JSON ``value`` with intrinsic functions evaluated against ``stack``."""
+    if isinstance(value, list):
+        return [resolve(item, stack) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        (name, arg), = value.items()
+        if name == "Ref":
+            if is_pseudo(arg):
+                return {"AWS::StackId": stack.stack_id, "AWS::Region": stack.region}.get(arg, _UNKNOWN)
+            return stack.resources.get(arg, _UNKNOWN)
+        if name == "Fn::GetAZs":
+            return list(stack.azs) if stack.azs else _UNKNOWN
+        if name == "Fn::Select":
+            index, values = resolve(arg, stack)
+            if index is _UNKNOWN or values is _UNKNOWN or not 0 <= int(index) < len(values):
+                return _UNKNOWN
+            return values[int(index)]
+        if name == "Fn::Join":
+            delimiter, values = resolve(arg, stack)
+            if values is _UNKNOWN or any(item is _UNKNOWN for item in values):
+                return _UNKNOWN
+            return delimiter.join(str(item) for item in values)
+        if name.startswith("Fn::"):
+            return _UNKNOWN
+    return {key: resolve(item, stack) for key, item in value.items()}
+
+
+def _tags(tags):
+    """``{key: value}`` of a Tags list, without the aws: tags AWS adds on its own."""
+    if tags is _UNKNOWN:
+        return _UNKNOWN
+    return {tag["Key"]: tag["Value"] for tag in tags or () if not tag["Key"].startswith("aws:")}
+
+
+def _route_target(route):
+    """"NatGatewayId=nat-0123..." for a route, template or EC2 shaped."""
+    for key in ROUTE_TARGETS:
+        if route.get(key) is _UNKNOWN:
+            return _UNKNOWN
+        if route.get(key):
+            return "%s=%s" % (key, route[key])
+    return None
+
+
+def _route_destination(route):
+    return route.get("DestinationCidrBlock") or route.get("DestinationIpv6CidrBlock")
+
+
+def expected_state(template, stack):
+    """``{logical ID: (type, {property: value})}`` of the checked resources of ``template``."""
+    resources = template.get("Resources", {})
+    expected = {}
+    resolved = {
+        title: resolve(resource.get("Properties", {}), stack)
+        for title, resource in resources.items()
+        if resource.get("Type") in CHECKED + PART_OF_ROUTE_TABLE
+    }
+    for title, resource in resources.items():
+        props = resolved.get(title)
+        if resource.get("Type") == VPC:
+            state = {"CidrBlock": props.get("CidrBlock"), "InstanceTenancy": props.get("InstanceTenancy", "default")}
+        elif resource.get("Type") == SUBNET:
+            state = {key: props.get(key) for key in ("CidrBlock", "VpcId", "AvailabilityZone")}
+        elif resource.get("Type") == ROUTE_TABLE:
+            state = {"VpcId": props.get("VpcId"), "Routes": {}, "Associations": []}
+        else:
+            continue
+        tags = _tags(props.get("Tags"))
+        state["Tags"] = tags if tags is _UNKNOWN else dict(stack.tags, **tags)
+        expected[title] = (resource["Type"], state)
+
+    # Routes and subnet associations belong to the route table they name
+    for title, resource in resources.items():
+        if resource.get("Type") not in PART_OF_ROUTE_TABLE:
+            continue
+        table = resource.get("Properties", {}).get("RouteTableId")
+        table = table.get("Ref") if isinstance(table, dict) else None
+        if table not in expected:
+            continue
+        state, props = expected[table][1], resolved[title]
+        if resource["Type"] == "AWS::EC2::Route":
+            destination = _route_destination(props)
+            if destination is not _UNKNOWN:
+                state["Routes"][destination] = _route_target(props)
+        else:
+            state["Associations"].append(props.get("SubnetId"))
+    for _, state in expected.values():
+        if "Associations" in state:
+            associations = state["Associations"]
+            state["Associations"] = _UNKNOWN if _UNKNOWN in associations else sorted(associations)
+    return expected
+
+
+def live_state(resource_type, description):
+    """``{property: value}`` of an EC2 describe call's ``description``, shaped like expected_state()."""
+    if resource_type == VPC:
+        state = {"CidrBlock": description["CidrBlock"], "InstanceTenancy": description.get("InstanceTenancy")}
+    elif resource_type == SUBNET:
+        state = {key: description.get(key) for key in ("CidrBlock", "VpcId", "AvailabilityZone")}
+    else:
+        state = {
+            "VpcId": description.get("VpcId"),
+            # The local route comes with the table, gateway endpoints manage their prefix list routes
+            "Routes": {
+                _route_destination(route): _route_target(route)
+                for route in description.get("Routes", ())
+                if route.get("Origin") != "CreateRouteTable" and not route.get("DestinationPrefixListId")
+            },
+            "Associations": sorted(
+                association["SubnetId"] for association in description.get("Associations", ())
+                if association.get("SubnetId")
+            ),
+        }
+    state["Tags"] = _tags(description.get("Tags"))
+    return state
+
+
+def differences(expected, actual):
+    """``[(property, expected, actual)]``; Tags and Routes are compared entry by entry."""
+    found = []
+    for name in expected:
+        want, have = expected[name], actual.get(name)
+        if want is _UNKNOWN:
+            continue
+        if isinstance(want, dict):
+            have = have or {}
+            for key in sorted(set(want) | set(have), key=str):
+                if want.get(key) is not _UNKNOWN and want.get(key) != have.get(key):
+                    found.append(("%s[%s]" % (name, key), want.get(key), have.get(key)))
+        elif want != have:
+            found.append((name, want, have))
+    return found
+
+
+@dataclass
+class ResourceDrift:
+    logical_id: str
+    resource_type: str
+    physical_id: str = None
+    status: str = MODIFIED
+    # (property, expected, actual) triples
+    differences: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "logical_id": self.logical_id,
+            "type": self.resource_type,
+            "physical_id": self.physical_id,
+            "status": self.status,
+            "differences": [
+                {"property": name, "expected": expected, "actual": actual}
+                for name, expected, actual in self.differences
+            ],
+        }
+
+
+@dataclass
+class TargetReport:
+    account: str
+    region: str
+    status: str = IN_SYNC
+    stack_id: str = None
+    checked: int = 0
+    not_checked: int = 0
+    resources: list = field(default_factory=list)
+    reason: str = ""
+    latency: float = None
+
+    def to_dict(self):
+        return {
+            "account": self.account,
+            "region": self.region,
+            "status": self.status,
+            "stack_id": self.stack_id,
+            "checked": self.checked,
+            "not_checked": self.not_checked,
+            "reason": self.reason,
+            "latency": None if self.latency is None else round(self.latency, 3),
+            "resources": [drift.to_dict() for drift in self.resources],
+        }
+
+
+@dataclass
+class DriftReport:
+    targets: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def drifted(self):
+        return [target for target in self.targets if target.status != IN_SYNC]
+
+    def summary(self):
+        counts = dict.fromkeys((IN_SYNC, DRIFTED, NO_STACK, ERROR), 0)
+        for target in self.targets:
+            counts[target.status] += 1
+        return counts
+
+    def to_dict(self):
+        return {
+            "summary": self.summary(),
+            "seconds": round(self.seconds, 3),
+            "targets": [target.to_dict() for target in self.targets],
+        }
+
+
+def compare_stack(template, stack, live):
+    """``(drifts, checked, not checked)`` of ``template`` against ``live``, ``{id: (type, description)}``."""
+    drifts = []
+    for title, (resource_type, expected) in sorted(expected_state(template, stack).items()):
+        physical = stack.resources.get(title)
+        if physical is None or physical not in live:
+            drifts.append(ResourceDrift(title, resource_type, physical, DELETED))
+            continue
+        found = differences(expected, live_state(resource_type, live[physical][1]))
+        if found:
+            drifts.append(ResourceDrift(title, resource_type, physical, MODIFIED, found))
+    resources = template.get("Resources", {})
+    checked = sum(1 for r in resources.values() if r.get("Type") in CHECKED + PART_OF_ROUTE_TABLE)
+    return drifts, checked, len(resources) - checked
+
+
+async def check_target(backend, account, region, template):
+    """TargetReport of one account and region."""
+    report = TargetReport(account, region)
+    stack = await backend.describe_stack(account, region)
+    if stack is None:
+        report.status = NO_STACK
+        return report
+    report.stack_id = stack["StackId"]
+    # Conditional resources that were not created are not drift
+    template = dict(template, Resources={
+        title: resource for title, resource in template.get("Resources", {}).items()
+        if "Condition" not in resource or title in stack["Resources"]
+    })
+    ids = {resource_type: [] for resource_type in CHECKED}
+    for title, resource in template["Resources"].items():
+        if resource.get("Type") in ids and title in stack["Resources"]:
+            ids[resource["Type"]].append(stack["Resources"][title])
+    azs, vpcs, subnets, tables = await asyncio.gather(
+        backend.describe_availability_zones(account, region),
+        backend.describe_vpcs(account, region, ids[VPC]),
+        backend.describe_subnets(account, region, ids[SUBNET]),
+        backend.describe_route_tables(account, region, ids[ROUTE_TABLE]),
+    )
+    live = {}
+    for resource_type, key, descriptions in (
+            (VPC, "VpcId", vpcs), (SUBNET, "SubnetId", subnets), (ROUTE_TABLE, "RouteTableId", tables)):
+        for description in descriptions:
+            live[description[key]] = (resource_type, description)
+    stack = Stack(stack["StackId"], region, stack["Resources"], azs, _tags(stack.get("Tags")))
+    report.resources, report.checked, report.not_checked = compare_stack(template, stack, live)
+    if report.resources:
+        report.status = DRIFTED
+    return report
+
+
+async def detect_drift(backend, targets, concurrency=16, clock=time.monotonic):
+    """Check ``[(account, region, template)]``, at most ``concurrency`` at a time; returns a DriftReport."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(account, region, template):
+        async with gate:
+            started = clock()
+            try:
+                report = await check_target(backend, account, region, template)
+            except Exception as e:
+                report = TargetReport(account, region, ERROR, reason="%s: %s" % (type(e).__name__, e))
+            report.latency = clock() - started
+            return report
+
+    started = clock()
+    reports = await asyncio.gather(*(one(*target) for target in targets))
+    return DriftReport(list(reports), clock() - started)
+
+
+class Boto3Backend:
+    """Stack set instances described through boto3, inside each account through ``role_name``.
+
+    Blocking calls run on the backend's own pool of ``max_workers`` threads;
+    asyncio's default executor would cap them at a few per CPU whatever the
+    concurrency asked for. close() shuts the pool down.
+    """
+
+    # Values per describe filter
+    BATCH = 200
+
+    def __init__(self, stack_set, role_name=EXECUTION_ROLE, session=None, max_workers=64):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("Boto3Backend needs boto3: pip install boto3")
+        self.boto3 = boto3
+        self.stack_set = stack_set
+        self.role_name = role_name
+        self.session = session or boto3.Session()
+        self.cloudformation = self.session.client("cloudformation")
+        self.sts = self.session.client("sts")
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="cfvpc-drift")
+        self._sessions, self._clients = {}, {}
+        # One lock per account, so assuming the role in one account holds up no other
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._executor.shutdown()
+
+    async def _run(self, function):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function)
+
+    def _client(self, service, account, region):
+        """Client of ``service`` in ``account`` and ``region``; sessions are not thread-safe, clients are."""
+        client = self._clients.get((service, account, region))
+        if client is not None:
+            return client
+        with self._lock:
+            lock = self._locks.setdefault(account, threading.Lock())
+        with lock:
+            session = self._sessions.get(account)
+            if session is None:
+                credentials = self.sts.assume_role(
+                    RoleArn="arn:aws:iam::%s:role/%s" % (account, self.role_name),
+                    RoleSessionName="cfvpc-drift",
+                )["Credentials"]
+                session = self._sessions[account] = self.boto3.Session(
+                    aws_access_key_id=credentials["AccessKeyId"],
+                    aws_secret_access_key=credentials["SecretAccessKey"],
+                    aws_session_token=credentials["SessionToken"],
+                )
+            client = self._clients.get((service, account, region))
+            if client is None:
+                client = self._clients[service, account, region] = session.client(service, region_name=region)
+            return client
+
+    async def describe_stack(self, account, region):
+        def fetch():
+            summaries = self.cloudformation.list_stack_instances(
+                StackSetName=self.stack_set, StackInstanceAccount=account, StackInstanceRegion=region,
+            )["Summaries"]
+            if not summaries or not summaries[0].get("StackId"):
+                return None
+            stack_id = summaries[0]["StackId"]
+            cloudformation = self._client("cloudformation", account, region)
+            tags = cloudformation.describe_stacks(StackName=stack_id)["Stacks"][0].get("Tags", [])
+            paginator = cloudformation.get_paginator("list_stack_resources")
+            resources = {}
+            for page in paginator.paginate(StackName=stack_id):
+                for summary in page["StackResourceSummaries"]:
+                    if summary.get("PhysicalResourceId") and summary["ResourceStatus"] != "DELETE_COMPLETE":
+                        resources[summary["LogicalResourceId"]] = summary["PhysicalResourceId"]
+            return {"StackId": stack_id, "Resources": resources, "Tags": tags}
+
+        return await self._run(fetch)
+
+    async def describe_availability_zones(self, account, region):
+        def fetch():
+            zones = self._client("ec2", account, region).describe_availability_zones(
+                Filters=[{"Name": "opt-in-status", "Values": ["opt-in-not-required"]}],
+            )["AvailabilityZones"]
+            return sorted(zone["ZoneName"] for zone in zones)
+
+        return await self._run(fetch)
+
+    async def _describe(self, account, region, operation, key, id_filter, ids):
+        def fetch():
+            paginator = self._client("ec2", account, region).get_paginator(operation)
+            found = []
+            for i in range(0, len(ids), self.BATCH):
+                # A filter skips IDs that are gone, where listing them by ID would fail the call
+                filters = [{"Name": id_filter, "Values": ids[i:i + self.BATCH]}]
+                for page in paginator.paginate(Filters=filters):
+                    found += page[key]
+            return found
+
+        return await self._run(fetch)
+
+    async def describe_vpcs(self, account, region, ids):
+        return await self._describe(account, region, "describe_vpcs", "Vpcs", "vpc-id", ids)
+
+    async def describe_subnets(self, account, region, ids):
+        return await self._describe(account, region, "describe_subnets", "Subnets", "subnet-id", ids)
+
+    async def describe_route_tables(self, account, region, ids):
+        return await self._describe(account, region, "describe_route_tables", "RouteTables", "route-table-id", ids)
+
+
+# Physical ID prefixes of the fake backend
+_PREFIXES = {
+    "AWS::EC2::EIP": "eipalloc-",
+    "AWS::EC2::EgressOnlyInternetGateway": "eigw-",
+    "AWS::EC2::InternetGateway": "igw-",
+    "AWS::EC2::NatGateway": "nat-",
+    "AWS::EC2::NetworkAcl": "acl-",
+    "AWS::EC2::RouteTable": "rtb-",
+    "AWS::EC2::SecurityGroup": "sg-",
+    "AWS::EC2::Subnet": "subnet-",
+    "AWS::EC2::SubnetRouteTableAssociation": "rtbassoc-",
+    "AWS::EC2::TransitGateway": "tgw-",
+    "AWS::EC2::TransitGatewayAttachment": "tgw-attach-",
+    "AWS::EC2::TransitGatewayRouteTable": "tgw-rtb-",
+    "AWS::EC2::VPC": "vpc-",
+    "AWS::EC2::VPCEndpoint": "vpce-",
+}
+
+
+class FakeBackend:
+    """In-process stand-in for CloudFormation and EC2.
+
+    deploy() creates a template's stack the way CloudFormation would, with
+    made-up physical IDs. EC2 state lives in ``vpcs``, ``subnets`` and
+    ``route_tables`` (``{(account, region): {id: description}}``) shaped
+    like the describe calls' responses, so tests can drift it by hand.
+    Every call waits ``latency(account, region)`` seconds; ``peak`` is the
+    most calls that were in flight at once.
+    """
+
+    def __init__(self, latency=None, zones="abc"):
+        self.latency = latency or (lambda account, region: 0.0)
+        self.zones = zones
+        self.stacks = {}
+        self.vpcs, self.subnets, self.route_tables = {}, {}, {}
+        self.calls = 0
+        self.peak = 0
+        self._active = 0
+        self._ids = itertools.count(1)
+
+    def deploy(self, account, region, template, stack_tags=()):
+        """Create the stack of ``template`` in ``account`` and ``region``; returns its physical IDs.
+
+        ``stack_tags`` (``[{"Key": k, "Value": v}]``) are copied onto
+        resources that do not set the key themselves.
+        """
+        key = account, region
+        resources = {
+            title: "%s%017x" % (_PREFIXES.get(resource.get("Type"), "res-"), next(self._ids))
+            for title, resource in template.get("Resources", {}).items()
+            if "Condition" not in resource
+        }
+        stack_id = "arn:aws:cloudformation:%s:%s:stack/StackSet-fake-%d" % (region, account, next(self._ids))
+        self.stacks[key] = {"StackId": stack_id, "Resources": resources, "Tags": list(stack_tags)}
+        stack = Stack(stack_id, region, resources, ["%s%s" % (region, zone) for zone in self.zones])
+        vpcs = self.vpcs.setdefault(key, {})
+        subnets = self.subnets.setdefault(key, {})
+        tables = self.route_tables.setdefault(key, {})
+
+        parts = []
+        for title, physical in resources.items():
+            resource = template["Resources"][title]
+            props = resolve(resource.get("Properties", {}), stack)
+            own = list(props.get("Tags", ()))
+            tags = own + [tag for tag in stack_tags if tag["Key"] not in {t["Key"] for t in own}] + [
+                {"Key": "aws:cloudformation:stack-id", "Value": stack_id},
+                {"Key": "aws:cloudformation:logical-id", "Value": title},
+            ]
+            if resource["Type"] == VPC:
+                vpcs[physical] = {
+                    "VpcId": physical, "CidrBlock": props["CidrBlock"],
+                    "InstanceTenancy": props.get("InstanceTenancy", "default"), "Tags": tags,
+                }
+            elif resource["Type"] == SUBNET:
+                subnets[physical] = {
+                    "SubnetId": physical, "VpcId": props["VpcId"], "CidrBlock": props["CidrBlock"],
+                    "AvailabilityZone": props["AvailabilityZone"], "Tags": tags,
+                }
+            elif resource["Type"] == ROUTE_TABLE:
+                tables[physical] = {
+                    "RouteTableId": physical, "VpcId": props["VpcId"], "Tags": tags, "Associations": [],
+                    "Routes": [{"DestinationCidrBlock": None, "GatewayId": "local", "Origin": "CreateRouteTable"}],
+                }
+            else:
+                parts.append((resource["Type"], physical, props))
+
+        for table in tables.values():
+            table["Routes"][0]["DestinationCidrBlock"] = vpcs[table["VpcId"]]["CidrBlock"]
+        for resource_type, physical, props in parts:
+            if resource_type == "AWS::EC2::Route":
+                route = {key: value for key, value in props.items() if key != "RouteTableId"}
+                tables[props["RouteTableId"]]["Routes"].append(dict(route, Origin="CreateRoute", State="active"))
+            elif resource_type == "AWS::EC2::SubnetRouteTableAssociation":
+                tables[props["RouteTableId"]]["Associations"].append(
+                    {"RouteTableAssociationId": physical, "SubnetId": props["SubnetId"], "Main": False},
+                )
+            elif resource_type == "AWS::EC2::VPCEndpoint" and props.get("VpcEndpointType") == "Gateway":
+                for table in props.get("RouteTableIds", ()):
+                    tables[table]["Routes"].append({
+                        "DestinationPrefixListId": "pl-%08x" % next(self._ids), "GatewayId": physical,
+                        "Origin": "CreateRoute",
+                    })
+        return resources
+
+    async def _call(self, account, region):
+        self.calls += 1
+        self._active += 1
+        self.peak = max(self.peak, self._active)
+        try:
+            await asyncio.sleep(self.latency(account, region))
+        finally:
+            self._active -= 1
+
+    async def describe_stack(self, account, region):
+        await self._call(account, region)
+        return self.stacks.get((account, region))
+
+    async def describe_availability_zones(self, account, region):
+        await self._call(account, region)
+        return ["%s%s" % (region, zone) for zone in self.zones]
+
+    async def _describe(self, state, account, region, ids):
+        await self._call(account, region)
+        found = state.get((account, region), {})
+        return [found[i] for i in ids if i in found]
+
+    async def describe_vpcs(self, account, region, ids):
+        return await self._describe(self.vpcs, account, region, ids)
+
+    async def describe_subnets(self, account, region, ids):
+        return await self._describe(self.subnets, account, region, ids)
+
+    async def describe_route_tables(self, account, region, ids):
+        return await self._describe(self.route_tables, account, region, ids)
+
+
+def drift_targets(path, accounts=(), regions=()):
+    """``[(account, region, template)]`` of a --targets output directory, or of one template."""
+    from cfvpc.diff import load_manifest
+    from cfvpc.validate import load_template
+
+    if os.path.isdir(path):
+        return [
+            (account, region, load_template(os.path.join(path, entry["template"])))
+            for (account, region), entry in sorted(load_manifest(path).items())
+        ]
+    template = load_template(path)
+    return [(account, region, template) for account in accounts for region in regions]
+
+
+def _show(value):
+    return "-" if value is None else json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare generated templates with the deployed VPCs.")
+    parser.add_argument("templates", help="--targets output directory, or one template for --accounts and --regions")
+    parser.add_argument("--stack-set", help="stack set the templates were rolled out with")
+    parser.add_argument("--accounts", nargs="+", default=[])
+    parser.add_argument("--regions", nargs="+", default=[])
+    parser.add_argument("--concurrency", type=int, default=16, help="accounts and regions checked at once")
+    parser.add_argument("--role-name", default=EXECUTION_ROLE, help="role assumed in each target account")
+    parser.add_argument("--fake", action="store_true",
+                        help="deploy the templates to an in-process stand-in and check that, no AWS calls")
+    parser.add_argument("--stack-tags", metavar="FILE",
+                        help="with --fake, stack tags (as written by --stack-tags) to deploy with")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--exit-code", action="store_true", help="exit 1 unless every target is in sync")
+    args = parser.parse_args(argv)
+    if os.path.isdir(args.templates) == bool(args.accounts and args.regions):
+        parser.error("pass a --targets output directory, or a template with --accounts and --regions")
+    if not (args.fake or args.stack_set):
+        parser.error("--stack-set is required unless --fake")
+
+    targets = drift_targets(args.templates, args.accounts, args.regions)
+    if args.fake:
+        backend = FakeBackend()
+        stack_tags = []
+        if args.stack_tags:
+            with open(args.stack_tags) as f:
+                stack_tags = json.load(f)
+        for account, region, template in targets:
+            backend.deploy(account, region, template, stack_tags)
+    else:
+        # Every target makes up to four describe calls at once
+        backend = Boto3Backend(args.stack_set, args.role_name, max_workers=4 * args.concurrency)
+    try:
+        report = asyncio.run(detect_drift(backend, targets, args.concurrency))
+    finally:
+        if not args.fake:
+            backend.close()
+
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=1))
+    else:
+        for target in report.targets:
+            latency = "-" if target.latency is None else "%.1fs" % target.latency
+            print("%-14s %-16s %-9s %4d checked %3d drifted %8s %s" % (
+                target.account, target.region, target.status, target.checked, len(target.resources),
+                latency, target.reason))
+            for drift in target.resources:
+                print("    %-8s %-40s %s" % (drift.status, drift.logical_id, drift.physical_id or ""))
+                for name, expected, actual in drift.differences:
+                    print("             %s: expected %s, found %s" % (name, _show(expected), _show(actual)))
+        counts = report.summary()
+        print("%d targets: %d in sync, %d drifted, %d without stack, %d failed in %.1fs" % (
+            len(report.targets), counts[IN_SYNC], counts[DRIFTED], counts[NO_STACK], counts[ERROR], report.seconds))
+    return 1 if args.exit_code and report.drifted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+##########################################################################################
+#  Streaming template serializer.                                                       #
+#                                                                                        #
+#  Template.to_json() encodes every resource into one dict and then the whole dict into #
+#  one string before anything is written. stream_template() encodes and writes each     #
+#  resource of a Template on its own. stream_estate(), the script's path, builds no     #
+#  Template: it renders each environment to sorted JSON chunks and merges them, so the  #
+#  chunks of the whole template are held, but never one dict or string of all of it.   #
+#  The bytes written are identical to Template.to_json() (or to_yaml() for YAML).       #
+#                                                                                        #
+#  The compact format is minified JSON with sorted keys. Tags shared by every resource  #
+#  can be hoisted out of it into stack-level tags, which CloudFormation propagates.    #
+#                                                                                        #
+#  Builder resources are encoded straight from their IR records; troposphere is only   #
+#  imported for troposphere objects, and the builder only when something is rendered.  #
+##########################################################################################
+
+import copy
+import heapq
+import json
+
+from cfvpc import budget, ir
+from cfvpc.cidr import check_estate
+from cfvpc.groups import estate_plan, group_specs
+
+# Template.to_json() defaults
+INDENT = 1
+SEPARATORS = (",", ": ")
+COMPACT_SEPARATORS = (",", ":")
+
+# Output formats
+FORMATS = ("json", "yaml", "compact")
+
+# Tag CloudFormation already puts on every resource as aws:cloudformation:stack-id
+STACK_ID_TAG = {"Key": "Application", "Value": {"Ref": "AWS::StackId"}}
+
+
+def _dumps(obj, level):
+    """``obj`` as JSON, indented as if nested ``level`` objects deep."""
+    text = json.dumps(obj, indent=INDENT, sort_keys=True, separators=SEPARATORS)
+    if level:
+        text = text.replace("\n", "\n" + " " * (INDENT * level))
+    return text
+
+
+def _yaml(obj):
+    import cfn_flip
+
+    return cfn_flip.to_yaml(json.dumps(obj, sort_keys=True))
+
+
+def _encode(resource):
+    if isinstance(resource, dict):
+        return resource
+    if isinstance(resource, ir.Resource):
+        return resource.to_dict()
+    from troposphere import encode_to_dict
+
+    return encode_to_dict(resource.to_dict())
+
+
+def render_resource(title, resource):
+    """One entry of the Resources section, as it appears in the JSON template."""
+    return "%s%s: %s" % (" " * (INDENT * 2), json.dumps(title), _dumps(_encode(resource), 2))
+
+
+def render_resource_yaml(title, resource):
+    """One entry of the Resources section, as it appears in the YAML template."""
+    lines = _yaml({title: _encode(resource)}).splitlines(True)
+    return "".join("  " + line if line.strip() else line for line in lines)
+
+
+def write_chunks(fp, header, chunks):
+    """Write a JSON template from its non-resource sections and rendered resources.
+
+    ``header`` is the template dict without Resources, ``chunks`` yields
+    ``(logical_id, render_resource(...))`` pairs sorted by logical ID.
+    """
+    fp.write("{")
+    first = True
+    for key in sorted(dict(header, Resources=None)):
+        fp.write("%s\n%s%s: " % ("" if first else ",", " " * INDENT, json.dumps(key)))
+        first = False
+        if key != "Resources":
+            fp.write(_dumps(header[key], 1))
+            continue
+        empty = True
+        for _, chunk in chunks:
+            fp.write("{\n" if empty else ",\n")
+            fp.write(chunk)
+            empty = False
+        fp.write("{}" if empty else "\n%s}" % (" " * INDENT))
+    fp.write("\n}")
+
+
+def render_resource_compact(title, resource):
+    """One entry of the Resources section of a compact template."""
+    return "%s:%s" % (json.dumps(title), json.dumps(_encode(resource), sort_keys=True, separators=COMPACT_SEPARATORS))
+
+
+def write_compact_chunks(fp, header, chunks):
+    """Compact counterpart of write_chunks(), fed by render_resource_compact()."""
+    fp.write("{")
+    first = True
+    for key in sorted(dict(header, Resources=None)):
+        fp.write("%s%s:" % ("" if first else ",", json.dumps(key)))
+        first = False
+        if key != "Resources":
+            fp.write(json.dumps(header[key], sort_keys=True, separators=COMPACT_SEPARATORS))
+            continue
+        fp.write("{%s}" % ",".join(chunk for _, chunk in chunks))
+    fp.write("}")
+
+
+def write_yaml_chunks(fp, header, chunks):
+    """YAML counterpart of write_chunks(), fed by render_resource_yaml()."""
+    for key in sorted(dict(header, Resources=None)):
+        if key != "Resources":
+            fp.write(_yaml({key: header[key]}))
+            continue
+        empty = True
+        for _, chunk in chunks:
+            if empty:
+                fp.write("Resources:\n")
+            fp.write(chunk)
+            empty = False
+        if empty:
+            fp.write("Resources: {}\n")
+
+
+RENDERERS = {"json": render_resource, "yaml": render_resource_yaml, "compact": render_resource_compact}
+WRITERS = {"json": write_chunks, "yaml": write_yaml_chunks, "compact": write_compact_chunks}
+# File name extension of each format
+EXTENSIONS = {"json": "json", "yaml": "yaml", "compact": "json"}
+
+
+def common_tags(estate):
+    """``{key: value}`` of the literal tags every environment (and hub) of ``estate`` carries."""
+    owners = list(estate.environments)
+    if estate.transit_gateway is not None:
+        owners.append(estate.transit_gateway)
+    if not owners:
+        return {}
+    shared = set(owners[0].tags)
+    for owner in owners[1:]:
+        shared &= set(owner.tags)
+    return dict(sorted(shared))
+
+
+def strip_tags(resource, tags):
+    """Encoded ``resource`` without ``tags`` and the stack ID tag, which stack-level tags replace."""
+    data = _encode(resource)
+    properties = data.get("Properties", {})
+    if "Tags" not in properties:
+        return data
+    kept = [
+        tag for tag in properties["Tags"]
+        if tag != STACK_ID_TAG and tags.get(tag.get("Key"), tag) != tag.get("Value")
+    ]
+    data = dict(data, Properties=dict(properties))
+    if kept:
+        data["Properties"]["Tags"] = kept
+    else:
+        del data["Properties"]["Tags"]
+    return data
+
+
+def template_header(t):
+    """Every section of template ``t`` except Resources, encoded."""
+    shell = copy.copy(t)
+    shell.resources = {}
+    header = shell.to_dict()
+    del header["Resources"]
+    return header
+
+
+def stream_template(t, fp, fmt="json"):
+    """Write ``t`` to ``fp`` one resource at a time, exactly as t.to_json()/to_yaml()."""
+    render = RENDERERS[fmt]
+    chunks = ((title, render(title, t.resources[title])) for title in sorted(t.resources))
+    WRITERS[fmt](fp, template_header(t), chunks)
+
+
+def render_resources(resources, fmt="json", stack_tags=None):
+    """``[logical_id, chunk]`` pairs of ``resources``, sorted by logical ID.
+
+    With ``stack_tags`` those tags are left to the stack (see strip_tags()).
+    """
+    render = RENDERERS[fmt]
+    if stack_tags is not None:
+        return sorted([r.title, render(r.title, strip_tags(r, stack_tags))] for r in resources)
+    return sorted([r.title, render(r.title, r)] for r in resources)
+
+
+def render_environment(spec, fmt="json"):
+    """``[logical_id, chunk]`` pairs of one environment, sorted by logical ID."""
+    from cfvpc.builder import environment_resources
+
+    return render_resources(environment_resources(spec), fmt)
+
+
+def stream_estate(estate, fp, fmt="json", cache=None, stack_tags=None):
+    """Write the template of ``estate`` without building a Template first.
+
+    Every group (environment or Transit Gateway hub) is rendered on its own
+    (or taken from ``cache``, a BuildCache) and the sorted fragments are
+    merged into the Resources section, so the output matches
+    build_template() + stream_template(). ``stack_tags`` (normally
+    common_tags(estate)) are left out of every resource.
+
+    Resources are sorted across groups, so every fragment is rendered and
+    held before the first one is written: memory grows with the template,
+    bounded only by the 500-resource cap checked here. Holding the groups'
+    IR records instead and rendering as they are written peaks higher, the
+    records are larger than their JSON (benchmarks/bench_emit.py).
+    """
+    check_estate(estate)
+    plan = estate_plan(estate)
+    fragments = []
+    for name, spec in group_specs(estate, plan).items():
+        def render():
+            from cfvpc.builder import estate_groups
+
+            return render_resources(next(estate_groups(estate, {name}, plan))[1], fmt, stack_tags)
+
+        if cache is None:
+            fragments.append(render())
+        else:
+            fragments.append(cache.fetch(cache.key("fragment", fmt, spec, stack_tags), render))
+
+    if sum(len(fragment) for fragment in fragments) > budget.MAX_RESOURCES:
+        raise ValueError("Maximum number of resources %d reached" % budget.MAX_RESOURCES)
+
+    def chunks():
+        previous = None
+        for title, chunk in heapq.merge(*fragments):
+            if title == previous:
+                raise ValueError('duplicate key "%s" detected' % title)
+            previous = title
+            yield title, chunk
+
+    header = {"AWSTemplateFormatVersion": "2010-09-09", "Description": estate.description}
+    WRITERS[fmt](fp, header, chunks())
@@ -0,0 +1,232 @@
+##########################################################################################
+#  Deployment critical path and dependency optimizer.                                   #
+#                                                                                        #
+#  CloudFormation creates a resource as soon as everything it references (Ref, GetAtt)  #
+#  or waits for (DependsOn) is complete, so stack creation takes as long as the most    #
+#  expensive chain through the dependency graph. With a per-type creation-time          #
+#  estimate this reports that chain.                                                     #
+#                                                                                        #
+#  --optimize also writes a copy of the template with:                                  #
+#  - duplicate VPC gateway attachments (same VPC and gateway) merged into one           #
+#  - DependsOn entries dropped when a Ref/GetAtt or another chain already implies them  #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.graph cloudformation.json [--optimize OUT.json] [--json]     #
+##########################################################################################
+
+import argparse
+import copy
+import json
+import sys
+from collections import deque
+
+from cfvpc.refs import depends_on, references
+from cfvpc.validate import dependency_graph, load_template
+
+# Rough creation times in seconds, from typical stack events.
+CREATION_SECONDS = {
+    "AWS::CloudFormation::Stack": 60,
+    "AWS::CloudWatch::Alarm": 5,
+    "AWS::EC2::EIP": 5,
+    "AWS::EC2::EgressOnlyInternetGateway": 5,
+    "AWS::EC2::FlowLog": 10,
+    "AWS::EC2::InternetGateway": 10,
+    "AWS::EC2::NatGateway": 100,
+    "AWS::EC2::NetworkAcl": 5,
+    "AWS::EC2::NetworkAclEntry": 2,
+    "AWS::EC2::Route": 5,
+    "AWS::EC2::RouteTable": 5,
+    "AWS::EC2::SecurityGroup": 5,
+    "AWS::EC2::Subnet": 5,
+    "AWS::EC2::SubnetNetworkAclAssociation": 2,
+    "AWS::EC2::SubnetRouteTableAssociation": 2,
+    "AWS::EC2::TransitGateway": 120,
+    "AWS::EC2::TransitGatewayAttachment": 90,
+    "AWS::EC2::TransitGatewayRouteTable": 10,
+    "AWS::EC2::TransitGatewayRouteTableAssociation": 30,
+    "AWS::EC2::TransitGatewayRouteTablePropagation": 30,
+    "AWS::EC2::VPC": 15,
+    "AWS::EC2::VPCCidrBlock": 10,
+    "AWS::EC2::VPCEndpoint": 60,
+    "AWS::EC2::VPCGatewayAttachment": 15,
+    "AWS::IAM::Role": 20,
+    "AWS::Logs::LogGroup": 5,
+}
+DEFAULT_SECONDS = 10
+
+
+def topological_order(graph):
+    """Resources ordered so each comes after everything it waits for."""
+    waiting = {title: len(targets) for title, targets in graph.items()}
+    dependents = {title: [] for title in graph}
+    for title, targets in graph.items():
+        for target in targets:
+            dependents[target].append(title)
+    ready = deque(sorted(title for title, count in waiting.items() if not count))
+    order = []
+    while ready:
+        title = ready.popleft()
+        order.append(title)
+        for dependent in dependents[title]:
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                ready.append(dependent)
+    if len(order) != len(graph):
+        raise ValueError("dependency cycle between %s" % ", ".join(
+            sorted(title for title, count in waiting.items() if count)))
+    return order
+
+
+def critical_path(template, costs=CREATION_SECONDS):
+    """``(estimated seconds, [logical IDs on the longest chain], finish times)``."""
+    resources = template.get("Resources", {})
+    graph = dependency_graph(template)
+    finish, previous = {}, {}
+    for title in topological_order(graph):
+        start = 0
+        for target in graph[title]:
+            if finish[target] > start:
+                start, previous[title] = finish[target], target
+        finish[title] = start + costs.get(resources[title].get("Type"), DEFAULT_SECONDS)
+    if not finish:
+        return 0, [], finish
+    title = max(sorted(finish), key=finish.get)
+    total, path = finish[title], [title]
+    while title in previous:
+        title = previous[title]
+        path.append(title)
+    return total, path[::-1], finish
+
+
+def _replace_refs(value, old, new):
+    if isinstance(value, dict):
+        if value.get("Ref") == old and len(value) == 1:
+            return {"Ref": new}
+        getatt = value.get("Fn::GetAtt")
+        if isinstance(getatt, list) and getatt and getatt[0] == old:
+            return {"Fn::GetAtt": [new] + getatt[1:]}
+        return {k: _replace_refs(v, old, new) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_refs(v, old, new) for v in value]
+    return value
+
+
+def _set_depends_on(resource, targets):
+    if not targets:
+        resource.pop("DependsOn", None)
+    elif isinstance(resource.get("DependsOn"), list):
+        resource["DependsOn"] = targets
+    else:
+        resource["DependsOn"] = targets[0] if len(targets) == 1 else targets
+
+
+def merge_duplicate_attachments(template):
+    """Drop gateway attachments that repeat another one; returns the removed IDs."""
+    resources = template["Resources"]
+    keep, removed = {}, []
+    for title in sorted(resources):
+        resource = resources[title]
+        if resource.get("Type") != "AWS::EC2::VPCGatewayAttachment":
+            continue
+        key = json.dumps(resource.get("Properties", {}), sort_keys=True)
+        if key in keep:
+            removed.append((title, keep[key]))
+        else:
+            keep[key] = title
+    # Prefer to keep the attachment other resources already wait for.
+    waited_on = {t for resource in resources.values() for t in depends_on(resource)}
+    for i, (title, kept) in enumerate(removed):
+        if title in waited_on and kept not in waited_on:
+            removed[i] = (kept, title)
+    for title, kept in removed:
+        del resources[title]
+        for other in list(resources):
+            resources[other] = _replace_refs(resources[other], title, kept)
+            targets = depends_on(resources[other])
+            if title in targets:
+                _set_depends_on(resources[other], list(dict.fromkeys(
+                    kept if t == title else t for t in targets)))
+    return [title for title, _ in removed]
+
+
+def drop_transitive_depends_on(template):
+    """Remove DependsOn entries already implied by other edges; returns (id, target) pairs."""
+    resources = template["Resources"]
+    graph = dependency_graph(template)
+    order = topological_order(graph)
+    reach = {}
+    for title in order:
+        reached = set()
+        for target in graph[title]:
+            reached |= reach[target]
+        reach[title] = reached | graph[title]
+
+    removed = []
+    for title in order:
+        explicit = depends_on(resources[title])
+        implicit = {t for t, _ in references(resources[title].get("Properties", {}))}
+        redundant = [
+            target for target in explicit
+            if target in implicit
+            or any(target in reach[other] for other in graph[title] if other != target)
+        ]
+        if redundant:
+            _set_depends_on(resources[title], [t for t in explicit if t not in redundant])
+            removed.extend((title, target) for target in redundant)
+    return removed
+
+
+def optimize(template):
+    """Optimized copy of a template dict and a list of the changes made."""
+    template = copy.deepcopy(template)
+    changes = ["removed duplicate attachment %s" % title for title in merge_duplicate_attachments(template)]
+    changes += ["dropped %s DependsOn %s" % pair for pair in drop_transitive_depends_on(template)]
+    return template, changes
+
+
+def report(template):
+    total, path, finish = critical_path(template)
+    graph = dependency_graph(template)
+    return {
+        "resources": len(graph),
+        "edges": sum(len(targets) for targets in graph.values()),
+        "estimated_seconds": total,
+        "critical_path": [
+            {"logical_id": title, "type": template["Resources"][title].get("Type"), "finish": finish[title]}
+            for title in path
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Critical path of a CloudFormation template.")
+    parser.add_argument("template")
+    parser.add_argument("--optimize", metavar="OUT", help="write an optimized template here")
+    parser.add_argument("--json", action="store_true", help="machine-readable report")
+    args = parser.parse_args(argv)
+
+    template = load_template(args.template)
+    result = {"before": report(template)}
+    if args.optimize:
+        optimized, changes = optimize(template)
+        with open(args.optimize, "w") as f:
+            f.write(json.dumps(optimized, indent=1, sort_keys=True, separators=(",", ": ")) + "\n")
+        result["after"] = report(optimized)
+        result["changes"] = changes
+
+    if args.json:
+        print(json.dumps(result, indent=1, sort_keys=True))
+        return 0
+    for label in ("before", "after"):
+        if label not in result:
+            continue
+        r = result[label]
+        print("%s: %d resources, %d edges, ~%ds" % (label, r["resources"], r["edges"], r["estimated_seconds"]))
+        for step in r["critical_path"]:
+            print("  %6ds  %-40s %s" % (step["finish"], step["logical_id"], step["type"]))
+    for change in result.get("changes", ()):
+        print(change)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
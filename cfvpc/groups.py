@@ -0,0 +1,72 @@
+##########################################################################################
+#  Estate groups, without troposphere.                                                  #
+#                                                                                        #
+#  A group is what has to stay in one stack: one environment, or the Transit Gateway    #
+#  hub. Everything a group's resources depend on is worked out here from the specs      #
+#  alone, so the cache can tell what changed before the builder (and troposphere) is    #
+#  ever imported.                                                                        #
+##########################################################################################
+
+import dataclasses
+
+from cfvpc.summarize import ROUTE_LIMIT, compile_reachability, summarize
+
+# Bump whenever the resources generated for a given spec change. It is part of
+# every build cache key, so cached fragments of older generators are not reused.
+GENERATOR_VERSION = "4"
+
+
+def transit_hub(estate):
+    """The estate's TransitGatewaySpec with its routes filled in, or None.
+
+    The default routes are the VPC blocks of the estate, summarized: the
+    fewest blocks covering exactly those VPCs. A single covering supernet
+    would reach past them, up to 0.0.0.0/0 for VPCs in different private
+    ranges, where it clashes with the NAT and Internet routes. A block that
+    also covers the VPC itself is fine, the more specific local route wins.
+    """
+    hub = estate.transit_gateway
+    if hub is None or hub.routes or estate.reachability or not estate.environments:
+        return hub
+    routes = summarize(spec.cidr for spec in estate.environments)
+    if len(routes) > ROUTE_LIMIT:
+        raise ValueError("%s: the VPC blocks summarize to %d routes, more than a route table holds (%d); "
+                         "give the transit gateway routes" % (hub.name, len(routes), ROUTE_LIMIT))
+    return dataclasses.replace(hub, routes=tuple(routes))
+
+
+def tier_policies(estate):
+    """``{environment: {tier: TierPolicy}}``; None for an environment when there are no rules."""
+    policies = compile_reachability(estate)
+    return {
+        spec.name: policies.get(spec.name, {} if estate.reachability else None)
+        for spec in estate.environments
+    }
+
+
+def estate_plan(estate):
+    """``(hub, policies)``: transit_hub() and tier_policies() of ``estate``.
+
+    Both walk the whole estate; a build works them out once and hands them
+    to group_specs() and estate_groups() for every group it renders.
+    """
+    return transit_hub(estate), tier_policies(estate)
+
+
+def group_specs(estate, plan=None):
+    """``{group name: JSON-able spec}``, everything a group's resources depend on."""
+    hub, policies = plan or estate_plan(estate)
+    specs = {}
+    if hub is not None:
+        specs[hub.name] = {"transit_gateway": hub.to_dict()}
+    for spec in estate.environments:
+        specs[spec.name] = spec.to_dict()
+        if hub is not None:
+            specs[spec.name]["transit_gateway"] = hub.to_dict()
+        # None (no rules in the estate: every hub route) and {} (no rules
+        # for this environment: no hub routes) build different resources
+        policy = policies[spec.name]
+        specs[spec.name]["reachability"] = (
+            None if policy is None else {tier: p.to_dict() for tier, p in policy.items()}
+        )
+    return specs
@@ -0,0 +1,235 @@
+##########################################################################################
+#  Intermediate representation of template resources.                                   #
+#                                                                                        #
+#  The builder describes resources as small immutable records instead of troposphere    #
+#  objects, which validate every property and carry several dicts each. The intrinsics  #
+#  every environment repeats are interned: each Ref("AWS::StackId") or                  #
+#  Select(0, GetAZs()) is the same object in every build. Those naming logical IDs are  #
+#  not, so nothing outlives the build. Records are encoded straight to template JSON by #
+#  to_dict(), or turned into troposphere objects by materialize() when a Template is    #
+#  wanted.                                                                              #
+#                                                                                        #
+#  Values are str, int, bool, tuples (JSON lists), Struct (JSON objects) and Fn.        #
+##########################################################################################
+
+# Pseudo parameter Refs, GetAZs and Select(n, GetAZs()), a handful per process
+_interned = {}
+
+
+class _Record:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+
+class Fn(_Record):
+    """An intrinsic function such as Ref or Fn::Select; create them with fn()."""
+
+    __slots__ = ("name", "value")
+
+    def __init__(self, name, value):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "value", value)
+
+    def __repr__(self):
+        return "Fn(%r, %r)" % (self.name, self.value)
+
+    def __reduce__(self):
+        return fn, (self.name, self.value)
+
+
+class Struct(_Record):
+    """A property object (tag, port range, ...): ``(name, value)`` pairs."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, **items):
+        object.__setattr__(self, "items", tuple(items.items()))
+
+    def __eq__(self, other):
+        return isinstance(other, Struct) and self.items == other.items
+
+    def __hash__(self):
+        return hash(self.items)
+
+    def __repr__(self):
+        return "Struct(%s)" % ", ".join("%s=%r" % pair for pair in self.items)
+
+    def __reduce__(self):
+        return _struct, (self.items,)
+
+
+def _struct(items):
+    return Struct(**dict(items))
+
+
+def _shared(name, value):
+    """True for intrinsics that name no logical ID, the only ones worth keeping."""
+    if name == "Ref":
+        return value.startswith("AWS::")
+    if name == "Fn::Select":
+        return isinstance(value[0], int) and isinstance(value[1], Fn) and value[1].name == "Fn::GetAZs"
+    return name == "Fn::GetAZs"
+
+
+def fn(name, value):
+    """An Fn for ``name`` and ``value`` (which must be hashable).
+
+    Pseudo parameter and AZ intrinsics are interned; the rest belong to one
+    build and are left to the garbage collector with it.
+    """
+    key = (name, value)
+    node = _interned.get(key)
+    if node is None:
+        node = Fn(name, value)
+        if _shared(name, value):
+            # setdefault is atomic, so threads racing on a new key share one node.
+            node = _interned.setdefault(key, node)
+    return node
+
+
+def _title(target):
+    return target if isinstance(target, str) else target.title
+
+
+def ref(target):
+    """Ref of a logical ID, resource or pseudo parameter."""
+    return fn("Ref", _title(target))
+
+
+def get_att(target, attribute):
+    return fn("Fn::GetAtt", (_title(target), attribute))
+
+
+def select(index, values):
+    return fn("Fn::Select", (index, values))
+
+
+def get_azs(region=""):
+    return fn("Fn::GetAZs", region)
+
+
+def join(delimiter, values):
+    return fn("Fn::Join", (delimiter, tuple(values)))
+
+
+def cidr(block, count, bits):
+    return fn("Fn::Cidr", (block, count, bits))
+
+
+def az(n):
+    """Select(n, GetAZs()), the n-th (from 0) Availability Zone of the region."""
+    return select(n, get_azs())
+
+
+STACK_ID = ref("AWS::StackId")
+REGION = ref("AWS::Region")
+
+
+def tags(**values):
+    """Tags property: ``{"Key": k, "Value": v}`` sorted by key, as troposphere's Tags."""
+    return tuple(Struct(Key=key, Value=value) for key, value in sorted(values.items()))
+
+
+class Resource(_Record):
+    """One template resource. Properties read like troposphere attributes: ``r.CidrBlock``."""
+
+    __slots__ = ("title", "resource_type", "properties", "depends_on")
+
+    def __init__(self, title, resource_type, properties, depends_on=None):
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "resource_type", resource_type)
+        object.__setattr__(self, "properties", tuple(properties.items()))
+        object.__setattr__(self, "depends_on", depends_on)
+
+    def __getattr__(self, name):
+        for key, value in object.__getattribute__(self, "properties"):
+            if key == name:
+                return value
+        raise AttributeError("%s has no property %s" % (self.title, name))
+
+    def __repr__(self):
+        return "Resource(%r, %r)" % (self.title, self.resource_type)
+
+    def __reduce__(self):
+        return _resource, (self.title, self.resource_type, self.properties, self.depends_on)
+
+    def to_dict(self):
+        """The resource as it appears in the template's Resources section."""
+        data = {"Properties": {key: encode(value) for key, value in self.properties}, "Type": self.resource_type}
+        if self.depends_on is not None:
+            data["DependsOn"] = self.depends_on
+        return data
+
+
+def _resource(title, resource_type, properties, depends_on):
+    return Resource(title, resource_type, dict(properties), depends_on)
+
+
+def kind(resource_type):
+    """Constructor of ``resource_type`` records: ``VPC = kind("AWS::EC2::VPC"); VPC(title, **props)``."""
+
+    def new(title, DependsOn=None, **properties):
+        return Resource(title, resource_type, properties, DependsOn)
+
+    new.resource_type = resource_type
+    return new
+
+
+def encode(value):
+    """``value`` as template JSON."""
+    if isinstance(value, Fn):
+        return {value.name: encode(value.value)}
+    if isinstance(value, tuple):
+        return [encode(item) for item in value]
+    if isinstance(value, Struct):
+        return {key: encode(item) for key, item in value.items}
+    return value
+
+
+def _troposphere(value):
+    """Template JSON with troposphere helpers in place of intrinsics, for from_dict()."""
+    import troposphere
+
+    if isinstance(value, Fn):
+        args = value.value if isinstance(value.value, tuple) else (value.value,)
+        args = [_troposphere(arg) for arg in args]
+        helper = {
+            "Ref": troposphere.Ref,
+            "Fn::GetAtt": troposphere.GetAtt,
+            "Fn::Select": troposphere.Select,
+            "Fn::GetAZs": troposphere.GetAZs,
+            "Fn::Join": troposphere.Join,
+            "Fn::Cidr": troposphere.Cidr,
+        }[value.name]
+        return helper(*args)
+    if isinstance(value, tuple):
+        return [_troposphere(item) for item in value]
+    if isinstance(value, Struct):
+        return {key: _troposphere(item) for key, item in value.items}
+    return value
+
+
+def materialize(resource):
+    """The troposphere object of ``resource``, validated as troposphere would on construction."""
+    from troposphere import Tags
+
+    from cfvpc.validate import resource_class
+
+    cls = resource_class(resource.resource_type)
+    if cls is None:
+        raise ValueError("%s: no troposphere class for %s" % (resource.title, resource.resource_type))
+    properties = {}
+    for key, value in resource.properties:
+        if key == "Tags":
+            properties[key] = Tags({dict(tag.items)["Key"]: _troposphere(dict(tag.items)["Value"]) for tag in value})
+        else:
+            properties[key] = _troposphere(value)
+    obj = cls.from_dict(resource.title, properties)
+    if resource.depends_on is not None:
+        obj.DependsOn = resource.depends_on
+    return obj
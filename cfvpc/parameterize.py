@@ -0,0 +1,177 @@
+##########################################################################################
+#  Parameterized single-template mode.                                                  #
+#                                                                                        #
+#  Instead of one template per account with every CIDR and tag baked in, one template  #
+#  serves them all. Each variant of the estate (a batch target, say) becomes a row of   #
+#  the AddressPlans mapping holding its VPC and subnet CIDRs, AZ counts and tag values. #
+#  Stack instances pick their row with the AddressPlan parameter, and tag parameters    #
+#  such as CostCenter override the plan's tag values when set.                         #
+#                                                                                        #
+#  Environments with fewer AZs in some plans get conditions per AZ: resources that only #
+#  exist from AZ n on are created when the plan's AZ count is at least n.              #
+#                                                                                        #
+#  Every plan needs the same environments, tiers and options; only CIDRs, AZ counts and #
+#  tag values may differ.                                                               #
+##########################################################################################
+
+import dataclasses
+import re
+
+from cfvpc.builder import environment_resources
+from cfvpc.cidr import check_estate
+from cfvpc.emit import RENDERERS, WRITERS
+
+PLAN_PARAMETER = "AddressPlan"
+PLAN_MAPPING = "AddressPlans"
+
+# Mapping value of subnets a plan does not have; their resources are not created.
+UNUSED = "unused"
+
+
+def plan_name(name):
+    """Mapping key for a plan; "111122223333-eu-central-1" gives "111122223333eucentral1"."""
+    return re.sub(r"[^A-Za-z0-9]", "", name)
+
+
+def _find(key):
+    return {"Fn::FindInMap": [PLAN_MAPPING, {"Ref": PLAN_PARAMETER}, key]}
+
+
+def _layout(spec):
+    """Everything about an environment that may not differ between plans."""
+    data = spec.to_dict()
+    del data["cidr"], data["subnets"]
+    data["tags"] = sorted(data["tags"])
+    data["tiers"] = list(spec.tiers)
+    return data
+
+
+def _truncated(spec, az_count):
+    return dataclasses.replace(
+        spec, az_count=az_count, subnets=tuple((tier, cidrs[:az_count]) for tier, cidrs in spec.subnets),
+    )
+
+
+def _substitute(value, spec, conditions, tag_keys):
+    """Swap ``spec``'s literals for plan lookups and guard list references to conditional resources."""
+    if isinstance(value, dict):
+        if set(value) == {"Key", "Value"} and value["Key"] in tag_keys:
+            parameter = plan_name(value["Key"])
+            return {"Key": value["Key"], "Value": {"Fn::If": [
+                "%sGiven" % parameter, {"Ref": parameter}, _find("%sTag%s" % (spec.name, parameter)),
+            ]}}
+        return {k: _substitute(v, spec, conditions, tag_keys) for k, v in value.items()}
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            target = None
+            if isinstance(item, dict) and len(item) == 1:
+                target = item.get("Ref") or (item.get("Fn::GetAtt") or [None])[0]
+            item = _substitute(item, spec, conditions, tag_keys)
+            if target in conditions:
+                item = {"Fn::If": [conditions[target], item, {"Ref": "AWS::NoValue"}]}
+            items.append(item)
+        return items
+    if value == spec.cidr:
+        return _find("%sCidr" % spec.name)
+    return value
+
+
+def _environment(name, specs, mapping, conditions):
+    """Resources of environment ``name`` across ``{plan: spec}``, rewritten to use the plan mapping."""
+    shape = max(specs.values(), key=lambda spec: spec.az_count)
+    fewest = min(spec.az_count for spec in specs.values())
+    tag_keys = {key for key, _ in shape.tags}
+
+    # The AZ count each resource first appears at
+    first_az = {}
+    for az_count in range(fewest, shape.az_count + 1):
+        for resource in environment_resources(_truncated(shape, az_count)):
+            first_az.setdefault(resource.title, az_count)
+    for az in range(fewest + 1, shape.az_count + 1):
+        tests = [{"Fn::Equals": [_find("%sAzCount" % name), str(n)]} for n in range(az, shape.az_count + 1)]
+        conditions["%sAz%d" % (name, az)] = tests[0] if len(tests) == 1 else {"Fn::Or": tests}
+    guarded = {
+        title: "%sAz%d" % (name, az) for title, az in first_az.items() if az > fewest
+    }
+
+    resources = {}
+    subnets = []
+    for resource in environment_resources(shape):
+        data = resource.to_dict()
+        if data["Type"] == "AWS::EC2::Subnet":
+            data["Properties"]["CidrBlock"] = _find(resource.title)
+            subnets.append(resource.title)
+        data = _substitute(data, shape, guarded, tag_keys)
+        if resource.title in guarded:
+            data["Condition"] = guarded[resource.title]
+        resources[resource.title] = data
+
+    for plan, spec in specs.items():
+        row = mapping[plan]
+        row["%sCidr" % name] = spec.cidr
+        row["%sAzCount" % name] = str(spec.az_count)
+        cidrs = {r.title: r.CidrBlock for r in environment_resources(spec) if r.resource_type == "AWS::EC2::Subnet"}
+        for title in subnets:
+            row[title] = cidrs.get(title, UNUSED)
+        for key, value in spec.tags:
+            row["%sTag%s" % (name, plan_name(key))] = value
+    return resources, tag_keys
+
+
+def parameterized_template(plans, description=None):
+    """``(header, resources)`` of one template serving every estate of ``{plan name: Estate}``."""
+    plans = {plan_name(name): estate for name, estate in plans.items()}
+    if not plans:
+        raise ValueError("no address plans")
+    first = next(iter(plans.values()))
+    names = [spec.name for spec in first.environments]
+    for plan, estate in plans.items():
+        check_estate(estate)
+        if estate.transit_gateway is not None or estate.reachability:
+            raise ValueError("%s: Transit Gateway routes cannot be parameterized" % plan)
+        if [spec.name for spec in estate.environments] != names:
+            raise ValueError("%s: every plan needs the environments %s" % (plan, ", ".join(names)))
+        for spec, other in zip(estate.environments, first.environments):
+            if _layout(spec) != _layout(other):
+                raise ValueError("%s: %s differs from other plans in more than CIDRs and tag values" % (
+                    plan, spec.name))
+
+    mapping = {plan: {} for plan in plans}
+    conditions, resources, tag_keys = {}, {}, set()
+    for i, name in enumerate(names):
+        env_resources, keys = _environment(
+            name, {plan: estate.environments[i] for plan, estate in plans.items()}, mapping, conditions,
+        )
+        resources.update(env_resources)
+        tag_keys |= keys
+
+    parameters = {PLAN_PARAMETER: {
+        "Type": "String",
+        "Default": next(iter(plans)),
+        "AllowedValues": list(plans),
+        "Description": "Row of the %s mapping with this stack's CIDRs, AZ counts and tags" % PLAN_MAPPING,
+    }}
+    for key in sorted(tag_keys):
+        parameters[plan_name(key)] = {
+            "Type": "String",
+            "Default": "",
+            "Description": "%s tag for every resource; empty keeps the address plan's value" % key,
+        }
+        conditions["%sGiven" % plan_name(key)] = {"Fn::Not": [{"Fn::Equals": [{"Ref": plan_name(key)}, ""]}]}
+
+    header = {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Description": description or first.description,
+        "Parameters": parameters,
+        "Mappings": {PLAN_MAPPING: mapping},
+        "Conditions": conditions,
+    }
+    return header, resources
+
+
+def write_parameterized(plans, fp, fmt="json", description=None):
+    """Write the parameterized template of ``plans`` to ``fp``."""
+    header, resources = parameterized_template(plans, description)
+    render = RENDERERS[fmt]
+    WRITERS[fmt](fp, header, ((title, render(title, resources[title])) for title in sorted(resources)))
@@ -0,0 +1,165 @@
+##########################################################################################
+#  Per-phase profile of template generation.                                            #
+#                                                                                        #
+#  Splits a build into its phases and reports, for each, wall time, the net number of  #
+#  memory blocks allocated and peak traced memory:                                      #
+#                                                                                        #
+#  import     - importing troposphere and the builder, in a fresh interpreter           #
+#  construct  - creating the resource records (cfvpc/ir.py)                             #
+#  validate   - materializing them as troposphere objects, which validates properties   #
+#  serialize  - encoding and rendering every resource to JSON                           #
+#  write      - merging the rendered resources into the output                          #
+#                                                                                        #
+#  Times come from an untraced pass; memory from a second pass under tracemalloc, which #
+#  would otherwise inflate the times. Resource counts per type and output bytes per     #
+#  environment are reported too, so regressions can be tracked across versions.         #
+##########################################################################################
+
+import heapq
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from cfvpc.builder import GENERATOR_VERSION, estate_groups
+from cfvpc.cidr import check_estate
+from cfvpc.emit import render_resource, write_chunks
+from cfvpc.ir import materialize
+from cfvpc.validate import resource_class
+
+PHASES = ("import", "construct", "validate", "serialize", "write")
+
+_IMPORT_PROBE = """
+import json, sys, time, tracemalloc
+traced = sys.argv[1] == "trace"
+if traced:
+    tracemalloc.start()
+blocks = sys.getallocatedblocks()
+start = time.perf_counter()
+import troposphere, troposphere.ec2, cfvpc.builder
+seconds = time.perf_counter() - start
+print(json.dumps({
+    "seconds": seconds,
+    "blocks": sys.getallocatedblocks() - blocks,
+    "peak_bytes": tracemalloc.get_traced_memory()[1] if traced else None,
+}))
+"""
+
+
+def _import_phase(traced):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.check_output(
+        [sys.executable, "-c", _IMPORT_PROBE, "trace" if traced else "time"], env=env,
+    )
+    return json.loads(output)
+
+
+def _pipeline(estate, fp, measure):
+    """Generate the template of ``estate`` into ``fp``, timing each phase with ``measure``."""
+    with measure("construct"):
+        groups = list(estate_groups(estate))
+    with measure("validate"):
+        for _, resources in groups:
+            for resource in resources:
+                obj = materialize(resource)
+                obj._validate_props()
+                obj.validate()
+    with measure("serialize"):
+        fragments = [
+            (name, sorted(
+                (r.title, render_resource(r.title, r.to_dict()))
+                for r in resources
+            ))
+            for name, resources in groups
+        ]
+    with measure("write"):
+        header = {"AWSTemplateFormatVersion": "2010-09-09", "Description": estate.description}
+        write_chunks(fp, header, heapq.merge(*(chunks for _, chunks in fragments)))
+    return groups, fragments
+
+
+class _Phases:
+    def __init__(self, traced):
+        self.traced = traced
+        self.results = {}
+
+    def __call__(self, phase):
+        return _Phase(self, phase)
+
+
+class _Phase:
+    def __init__(self, phases, name):
+        self.phases, self.name = phases, name
+
+    def __enter__(self):
+        if self.phases.traced:
+            tracemalloc.reset_peak()
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.phases.results[self.name] = {
+            "seconds": time.perf_counter() - self.start,
+            "blocks": sys.getallocatedblocks() - self.blocks,
+            "peak_bytes": tracemalloc.get_traced_memory()[1] if self.phases.traced else None,
+        }
+
+
+def profile_estate(estate, fp=None):
+    """Build ``estate`` into ``fp`` (default: discard) and return the profile report."""
+    check_estate(estate)
+    # Loading troposphere belongs to the import phase, not to validate.
+    for _, resources in estate_groups(estate):
+        for resource in resources:
+            resource_class(resource.resource_type)
+    timed = _Phases(traced=False)
+    timed.results["import"] = _import_phase(traced=False)
+    groups, fragments = _pipeline(estate, fp if fp is not None else io.StringIO(), timed)
+
+    traced = _Phases(traced=True)
+    traced.results["import"] = _import_phase(traced=True)
+    tracemalloc.start()
+    try:
+        _pipeline(estate, io.StringIO(), traced)
+    finally:
+        tracemalloc.stop()
+
+    types = Counter(r.resource_type for _, resources in groups for r in resources)
+    return {
+        "generator_version": GENERATOR_VERSION,
+        "environments": len(estate.environments),
+        "resources": sum(types.values()),
+        "phases": [
+            {
+                "phase": phase,
+                "seconds": timed.results[phase]["seconds"],
+                "blocks": traced.results[phase]["blocks"],
+                "peak_bytes": traced.results[phase]["peak_bytes"],
+            }
+            for phase in PHASES
+        ],
+        "resource_types": dict(sorted(types.items())),
+        "bytes_per_environment": {
+            name: sum(len(chunk.encode()) for _, chunk in chunks) for name, chunks in fragments
+        },
+    }
+
+
+def format_report(report):
+    lines = ["%-10s %10s %12s %12s" % ("phase", "ms", "blocks", "peak KiB")]
+    for phase in report["phases"]:
+        lines.append("%-10s %10.2f %12d %12.1f" % (
+            phase["phase"], phase["seconds"] * 1000, phase["blocks"], phase["peak_bytes"] / 1024))
+    lines.append("")
+    lines.append("%d resources in %d environments" % (report["resources"], report["environments"]))
+    for resource_type, count in report["resource_types"].items():
+        lines.append("  %6d  %s" % (count, resource_type))
+    lines.append("")
+    for name, size in report["bytes_per_environment"].items():
+        lines.append("  %8d bytes  %s" % (size, name))
+    return "\n".join(lines)
@@ -0,0 +1,83 @@
+##########################################################################################
+#  References between resources.                                                        #
+#                                                                                        #
+#  Works on IR records, troposphere objects and plain template dicts alike, so the same #
+#  walk serves generated templates and JSON loaded back from disk.                      #
+##########################################################################################
+
+from troposphere import AWSHelperFn, BaseAWSObject
+
+from cfvpc import ir
+
+
+def is_pseudo(logical_id):
+    """True for pseudo parameters such as AWS::StackId and AWS::Region."""
+    return logical_id.startswith("AWS::")
+
+
+def references(value):
+    """Yield ``(logical_id, attribute)`` for every Ref and GetAtt in ``value``.
+
+    ``attribute`` is None for a Ref. Refs to parameters and pseudo parameters
+    are reported too; callers decide what they resolve to.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        # Plain dicts and lists are by far the most common, test them first.
+        if isinstance(value, dict):
+            if len(value) == 1:
+                if "Ref" in value and isinstance(value["Ref"], str):
+                    yield value["Ref"], None
+                    continue
+                getatt = value.get("Fn::GetAtt")
+                if isinstance(getatt, list) and len(getatt) == 2 and isinstance(getatt[0], str):
+                    yield getatt[0], getatt[1]
+                    stack.append(getatt[1])
+                    continue
+                if isinstance(getatt, str) and "." in getatt:
+                    yield tuple(getatt.split(".", 1))
+                    continue
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, ir.Fn):
+            if value.name == "Ref":
+                yield value.value, None
+            elif value.name == "Fn::GetAtt":
+                yield value.value
+            else:
+                stack.append(value.value)
+        elif isinstance(value, ir.Resource):
+            stack.extend(item for _, item in value.properties)
+        elif isinstance(value, ir.Struct):
+            stack.extend(item for _, item in value.items)
+        elif isinstance(value, BaseAWSObject):
+            stack.append(value.properties)
+        elif isinstance(value, AWSHelperFn):
+            # Tags and a few other helpers keep their values outside ``data``.
+            data = getattr(value, "data", None)
+            stack.append(value.to_dict() if data is None else data)
+        elif isinstance(value, tuple):
+            stack.extend(value)
+
+
+def depends_on(resource):
+    """Explicit DependsOn targets of a resource object or resource dict."""
+    if isinstance(resource, ir.Resource):
+        targets = resource.depends_on or []
+    elif isinstance(resource, BaseAWSObject):
+        targets = resource.resource.get("DependsOn", [])
+    else:
+        targets = resource.get("DependsOn", [])
+    if isinstance(targets, (str, BaseAWSObject)):
+        targets = [targets]
+    return [t.title if isinstance(t, BaseAWSObject) else t for t in targets]
+
+
+def resource_references(resource):
+    """Logical IDs a resource points at through Ref, GetAtt or DependsOn."""
+    targets = {title for title, _ in references(resource)}
+    targets.update(depends_on(resource))
+    targets.discard(getattr(resource, "title", None))
+    return targets
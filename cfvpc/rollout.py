@@ -0,0 +1,485 @@
+##########################################################################################
+#  Stack set rollout orchestrator.                                                      #
+#                                                                                        #
+#  Target accounts are split into waves. Each wave is one create-stack-instances        #
+#  operation that runs up to ``concurrency`` accounts in parallel; its status is polled #
+#  asynchronously with exponential backoff and every account's latency is recorded.     #
+#  Once more than ``failure_tolerance`` instances have failed no further wave starts.   #
+#                                                                                        #
+#  The AWS calls sit behind a small backend interface: Boto3Backend talks to            #
+#  CloudFormation, FakeBackend runs in-process with no network for tests and dry runs. #
+#                                                                                        #
+#  A stack set has one template, so --plan (from python3 -m cfvpc.diff OLD NEW --json) #
+#  deploys the --parameterized template of the new build: it goes in with the update   #
+#  of the instances whose template changed, or of all of them when there are only new  #
+#  instances. New instances are then created with their AddressPlan row as a parameter #
+#  override and, with --delete, the instances of removed targets are deleted. Every     #
+#  other instance is left alone.                                                        #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.rollout --stack-set DemoVPC --accounts 111 222                #
+#             --regions eu-central-1 [--wave-size 10] [--failure-tolerance 7] [--fake]  #
+#         python3 -m cfvpc.rollout --stack-set DemoVPC --plan plan.json                 #
+#             --template cloudformation.json [--delete]                                 #
+##########################################################################################
+
+import argparse
+import asyncio
+import heapq
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+
+TERMINAL = {"SUCCEEDED", "FAILED", "CANCELLED"}
+
+# Stack instance operations a rollout can run: create with parameter overrides,
+# update the stack set's template in the given instances, or delete them
+OPERATIONS = ("create", "update", "delete")
+
+
+class OperationInProgress(RuntimeError):
+    """Another operation is still running on the stack set."""
+
+
+class InvalidOperation(ValueError):
+    """Operation preferences CloudFormation would reject."""
+
+
+@dataclass
+class Backoff:
+    """Poll intervals: ``initial`` seconds, growing by ``factor`` up to ``maximum``."""
+
+    initial: float = 5.0
+    factor: float = 1.5
+    maximum: float = 30.0
+
+    def intervals(self):
+        delay = self.initial
+        while True:
+            yield delay
+            delay = min(delay * self.factor, self.maximum)
+
+
+@dataclass
+class InstanceResult:
+    account: str
+    region: str
+    wave: int
+    status: str = "PENDING"
+    reason: str = ""
+    latency: float = None
+
+
+@dataclass
+class RolloutReport:
+    stack_set: str
+    instances: list = field(default_factory=list)
+    waves: int = 0
+    aborted: bool = False
+    seconds: float = 0.0
+    operation: str = "create"
+
+    @property
+    def failed(self):
+        return [i for i in self.instances if i.status in ("FAILED", "CANCELLED")]
+
+    def to_dict(self):
+        return {
+            "stack_set": self.stack_set,
+            "operation": self.operation,
+            "waves": self.waves,
+            "aborted": self.aborted,
+            "seconds": round(self.seconds, 3),
+            "instances": [
+                {
+                    "account": i.account, "region": i.region, "wave": i.wave, "status": i.status,
+                    "reason": i.reason, "latency": None if i.latency is None else round(i.latency, 3),
+                }
+                for i in self.instances
+            ],
+        }
+
+
+def waves(accounts, wave_size):
+    """``accounts`` in order, in chunks of ``wave_size``."""
+    return [accounts[i:i + wave_size] for i in range(0, len(accounts), wave_size)]
+
+
+def instance_groups(instances):
+    """``[(accounts, regions)]`` covering exactly the ``(account, region)`` pairs given.
+
+    Accounts that need the same regions share one group, so each group is
+    one stack instance operation.
+    """
+    regions = {}
+    for account, region in instances:
+        regions.setdefault(account, set()).add(region)
+    groups = {}
+    for account, wanted in sorted(regions.items()):
+        groups.setdefault(tuple(sorted(wanted)), []).append(account)
+    return [(accounts, list(wanted)) for wanted, accounts in sorted(groups.items())]
+
+
+def plan_groups(plan):
+    """``[(operation, accounts, regions, parameters)]`` for a plan from cfvpc.diff.
+
+    Updates come first, then creates, then deletes. Instances are created
+    with their own parameter overrides, so only those that share them share
+    an operation. A plan with only new instances still starts with an update
+    of every instance (accounts and regions None) that brings in the
+    template holding their rows.
+    """
+    if plan.get("create") and not plan.get("update"):
+        groups = [("update", None, None, [])]
+    else:
+        groups = [
+            ("update", accounts, regions, [])
+            for accounts, regions in instance_groups((e["account"], e["region"]) for e in plan.get("update", ()))
+        ]
+    overrides = {}
+    for entry in plan.get("create", ()):
+        key = json.dumps(entry.get("parameters", []), sort_keys=True)
+        overrides.setdefault(key, []).append((entry["account"], entry["region"]))
+    for key, instances in sorted(overrides.items()):
+        groups += [("create", accounts, regions, json.loads(key)) for accounts, regions in instance_groups(instances)]
+    groups += [
+        ("delete", accounts, regions, [])
+        for accounts, regions in instance_groups((e["account"], e["region"]) for e in plan.get("delete", ()))
+    ]
+    return groups
+
+
+async def _run_wave(backend, stack_set, number, accounts, regions, concurrency, tolerance, backoff, clock,
+                    operation="create", template=None, parameters=()):
+    results = {(a, r): InstanceResult(a, r, number) for a in accounts or () for r in regions or ()}
+    started = clock()
+    # In the default STRICT_FAILURE_TOLERANCE mode MaxConcurrentCount may be at
+    # most FailureToleranceCount + 1; soft mode keeps the concurrency asked for.
+    preferences = {
+        "RegionConcurrencyType": "PARALLEL",
+        "ConcurrencyMode": "SOFT_FAILURE_TOLERANCE",
+        "MaxConcurrentCount": concurrency,
+        "FailureToleranceCount": tolerance,
+    }
+    if template is not None:
+        operation = await backend.update_stack_set(stack_set, template, accounts, regions, preferences)
+    else:
+        start = getattr(backend, "%s_stack_instances" % operation)
+        operation = await start(stack_set, accounts, regions, preferences, list(parameters))
+    for delay in backoff.intervals():
+        for summary in await backend.list_operation_results(stack_set, operation):
+            key = summary["Account"], summary["Region"]
+            if accounts is None and key not in results:
+                # Every instance is updated; they show up in the results
+                results[key] = InstanceResult(*key, number)
+            result = results.get(key)
+            if result is None or result.status in TERMINAL:
+                continue
+            result.status = summary["Status"]
+            result.reason = summary.get("StatusReason", "")
+            if result.status in TERMINAL:
+                result.latency = clock() - started
+        if await backend.describe_operation(stack_set, operation) in TERMINAL | {"STOPPED"}:
+            break
+        await asyncio.sleep(delay)
+    for result in results.values():
+        if result.status not in TERMINAL:
+            result.status = "CANCELLED"
+    return list(results.values())
+
+
+async def rollout(backend, stack_set, accounts, regions, wave_size=10, concurrency=10,
+                  failure_tolerance=0, backoff=None, clock=time.monotonic, operation="create",
+                  template=None, parameters=()):
+    """Create (or update) stack instances wave by wave; returns a RolloutReport.
+
+    With ``template`` every wave is an update of the stack set to that
+    template body (or https:// URL) in its accounts; accounts and regions
+    None update every instance in one go. ``parameters`` are the
+    ParameterOverrides of created instances.
+    """
+    backoff = backoff or Backoff()
+    report = RolloutReport(stack_set, operation=operation)
+    started = clock()
+    for number, wave in enumerate(waves(list(accounts), wave_size) if accounts is not None else [None], 1):
+        remaining = failure_tolerance - len(report.failed)
+        if remaining < 0:
+            report.aborted = True
+            break
+        report.instances += await _run_wave(
+            backend, stack_set, number, wave, regions and list(regions),
+            concurrency, remaining, backoff, clock, operation, template, parameters,
+        )
+        report.waves = number
+    report.aborted = report.aborted or len(report.failed) > failure_tolerance
+    report.seconds = clock() - started
+    return report
+
+
+async def rollout_many(backend, stack_sets, accounts, regions, max_parallel=4, **options):
+    """Roll several stack sets out at once, at most ``max_parallel`` at a time."""
+    gate = asyncio.Semaphore(max_parallel)
+
+    async def one(stack_set):
+        async with gate:
+            return await rollout(backend, stack_set, accounts, regions, **options)
+
+    return await asyncio.gather(*(one(stack_set) for stack_set in stack_sets))
+
+
+async def rollout_plan(backend, stack_set, plan, template, failure_tolerance=0, **options):
+    """Run the operations of a cfvpc.diff plan one after another; returns their RolloutReports.
+
+    ``template`` is the --parameterized template of the new build, as a body
+    or an https:// URL. The failure tolerance covers the whole plan; once it
+    is exceeded no further operation starts.
+    """
+    reports = []
+    for operation, accounts, regions, parameters in plan_groups(plan):
+        remaining = failure_tolerance - sum(len(report.failed) for report in reports)
+        report = await rollout(
+            backend, stack_set, accounts, regions,
+            failure_tolerance=max(remaining, 0), operation=operation,
+            template=template if operation == "update" else None, parameters=parameters, **options,
+        )
+        reports.append(report)
+        if report.aborted:
+            break
+    return reports
+
+
+class Boto3Backend:
+    """CloudFormation stack set calls through boto3, run off the event loop."""
+
+    def __init__(self, session=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("Boto3Backend needs boto3: pip install boto3")
+        self.client = (session or boto3.Session()).client("cloudformation")
+
+    async def create_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        response = await asyncio.to_thread(
+            self.client.create_stack_instances,
+            StackSetName=stack_set, Accounts=accounts, Regions=regions,
+            OperationPreferences=preferences, ParameterOverrides=list(parameters),
+        )
+        return response["OperationId"]
+
+    async def update_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        response = await asyncio.to_thread(
+            self.client.update_stack_instances,
+            StackSetName=stack_set, Accounts=accounts, Regions=regions,
+            OperationPreferences=preferences, ParameterOverrides=list(parameters),
+        )
+        return response["OperationId"]
+
+    async def delete_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        response = await asyncio.to_thread(
+            self.client.delete_stack_instances,
+            StackSetName=stack_set, Accounts=accounts, Regions=regions,
+            OperationPreferences=preferences, RetainStacks=False,
+        )
+        return response["OperationId"]
+
+    async def update_stack_set(self, stack_set, template, accounts, regions, preferences):
+        """Switch the stack set to ``template`` and update the instances in ``accounts`` x ``regions``.
+
+        Parameters keep their values, parameter overrides included.
+        """
+        described = await asyncio.to_thread(self.client.describe_stack_set, StackSetName=stack_set)
+        kwargs = {
+            "StackSetName": stack_set,
+            "Parameters": [
+                {"ParameterKey": p["ParameterKey"], "UsePreviousValue": True}
+                for p in described["StackSet"].get("Parameters", [])
+            ],
+            "Capabilities": described["StackSet"].get("Capabilities", []),
+            "OperationPreferences": preferences,
+        }
+        kwargs["TemplateURL" if template.startswith("https://") else "TemplateBody"] = template
+        if accounts is not None:
+            kwargs.update(Accounts=accounts, Regions=regions)
+        response = await asyncio.to_thread(self.client.update_stack_set, **kwargs)
+        return response["OperationId"]
+
+    async def describe_operation(self, stack_set, operation):
+        response = await asyncio.to_thread(
+            self.client.describe_stack_set_operation, StackSetName=stack_set, OperationId=operation,
+        )
+        return response["StackSetOperation"]["Status"]
+
+    async def list_operation_results(self, stack_set, operation):
+        def fetch():
+            paginator = self.client.get_paginator("list_stack_set_operation_results")
+            summaries = []
+            for page in paginator.paginate(StackSetName=stack_set, OperationId=operation):
+                summaries += page["Summaries"]
+            return summaries
+
+        return await asyncio.to_thread(fetch)
+
+
+class FakeBackend:
+    """In-process stand-in for CloudFormation stack sets.
+
+    Every instance finishes ``latency(account, region)`` seconds after its
+    account starts; instances in ``failing`` fail. Like the real service only
+    one operation may run per stack set at a time, at most MaxConcurrentCount
+    accounts are deployed at once, and in the default strict failure tolerance
+    mode MaxConcurrentCount may not exceed FailureToleranceCount + 1. ``templates`` and
+    ``instances`` (parameter overrides by stack set, account and region)
+    record what was deployed.
+    """
+
+    def __init__(self, latency=None, failing=(), clock=time.monotonic):
+        self.latency = latency or (lambda account, region: 0.01)
+        self.failing = set(failing)
+        self.clock = clock
+        self.operations = {}
+        self.calls = []
+        self.templates = {}
+        self.instances = {}
+
+    def _running(self, stack_set, operation):
+        started, finished, _ = self.operations[stack_set, operation]
+        now = self.clock() - started
+        return {instance: now < done for instance, done in finished.items()}
+
+    def _schedule(self, accounts, regions, preferences):
+        """When each instance finishes, from the start of the operation."""
+        concurrency = preferences.get("MaxConcurrentCount", 1)
+        tolerance = preferences.get("FailureToleranceCount", 0)
+        if preferences.get("ConcurrencyMode", "STRICT_FAILURE_TOLERANCE") == "STRICT_FAILURE_TOLERANCE" \
+                and concurrency > tolerance + 1:
+            raise InvalidOperation("MaxConcurrentCount %d is more than FailureToleranceCount %d + 1" % (
+                concurrency, tolerance))
+        slots = [0.0] * min(concurrency, len(accounts))
+        finished = {}
+        for account in accounts:
+            start = heapq.heappop(slots)
+            for region in regions:
+                finished[account, region] = start + self.latency(account, region)
+            heapq.heappush(slots, max([start] + [finished[account, r] for r in regions]))
+        return finished
+
+    def _start(self, call, stack_set, accounts, regions, preferences):
+        for (name, operation) in self.operations:
+            if name == stack_set and any(self._running(name, operation).values()):
+                raise OperationInProgress(stack_set)
+        finished = self._schedule(list(accounts), list(regions), preferences)
+        operation = "op-%d" % (len(self.operations) + 1)
+        self.operations[stack_set, operation] = (self.clock(), finished, preferences)
+        self.calls.append((call, stack_set, list(accounts), list(regions)))
+        return operation
+
+    async def create_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        operation = self._start("create_stack_instances", stack_set, accounts, regions, preferences)
+        for account in accounts:
+            for region in regions:
+                self.instances[stack_set, account, region] = list(parameters)
+        return operation
+
+    async def update_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        operation = self._start("update_stack_instances", stack_set, accounts, regions, preferences)
+        for account in accounts:
+            for region in regions:
+                if parameters:
+                    self.instances[stack_set, account, region] = list(parameters)
+        return operation
+
+    async def delete_stack_instances(self, stack_set, accounts, regions, preferences, parameters=()):
+        operation = self._start("delete_stack_instances", stack_set, accounts, regions, preferences)
+        for account in accounts:
+            for region in regions:
+                self.instances.pop((stack_set, account, region), None)
+        return operation
+
+    async def update_stack_set(self, stack_set, template, accounts, regions, preferences):
+        if accounts is None:
+            instances = [(a, r) for (name, a, r) in self.instances if name == stack_set]
+            accounts = sorted({a for a, _ in instances})
+            regions = sorted({r for _, r in instances})
+        operation = self._start("update_stack_set", stack_set, accounts, regions, preferences)
+        self.templates[stack_set] = template
+        return operation
+
+    async def describe_operation(self, stack_set, operation):
+        running = self._running(stack_set, operation)
+        if any(running.values()):
+            return "RUNNING"
+        failed = sum(1 for a, r in running if (a, r) in self.failing or a in self.failing)
+        tolerance = self.operations[stack_set, operation][2].get("FailureToleranceCount", 0)
+        return "FAILED" if failed > tolerance else "SUCCEEDED"
+
+    async def list_operation_results(self, stack_set, operation):
+        summaries = []
+        for (account, region), running in self._running(stack_set, operation).items():
+            if running:
+                status = "RUNNING"
+            elif (account, region) in self.failing or account in self.failing:
+                status = "FAILED"
+            else:
+                status = "SUCCEEDED"
+            summaries.append({"Account": account, "Region": region, "Status": status})
+        return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll a stack set out to many accounts.")
+    parser.add_argument("--stack-set", required=True)
+    parser.add_argument("--accounts", nargs="+")
+    parser.add_argument("--regions", nargs="+")
+    parser.add_argument("--plan", help="create and update only the instances of this cfvpc.diff plan")
+    parser.add_argument("--template", help="--parameterized template (file or https:// URL) the --plan deploys")
+    parser.add_argument("--delete", action="store_true", help="delete the stack instances the --plan removes")
+    parser.add_argument("--wave-size", type=int, default=10, help="accounts per operation")
+    parser.add_argument("--concurrency", type=int, default=10, help="accounts deployed in parallel per wave")
+    parser.add_argument("--failure-tolerance", type=int, default=0, help="failed instances before stopping")
+    parser.add_argument("--poll", type=float, default=5.0, help="first poll interval in seconds")
+    parser.add_argument("--fake", action="store_true", help="use the in-process backend, no AWS calls")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if bool(args.plan) == bool(args.accounts and args.regions):
+        parser.error("pass either --accounts and --regions or --plan")
+    if bool(args.plan) != bool(args.template):
+        parser.error("--plan needs the --template of the new build, and --template a --plan")
+
+    backend = FakeBackend() if args.fake else Boto3Backend()
+    options = dict(
+        wave_size=args.wave_size, concurrency=args.concurrency,
+        failure_tolerance=args.failure_tolerance,
+        backoff=Backoff(initial=args.poll, maximum=max(args.poll, 30.0)),
+    )
+    if args.plan:
+        with open(args.plan) as f:
+            plan = json.load(f)
+        if plan.get("delete") and not args.delete:
+            parser.error("the plan deletes %d stack instances; pass --delete to delete them" % len(plan["delete"]))
+        template = args.template
+        if not template.startswith("https://"):
+            with open(template) as f:
+                template = f.read()
+        reports = asyncio.run(rollout_plan(backend, args.stack_set, plan, template, **options))
+    else:
+        reports = [asyncio.run(rollout(backend, args.stack_set, args.accounts, args.regions, **options))]
+
+    if args.json:
+        data = [report.to_dict() for report in reports]
+        print(json.dumps(data if args.plan else data[0], indent=1))
+    else:
+        for report in reports:
+            for i in report.instances:
+                latency = "-" if i.latency is None else "%.1fs" % i.latency
+                print("%-6s wave %-3d %-14s %-16s %-10s %8s %s" % (
+                    report.operation, i.wave, i.account, i.region, i.status, latency, i.reason))
+            print("%s: %d instances, %d failed, %d waves in %.1fs%s" % (
+                report.operation, len(report.instances), len(report.failed), report.waves, report.seconds,
+                " (stopped: failure tolerance exceeded)" if report.aborted else ""))
+        if not reports:
+            print("nothing to roll out")
+    return 1 if any(report.aborted for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
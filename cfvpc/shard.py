@@ -0,0 +1,262 @@
+##########################################################################################
+#  Split an estate into a parent stack and nested child stacks.                         #
+#                                                                                        #
+#  CloudFormation stops at 500 resources and 1 MB of template body per stack. Groups    #
+#  (one environment's dependency closure) are packed whole into child stacks; a         #
+#  reference that still crosses two children is exported as an Output of the owning     #
+#  child and passed into the other one as a Parameter by the parent stack.              #
+#                                                                                        #
+#  Children are rendered in parallel across processes. Every worker gets the estate     #
+#  and its plan (Transit Gateway routes, tier policies) once and rebuilds only the      #
+#  groups of the shards it renders.                                                     #
+##########################################################################################
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from troposphere import GetAtt, Join, Parameter, Ref, Template
+from troposphere.cloudformation import Stack
+
+from cfvpc.budget import MAX_RESOURCES
+from cfvpc.builder import estate_groups
+from cfvpc.cidr import check_estate
+from cfvpc.emit import EXTENSIONS, RENDERERS, WRITERS, stream_template
+from cfvpc.groups import estate_plan, group_specs
+from cfvpc.refs import depends_on, is_pseudo, references
+
+TEMPLATE_BASE_URL = "TemplateBaseUrl"
+
+
+@dataclass
+class Shard:
+    """One child stack and what it trades with its siblings."""
+
+    name: str
+    # Output format, see cfvpc.emit.FORMATS
+    fmt: str = "json"
+    groups: list = field(default_factory=list)
+    resources: int = 0
+    # Parameter/Output name -> (logical_id, GetAtt attribute or None)
+    imports: dict = field(default_factory=dict)
+    exports: dict = field(default_factory=dict)
+    # Siblings this shard has to wait for, by name
+    depends_on: set = field(default_factory=set)
+
+    @property
+    def filename(self):
+        return "%s.%s" % (self.name.lower(), EXTENSIONS[self.fmt])
+
+
+def export_name(logical_id, attribute=None):
+    """Output/Parameter name that carries a Ref or GetAtt across stacks."""
+    return re.sub(r"[^A-Za-z0-9]", "", logical_id + (attribute or ""))
+
+
+def _summarize(resources):
+    """What planning needs to know about one group: size and outgoing references."""
+    titles = [resource.title for resource in resources]
+    local = set(titles)
+    refs, waits = set(), set()
+    for resource in resources:
+        for target, attribute in references(resource):
+            if target not in local and not is_pseudo(target):
+                refs.add((target, attribute))
+        waits.update(t for t in depends_on(resource) if t not in local)
+    return {"titles": titles, "references": sorted(refs, key=str), "depends_on": sorted(waits)}
+
+
+def _summaries(estate, cache=None, plan=None):
+    specs = group_specs(estate, plan)
+    summaries, keys = {}, {}
+    if cache is not None:
+        for name, spec in specs.items():
+            keys[name] = cache.key("group", spec)
+            summaries[name] = cache.get(keys[name])
+    missing = {name for name in specs if summaries.get(name) is None}
+    if missing:
+        for name, resources in estate_groups(estate, missing, plan):
+            summaries[name] = _summarize(resources)
+            if cache is not None:
+                cache.put(keys[name], summaries[name])
+    return [(name, summaries[name]) for name in specs]
+
+
+def plan_shards(estate, max_resources=MAX_RESOURCES, cache=None, plan=None, fmt="json"):
+    """Pack the estate's groups first fit into shards of at most ``max_resources``.
+
+    ``plan`` is estate_plan(), worked out here when not given; the shards
+    are rendered in ``fmt``.
+    """
+    shards = []
+    owner = {}
+    groups = _summaries(estate, cache, plan)
+    for name, summary in groups:
+        size = len(summary["titles"])
+        if size > max_resources:
+            raise ValueError("%s has %d resources, more than a stack may hold (%d)" % (
+                name, size, max_resources))
+        for shard in shards:
+            if shard.resources + size <= max_resources:
+                break
+        else:
+            shard = Shard("Shard%03d" % (len(shards) + 1), fmt)
+            shards.append(shard)
+        shard.groups.append(name)
+        shard.resources += size
+        for title in summary["titles"]:
+            owner[title] = shard
+
+    for name, summary in groups:
+        shard = owner[summary["titles"][0]]
+        for target, attribute in summary["references"]:
+            source = owner.get(target)
+            if source is None or source is shard:
+                continue
+            key = export_name(target, attribute)
+            shard.imports[key] = source.exports[key] = (target, attribute)
+        for target in summary["depends_on"]:
+            source = owner.get(target)
+            if source is not None and source is not shard:
+                shard.depends_on.add(source.name)
+    return shards
+
+
+def _localize(value, local):
+    """Point GetAtts on resources outside ``local`` at the imported Parameter."""
+    if isinstance(value, dict):
+        getatt = value.get("Fn::GetAtt")
+        if len(value) == 1 and isinstance(getatt, list) and getatt[0] not in local:
+            return {"Ref": export_name(*getatt)}
+        return {k: _localize(v, local) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_localize(v, local) for v in value]
+    return value
+
+
+def render_shard(estate, shard, plan=None):
+    """The child template of ``shard`` as text in the shard's format."""
+    resources = {}
+    for _, group in estate_groups(estate, set(shard.groups), plan):
+        for resource in group:
+            resources[resource.title] = resource.to_dict()
+    for title, resource in resources.items():
+        if shard.imports:
+            resource = resources[title] = _localize(resource, resources)
+        if "DependsOn" in resource:
+            local = [t for t in depends_on(resource) if t in resources]
+            if local:
+                resource["DependsOn"] = local if isinstance(resource["DependsOn"], list) else local[0]
+            else:
+                del resource["DependsOn"]
+
+    header = {
+        "AWSTemplateFormatVersion": "2010-09-09",
+        "Description": "%s (%s)" % (estate.description, shard.name),
+    }
+    if shard.imports:
+        header["Parameters"] = {key: {"Type": "String"} for key in shard.imports}
+    if shard.exports:
+        header["Outputs"] = {
+            key: {"Value": {"Fn::GetAtt": [target, attribute]} if attribute else {"Ref": target}}
+            for key, (target, attribute) in shard.exports.items()
+        }
+    out = io.StringIO()
+    render = RENDERERS[shard.fmt]
+    WRITERS[shard.fmt](out, header, ((title, render(title, resources[title])) for title in sorted(resources)))
+    return out.getvalue()
+
+
+def parent_template(estate, shards):
+    """Parent stack that creates every shard as a nested stack."""
+    t = Template()
+    t.set_version("2010-09-09")
+    t.set_description(estate.description)
+    base = t.add_parameter(Parameter(
+        TEMPLATE_BASE_URL,
+        Type="String",
+        Description="URL prefix the shard templates were uploaded to",
+    ))
+    owner = {}
+    for shard in shards:
+        for key in shard.exports:
+            owner[key] = shard.name
+    for shard in shards:
+        stack = Stack(shard.name, TemplateURL=Join("/", [Ref(base), shard.filename]))
+        if shard.imports:
+            stack.Parameters = {
+                key: GetAtt(owner[key], "Outputs.%s" % key) for key in sorted(shard.imports)
+            }
+        if shard.depends_on:
+            stack.DependsOn = sorted(shard.depends_on)
+        t.add_resource(stack)
+    return t
+
+
+_worker_estate = _worker_plan = None
+
+
+def _init_worker(estate, plan):
+    global _worker_estate, _worker_plan
+    _worker_estate, _worker_plan = estate, plan
+
+
+def _render_in_worker(shard):
+    return render_shard(_worker_estate, shard, _worker_plan)
+
+
+def _shard_key(cache, specs, estate, shard):
+    return cache.key(
+        "shard", estate.description, shard.name, shard.fmt,
+        [specs[name] for name in shard.groups],
+        sorted(shard.imports.items()), sorted(shard.exports.items()),
+    )
+
+
+def render_shards(estate, shards, processes=None, cache=None, plan=None):
+    """Child templates in shard order; ``processes=1`` renders in this process.
+
+    With a BuildCache only shards whose content changed are rendered.
+    """
+    plan = plan or estate_plan(estate)
+    texts = [None] * len(shards)
+    keys = [None] * len(shards)
+    if cache is not None:
+        specs = group_specs(estate, plan)
+        for i, shard in enumerate(shards):
+            keys[i] = _shard_key(cache, specs, estate, shard)
+            texts[i] = cache.get(keys[i])
+    todo = [i for i, text in enumerate(texts) if text is None]
+
+    if processes == 1 or len(todo) < 2:
+        rendered = [render_shard(estate, shards[i], plan) for i in todo]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(estate, plan)) as pool:
+            rendered = list(pool.map(_render_in_worker, [shards[i] for i in todo]))
+
+    for i, text in zip(todo, rendered):
+        texts[i] = text
+        if cache is not None:
+            cache.put(keys[i], text)
+    return texts
+
+
+def write_shards(estate, out_dir, max_resources=MAX_RESOURCES, processes=None, cache=None, fmt="json"):
+    """Write the parent template and one file per shard, all in ``fmt``, to ``out_dir``; returns the paths."""
+    check_estate(estate)
+    plan = estate_plan(estate)
+    shards = plan_shards(estate, max_resources, cache, plan, fmt)
+    end = "" if fmt == "yaml" else "\n"
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for shard, text in zip(shards, render_shards(estate, shards, processes, cache, plan)):
+        paths.append(os.path.join(out_dir, shard.filename))
+        with open(paths[-1], "w") as f:
+            f.write(text + end)
+    paths.insert(0, os.path.join(out_dir, "parent.%s" % EXTENSIONS[fmt]))
+    with open(paths[0], "w") as f:
+        stream_template(parent_template(estate, shards), f, fmt)
+        f.write(end)
+    return paths
@@ -0,0 +1,387 @@
+##########################################################################################
+#  Declarative environment specs.                                                      #
+#                                                                                        #
+#  An environment is one VPC with private, public and protected subnet tiers spread     #
+#  over a number of availability zones. The builder turns each spec into resources.     #
+##########################################################################################
+
+import json
+from dataclasses import dataclass
+
+from cfvpc.cidr import CidrAllocator, carve_subnets
+
+# Subnet tiers, in the order their resources are laid out.
+#
+#  private   - No internet access
+#  public    - Outbound internet access through the Internet gateway
+#  protected - Outbound internet access via NAT (needs the public tier)
+TIERS = ("private", "public", "protected")
+
+# AWS services reachable through a gateway endpoint, a route table entry that
+# costs nothing per GB. Every other service needs an interface endpoint.
+GATEWAY_SERVICES = ("s3", "dynamodb")
+
+# Flow log destinations and the aggregation intervals (seconds) AWS accepts.
+FLOW_LOG_DESTINATIONS = ("cloud-watch-logs", "s3")
+FLOW_LOG_INTERVALS = (60, 600)
+FLOW_LOG_TRAFFIC = ("ACCEPT", "REJECT", "ALL")
+
+# Fields of a custom flow log format, versions 2 to 5.
+FLOW_LOG_FIELDS = (
+    "version", "account-id", "interface-id", "srcaddr", "dstaddr", "srcport", "dstport",
+    "protocol", "packets", "bytes", "start", "end", "action", "log-status", "vpc-id",
+    "subnet-id", "instance-id", "tcp-flags", "type", "pkt-srcaddr", "pkt-dstaddr", "region",
+    "az-id", "sublocation-type", "sublocation-id", "pkt-src-aws-service", "pkt-dst-aws-service",
+    "flow-direction", "traffic-path",
+)
+
+DEFAULT_DESCRIPTION = (
+    "Stack for creating a VPC with private subnets, public subnets and protected "
+    "subnets for Dev , Stg and Prod Environments"
+)
+
+
+@dataclass(frozen=True)
+class FlowLogSpec:
+    """VPC Flow Logs of one environment.
+
+    With no ``tiers`` one flow log covers the whole VPC, otherwise every
+    subnet of those tiers gets its own. Records go to CloudWatch Logs,
+    into a log group kept ``retention_days`` that the template creates
+    along with the IAM role that writes to it, or to the S3 bucket whose
+    ARN is ``destination_arn``. ``fields`` (any of FLOW_LOG_FIELDS) give a
+    custom log format, "az-id" and "pkt-dst-aws-service" for instance show
+    cross-AZ and AWS service traffic; leave them out for the default one.
+    """
+
+    destination: str = "cloud-watch-logs"
+    destination_arn: str = None
+    traffic_type: str = "ALL"
+    max_aggregation_interval: int = 600
+    fields: tuple = ()
+    tiers: tuple = ()
+    retention_days: int = 30
+
+    def __post_init__(self):
+        if self.destination not in FLOW_LOG_DESTINATIONS:
+            raise ValueError("unknown flow log destination %r" % self.destination)
+        if self.destination == "s3" and not self.destination_arn:
+            raise ValueError("flow logs to s3 need a destination_arn")
+        if self.traffic_type not in FLOW_LOG_TRAFFIC:
+            raise ValueError("unknown flow log traffic type %r" % self.traffic_type)
+        if self.max_aggregation_interval not in FLOW_LOG_INTERVALS:
+            raise ValueError("flow log aggregation interval is 60 or 600 seconds, not %r" % (
+                self.max_aggregation_interval,))
+        for name in self.fields:
+            if name not in FLOW_LOG_FIELDS:
+                raise ValueError("unknown flow log field %r" % name)
+        for tier in self.tiers:
+            if tier not in TIERS:
+                raise ValueError("unknown subnet tier %r" % tier)
+        object.__setattr__(self, "fields", tuple(self.fields))
+        object.__setattr__(self, "tiers", tuple(self.tiers))
+
+    @property
+    def log_format(self):
+        """The LogFormat property, None for the default format."""
+        return " ".join("${%s}" % name for name in self.fields) or None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            "destination": self.destination,
+            "destination_arn": self.destination_arn,
+            "traffic_type": self.traffic_type,
+            "max_aggregation_interval": self.max_aggregation_interval,
+            "fields": list(self.fields),
+            "tiers": list(self.tiers),
+            "retention_days": self.retention_days,
+        }
+
+
+@dataclass(frozen=True)
+class NatAlarmSpec:
+    """CloudWatch alarms on every NAT gateway of one environment.
+
+    Each alarm fires when the metric's sum over ``period`` seconds exceeds
+    its threshold for ``evaluation_periods`` periods in a row: bytes sent
+    to destinations (saturation), packets dropped and failed source port
+    allocations (ErrorPortAllocation, too many connections to one
+    destination). A threshold of None leaves that alarm out.
+    ``alarm_actions`` are ARNs, SNS topics for instance, notified on alarm.
+    """
+
+    bytes_out: int = 100 * 2**30
+    packets_dropped: int = 0
+    port_allocation_errors: int = 0
+    period: int = 300
+    evaluation_periods: int = 1
+    alarm_actions: tuple = ()
+
+    def __post_init__(self):
+        if self.period % 60 or self.period <= 0:
+            raise ValueError("NAT alarm period %r is not a multiple of 60 seconds" % self.period)
+        if self.evaluation_periods < 1:
+            raise ValueError("NAT alarms need at least one evaluation period")
+        object.__setattr__(self, "alarm_actions", tuple(self.alarm_actions))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            "bytes_out": self.bytes_out,
+            "packets_dropped": self.packets_dropped,
+            "port_allocation_errors": self.port_allocation_errors,
+            "period": self.period,
+            "evaluation_periods": self.evaluation_periods,
+            "alarm_actions": list(self.alarm_actions),
+        }
+
+
+@dataclass(frozen=True)
+class EnvironmentSpec:
+    """One VPC and its subnet tiers.
+
+    ``name`` is used for logical IDs and tags ("Dev" gives "DEVVPC",
+    "DevPublicRouteTable", "devpublicsubnet1", ...). ``subnets`` maps each
+    tier to one CIDR per availability zone. Leave it out to have ``tiers``
+    carved automatically out of the VPC block, ``az_count`` subnets per tier
+    of ``subnet_prefix`` (default: the largest size that fits).
+
+    With ``nat_per_az`` every AZ gets its own NAT gateway and protected route
+    table, so egress stays in the AZ and NAT bandwidth grows with the AZ
+    count. The default is one NAT gateway for the whole VPC.
+
+    ``gateway_endpoints`` (any of GATEWAY_SERVICES) are attached to the
+    private and protected route tables, ``interface_endpoints`` (service
+    names such as "ssm" or "ecr.api") get a network interface in every
+    private subnet, or protected subnet without a private tier. Either way
+    that service's traffic stays off the NAT gateway.
+
+    ``ipv6`` makes the VPC dual-stack: an Amazon-provided /56 and a /64 per
+    subnet, with IPv6 egress from protected subnets through an egress-only
+    Internet gateway instead of the NAT gateway.
+
+    ``flow_logs`` (a FlowLogSpec) and ``nat_alarms`` (a NatAlarmSpec, needs
+    a protected tier) add Flow Logs and CloudWatch alarms on the NAT
+    gateways. Both are off by default.
+    """
+
+    name: str
+    cidr: str
+    subnets: tuple = ()
+    tags: tuple = (("CostCenter", "12345"),)
+    dns_hostnames: bool = True
+    az_count: int = None
+    tiers: tuple = TIERS
+    subnet_prefix: int = None
+    nat_per_az: bool = False
+    gateway_endpoints: tuple = ()
+    interface_endpoints: tuple = ()
+    ipv6: bool = False
+    flow_logs: FlowLogSpec = None
+    nat_alarms: NatAlarmSpec = None
+
+    def __post_init__(self):
+        if not self.name.isalnum():
+            raise ValueError('Environment name "%s" not alphanumeric' % self.name)
+        flow_logs, nat_alarms = self.flow_logs, self.nat_alarms
+        if isinstance(flow_logs, dict):
+            flow_logs = FlowLogSpec.from_dict(flow_logs)
+        if isinstance(nat_alarms, dict):
+            nat_alarms = NatAlarmSpec.from_dict(nat_alarms)
+        subnets = self.subnets
+        if not subnets and self.tiers:
+            subnets = carve_subnets(self.cidr, self.tiers, self.az_count or 2, self.subnet_prefix)
+        if isinstance(subnets, dict):
+            subnets = subnets.items()
+        subnets = tuple((tier, tuple(cidrs)) for tier, cidrs in subnets)
+        for tier, cidrs in subnets:
+            if tier not in TIERS:
+                raise ValueError("%s: unknown subnet tier %r" % (self.name, tier))
+            if len(cidrs) != len(subnets[0][1]):
+                raise ValueError("%s: every tier needs one subnet per AZ" % self.name)
+        if "protected" in dict(subnets) and "public" not in dict(subnets):
+            raise ValueError("%s: protected subnets need a public tier for NAT" % self.name)
+        tags = self.tags
+        if isinstance(tags, dict):
+            tags = tags.items()
+        az_count = len(subnets[0][1]) if subnets else 0
+        if self.az_count is not None and self.az_count != az_count:
+            raise ValueError("%s: %d AZs requested, subnets given for %d" % (
+                self.name, self.az_count, az_count))
+        if self.nat_per_az and "protected" not in dict(subnets):
+            raise ValueError("%s: nat_per_az needs a protected tier" % self.name)
+        for service in self.gateway_endpoints:
+            if service not in GATEWAY_SERVICES:
+                raise ValueError("%s: no gateway endpoint for %r" % (self.name, service))
+        if (self.gateway_endpoints or self.interface_endpoints) and not (
+                {"private", "protected"} & set(dict(subnets))):
+            raise ValueError("%s: VPC endpoints need a private or protected tier" % self.name)
+        if self.ipv6 and len(subnets) * az_count > 256:
+            raise ValueError("%s: a /56 holds 256 /64 subnets, %d needed" % (
+                self.name, len(subnets) * az_count))
+        for tier in flow_logs.tiers if flow_logs else ():
+            if tier not in dict(subnets):
+                raise ValueError("%s: flow logs for missing tier %r" % (self.name, tier))
+        if nat_alarms and "protected" not in dict(subnets):
+            raise ValueError("%s: NAT alarms need a protected tier" % self.name)
+        object.__setattr__(self, "subnets", subnets)
+        object.__setattr__(self, "tags", tuple((k, v) for k, v in tags))
+        object.__setattr__(self, "az_count", az_count)
+        object.__setattr__(self, "tiers", tuple(tier for tier, _ in subnets))
+        object.__setattr__(self, "gateway_endpoints", tuple(self.gateway_endpoints))
+        object.__setattr__(self, "interface_endpoints", tuple(self.interface_endpoints))
+        object.__setattr__(self, "flow_logs", flow_logs)
+        object.__setattr__(self, "nat_alarms", nat_alarms)
+
+    def tier(self, name):
+        """CIDRs of a tier, or an empty tuple if the environment does not have it."""
+        return dict(self.subnets).get(name, ())
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "cidr": self.cidr,
+            "subnets": {tier: list(cidrs) for tier, cidrs in self.subnets},
+            "tags": dict(self.tags),
+            "dns_hostnames": self.dns_hostnames,
+            "nat_per_az": self.nat_per_az,
+            "gateway_endpoints": list(self.gateway_endpoints),
+            "interface_endpoints": list(self.interface_endpoints),
+            "ipv6": self.ipv6,
+            "flow_logs": self.flow_logs and self.flow_logs.to_dict(),
+            "nat_alarms": self.nat_alarms and self.nat_alarms.to_dict(),
+        }
+
+
+@dataclass(frozen=True)
+class TransitGatewaySpec:
+    """A Transit Gateway hub that every VPC of the estate attaches to.
+
+    Resources are named after ``name`` ("HubTransitGateway", ...). Each VPC
+    attaches in its private subnets (protected, then public, when it has
+    none) and associates with and propagates into one hub route table. The
+    route tables of ``tiers`` send ``routes`` to the hub; leave ``routes``
+    out to use the VPC blocks of the estate, summarized.
+    """
+
+    name: str = "Hub"
+    asn: int = 64512
+    tiers: tuple = ("private", "protected")
+    routes: tuple = ()
+    tags: tuple = (("CostCenter", "12345"),)
+
+    def __post_init__(self):
+        if not self.name.isalnum():
+            raise ValueError('Transit gateway name "%s" not alphanumeric' % self.name)
+        for tier in self.tiers:
+            if tier not in TIERS:
+                raise ValueError("%s: unknown subnet tier %r" % (self.name, tier))
+        tags = self.tags
+        if isinstance(tags, dict):
+            tags = tags.items()
+        object.__setattr__(self, "tiers", tuple(self.tiers))
+        object.__setattr__(self, "routes", tuple(self.routes))
+        object.__setattr__(self, "tags", tuple((k, v) for k, v in tags))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "asn": self.asn,
+            "tiers": list(self.tiers),
+            "routes": list(self.routes),
+            "tags": dict(self.tags),
+        }
+
+
+@dataclass(frozen=True)
+class Estate:
+    """Every environment that goes into one generated template.
+
+    With a ``transit_gateway`` the VPCs are connected hub-and-spoke.
+    ``reachability`` lists pairs of endpoints ("Dev" or "Dev.private") that
+    may talk to each other; see cfvpc/summarize.py.
+    """
+
+    environments: tuple = ()
+    description: str = DEFAULT_DESCRIPTION
+    transit_gateway: TransitGatewaySpec = None
+    reachability: tuple = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, "environments", tuple(self.environments))
+        object.__setattr__(self, "reachability", tuple(tuple(rule) for rule in self.reachability))
+        hub = self.transit_gateway
+        if hub is not None and hub.name in {env.name for env in self.environments}:
+            raise ValueError('Transit gateway "%s" named like an environment' % hub.name)
+        for env in self.environments if hub is not None else ():
+            if not env.subnets:
+                raise ValueError("%s: attaching to the transit gateway needs a subnet tier" % env.name)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["environments"] = [
+            EnvironmentSpec.from_dict(env) for env in data.get("environments", ())
+        ]
+        if data.get("transit_gateway") is not None:
+            data["transit_gateway"] = TransitGatewaySpec.from_dict(data["transit_gateway"])
+        return cls(**data)
+
+    def to_dict(self):
+        data = {
+            "description": self.description,
+            "environments": [env.to_dict() for env in self.environments],
+        }
+        if self.transit_gateway is not None:
+            data["transit_gateway"] = self.transit_gateway.to_dict()
+        if self.reachability:
+            data["reachability"] = [list(rule) for rule in self.reachability]
+        return data
+
+
+def load_estate(path):
+    """Read an estate from a JSON spec file."""
+    with open(path) as f:
+        return Estate.from_dict(json.load(f))
+
+
+##############################################################################################
+
+# The Dev, Stage and Prod layout this repository has always generated. Subnets are
+# carved out of each VPC: /27s in Dev's /24, /21s in the /18s of Stg and Prod.
+
+DEFAULT_ESTATE = Estate(environments=(
+    EnvironmentSpec(name="Dev", cidr="10.0.0.0/24", dns_hostnames=False),
+    EnvironmentSpec(name="Stg", cidr="10.1.0.0/18"),
+    EnvironmentSpec(name="Prod", cidr="10.2.0.0/18"),
+))
+
+
+def synthetic_estate(count, base="10.0.0.0/8", prefix=22, az_count=2):
+    """``count`` environments with one /``prefix`` VPC each, for benchmarks."""
+    vpcs = CidrAllocator(base)
+    environments = [
+        EnvironmentSpec(
+            name="Env%04d" % n,
+            cidr=str(vpcs.allocate(prefix, n)),
+            az_count=az_count,
+            subnet_prefix=prefix + 4,
+        )
+        for n in range(count)
+    ]
+    return Estate(environments=environments, description="Synthetic estate of %d VPCs" % count)
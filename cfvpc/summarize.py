@@ -0,0 +1,194 @@
+##########################################################################################
+#  Reachability compiler with CIDR summarization.                                       #
+#                                                                                        #
+#  The estate lists which environments and tiers may talk to each other, e.g.          #
+#  ["Dev.private", "Stg"] (an environment alone means all of its tiers). Every rule is  #
+#  symmetric. For each tier involved the compiler works out the peer subnets, merges    #
+#  adjacent and contained blocks into the fewest supernets that cover exactly those     #
+#  subnets, and turns them into:                                                         #
+#                                                                                        #
+#  - routes to the Transit Gateway on the tier's route tables                           #
+#  - a network ACL: own VPC and peers allowed in, the rest of the estate denied, then   #
+#    Internet traffic (public) or TCP and UDP return traffic (protected) allowed; for   #
+#    dual-stack VPCs the same over IPv6, which does not cross the Transit Gateway       #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.summarize estate.json [--json]                               #
+##########################################################################################
+
+import argparse
+import collections
+import ipaddress
+import json
+import sys
+from dataclasses import dataclass, field
+
+from cfvpc.spec import load_estate
+
+# Default per-table quotas
+ROUTE_LIMIT = 50
+NACL_RULE_LIMIT = 20
+
+# Network ACL rules are numbered from FIRST_RULE in steps of RULE_STEP.
+FIRST_RULE = 100
+RULE_STEP = 10
+
+# Ephemeral ports that return traffic arrives on
+EPHEMERAL_PORTS = (1024, 65535)
+
+# What each tier accepts from the Internet once the estate rules are done: (protocol, ports)
+INTERNET = {
+    "public": [(-1, None)],
+    "protected": [(6, list(EPHEMERAL_PORTS)), (17, list(EPHEMERAL_PORTS))],
+}
+
+
+def summarize(cidrs):
+    """Fewest blocks covering exactly ``cidrs``: adjacent blocks merged, contained ones dropped."""
+    networks = sorted({ipaddress.ip_network(cidr) for cidr in cidrs})
+    return [str(block) for block in ipaddress.collapse_addresses(networks)]
+
+
+@dataclass
+class TierPolicy:
+    """What one tier of one environment gets out of the reachability rules.
+
+    ``acl`` holds inbound network ACL entries as ``[rule number, action,
+    CIDR, protocol, [from port, to port] or None]``. ``acl_ipv6`` holds the
+    IPv6 ones of a dual-stack VPC, numbered on from there; a CIDR of None
+    stands for the VPC's own IPv6 block.
+    """
+
+    peers: list = field(default_factory=list)
+    routes: list = field(default_factory=list)
+    acl: list = field(default_factory=list)
+    acl_ipv6: list = field(default_factory=list)
+    acl_unsummarized: int = 0
+
+    def to_dict(self):
+        return {"routes": self.routes, "acl": self.acl, "acl_ipv6": self.acl_ipv6}
+
+
+def _endpoint(specs, endpoint):
+    """``[(environment, tier)]`` an endpoint such as "Dev" or "Dev.private" stands for."""
+    name, _, tier = endpoint.partition(".")
+    spec = specs.get(name)
+    if spec is None:
+        raise ValueError("reachability: unknown environment %r" % name)
+    if tier and tier not in spec.tiers:
+        raise ValueError("reachability: %s has no %s tier" % (name, tier))
+    return [(spec, t) for t in ([tier] if tier else spec.tiers)]
+
+
+def _acl(spec, tier, peers, estate_blocks):
+    entries = []
+
+    def add(action, cidr, protocol=-1, ports=None):
+        entries.append([FIRST_RULE + RULE_STEP * len(entries), action, cidr, protocol, ports])
+
+    add("allow", spec.cidr)
+    for block in peers:
+        add("allow", block)
+    if tier != "private":
+        # Without these the Internet rule below would let other VPCs in. A
+        # block covering the own VPC is fine, the first rule already matched.
+        for block in estate_blocks:
+            if block != spec.cidr:
+                add("deny", block)
+    for protocol, ports in INTERNET.get(tier, ()):
+        add("allow", "0.0.0.0/0", protocol, ports)
+    return entries
+
+
+def _acl_ipv6(tier, first):
+    entries = [[first, "allow", None, -1, None]]
+    for protocol, ports in INTERNET.get(tier, ()):
+        entries.append([first + RULE_STEP * len(entries), "allow", "::/0", protocol, ports])
+    return entries
+
+
+def compile_reachability(estate):
+    """``{environment: {tier: TierPolicy}}`` for every tier the estate's rules mention."""
+    specs = {spec.name: spec for spec in estate.environments}
+    peers = {}
+    for rule in estate.reachability:
+        if len(rule) != 2:
+            raise ValueError("reachability: a rule connects two endpoints, got %r" % (rule,))
+        left, right = (_endpoint(specs, endpoint) for endpoint in rule)
+        for sources, targets in ((left, right), (right, left)):
+            for spec, tier in sources:
+                blocks = peers.setdefault((spec.name, tier), set())
+                for peer, peer_tier in targets:
+                    if peer.name != spec.name:
+                        blocks.update(peer.tier(peer_tier))
+    if peers and estate.transit_gateway is None:
+        raise ValueError("reachability between VPCs needs a transit_gateway")
+
+    vpcs = collections.Counter(spec.cidr for spec in estate.environments)
+    estate_blocks = summarize(vpcs)
+    policies = {}
+    for (name, tier), blocks in sorted(peers.items()):
+        spec = specs[name]
+        blocks = sorted(blocks, key=ipaddress.ip_network)
+        routes = summarize(blocks)
+        acl = _acl(spec, tier, routes, estate_blocks)
+        # What _acl() would give for the unsummarized blocks: own VPC, every
+        # peer, a deny per other VPC, the Internet rules
+        denied = sum(vpcs.values()) - vpcs[spec.cidr] if tier != "private" else 0
+        policy = TierPolicy(
+            peers=blocks,
+            routes=routes,
+            acl=acl,
+            acl_ipv6=_acl_ipv6(tier, acl[-1][0] + RULE_STEP) if spec.ipv6 else [],
+            acl_unsummarized=1 + len(blocks) + denied + len(INTERNET.get(tier, ())),
+        )
+        if len(policy.routes) > ROUTE_LIMIT:
+            raise ValueError("%s %s: %d routes, more than a route table holds (%d)" % (
+                name, tier, len(policy.routes), ROUTE_LIMIT))
+        if len(policy.acl) > NACL_RULE_LIMIT:
+            raise ValueError("%s %s: %d inbound ACL rules, more than a network ACL holds (%d)" % (
+                name, tier, len(policy.acl), NACL_RULE_LIMIT))
+        policies.setdefault(name, {})[tier] = policy
+    return policies
+
+
+def report(estate):
+    """Entries per tier before and after summarization."""
+    specs = {spec.name: spec for spec in estate.environments}
+    rows = []
+    for name, tiers in compile_reachability(estate).items():
+        spec = specs[name]
+        for tier, policy in tiers.items():
+            # Routes go on every route table of the tier.
+            tables = spec.az_count if tier == "protected" and spec.nat_per_az else 1
+            rows.append({
+                "environment": name,
+                "tier": tier,
+                "routes_before": len(policy.peers) * tables,
+                "routes_after": len(policy.routes) * tables,
+                "acl_before": policy.acl_unsummarized,
+                "acl_after": len(policy.acl),
+            })
+    saved = sum(r["routes_before"] - r["routes_after"] + r["acl_before"] - r["acl_after"] for r in rows)
+    return {"tiers": rows, "entries_saved": saved}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarized routes and network ACLs of an estate.")
+    parser.add_argument("estate")
+    parser.add_argument("--json", action="store_true", help="machine-readable report")
+    args = parser.parse_args(argv)
+
+    result = report(load_estate(args.estate))
+    if args.json:
+        print(json.dumps(result, indent=1, sort_keys=True))
+        return 0
+    print("%-16s %-10s %15s %15s" % ("environment", "tier", "routes", "acl rules"))
+    for r in result["tiers"]:
+        print("%-16s %-10s %6d -> %-6d %6d -> %-6d" % (
+            r["environment"], r["tier"], r["routes_before"], r["routes_after"], r["acl_before"], r["acl_after"]))
+    print("%d entries saved" % result["entries_saved"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+##########################################################################################
+#  Offline template validation.                                                         #
+#                                                                                        #
+#  Checks what `aws cloudformation validate-template` does not, without a network call: #
+#                                                                                        #
+#  - every Ref, GetAtt and DependsOn points at something that exists                    #
+#  - the resource dependency graph has no cycles                                        #
+#  - no logical ID is used twice                                                        #
+#  - required properties are set (from troposphere's property tables)                   #
+#  - subnets sit inside their VPC and do not overlap, VPCs do not overlap               #
+#                                                                                        #
+#  validate() takes a template dict, a troposphere Template, or the builder's IR        #
+#  records as they are, so a build can be checked before anything is serialized.        #
+#                                                                                        #
+#  Usage: python3 -m cfvpc.validate cloudformation.json [more.json|.yaml ...]           #
+##########################################################################################
+
+import importlib
+import inspect
+import json
+import sys
+from collections import deque
+from dataclasses import dataclass
+
+from troposphere import Template, encode_to_dict
+
+from cfvpc import ir
+from cfvpc.cidr import CidrAllocator, CidrError, CidrIndex
+from cfvpc.refs import depends_on, is_pseudo, references
+
+
+@dataclass(frozen=True)
+class Problem:
+    check: str
+    logical_id: str
+    message: str
+
+    def __str__(self):
+        return "%s: %s: %s" % (self.check, self.logical_id, self.message)
+
+
+class DuplicateKeyError(ValueError):
+    pass
+
+
+def _no_duplicates(pairs):
+    seen = {}
+    for key, value in pairs:
+        if key in seen:
+            raise DuplicateKeyError('duplicate key "%s" detected' % key)
+        seen[key] = value
+    return seen
+
+
+def load_template(path):
+    """Template dict from a JSON or YAML file; raises DuplicateKeyError on repeated JSON keys.
+
+    Anything that does not parse raises ValueError.
+    """
+    with open(path) as f:
+        text = f.read()
+    if not text.lstrip().startswith("{"):
+        import cfn_flip
+        import yaml
+
+        try:
+            text = cfn_flip.dump_json(cfn_flip.load_yaml(text))
+        except yaml.YAMLError as e:
+            raise ValueError("%s is neither JSON nor YAML: %s" % (path, e))
+    template = json.loads(text, object_pairs_hook=_no_duplicates)
+    if not isinstance(template, dict):
+        raise ValueError("%s is not a template" % path)
+    return template
+
+
+_classes = {}
+
+
+def resource_class(resource_type):
+    """troposphere class for a resource type such as AWS::EC2::VPC, or None."""
+    if resource_type not in _classes:
+        parts = resource_type.split("::")
+        cls = None
+        if len(parts) == 3 and parts[0] == "AWS":
+            try:
+                module = importlib.import_module("troposphere.%s" % parts[1].lower())
+            except ImportError:
+                module = None
+            for _, candidate in inspect.getmembers(module, inspect.isclass) if module else ():
+                if getattr(candidate, "resource_type", None) == resource_type:
+                    cls = candidate
+                    break
+        _classes[resource_type] = cls
+    return _classes[resource_type]
+
+
+def _ir_resource(resource):
+    """Template dict shape of an IR record; property values stay IR, nothing is encoded."""
+    data = {"Type": resource.resource_type, "Properties": dict(resource.properties)}
+    if resource.depends_on is not None:
+        data["DependsOn"] = resource.depends_on
+    return data
+
+
+def _as_dict(template):
+    if isinstance(template, dict):
+        return template
+    if not isinstance(template, Template):
+        return {"Resources": {resource.title: _ir_resource(resource) for resource in template}}
+    # Encode without troposphere's own validation so missing properties are
+    # reported instead of raised.
+    data = {"Resources": {
+        title: encode_to_dict(resource.to_dict(validation=False))
+        for title, resource in template.resources.items()
+    }}
+    if template.parameters:
+        data["Parameters"] = encode_to_dict(template.parameters)
+    if template.outputs:
+        data["Outputs"] = encode_to_dict(template.outputs)
+    return data
+
+
+def _resource_refs(template):
+    """``{logical_id: (Ref/GetAtt pairs, DependsOn targets)}``, walked once per check run."""
+    return {
+        title: (list(references(resource.get("Properties", {}))), depends_on(resource))
+        for title, resource in template.get("Resources", {}).items()
+    }
+
+
+def check_references(template, refs=None):
+    resources = template.get("Resources", {})
+    refs = refs or _resource_refs(template)
+    parameters = template.get("Parameters", {})
+    problems = []
+    for title in set(resources) & set(parameters):
+        problems.append(Problem("duplicate", title, "used as both a parameter and a resource"))
+
+    def check(title, pairs):
+        for target, attribute in pairs:
+            if attribute is None:
+                if target not in resources and target not in parameters and not is_pseudo(target):
+                    problems.append(Problem("reference", title, "Ref to undefined %s" % target))
+            elif target not in resources:
+                problems.append(Problem("reference", title, "GetAtt on undefined %s" % target))
+
+    for title, (pairs, waits) in refs.items():
+        check(title, pairs)
+        for target in waits:
+            if target not in resources:
+                problems.append(Problem("reference", title, "DependsOn undefined %s" % target))
+    for title, output in template.get("Outputs", {}).items():
+        check(title, references(output))
+    return problems
+
+
+def dependency_graph(template, refs=None):
+    """``{logical_id: set of resources it waits for}`` from Ref, GetAtt and DependsOn."""
+    resources = template.get("Resources", {})
+    graph = {}
+    for title, (pairs, waits) in (refs or _resource_refs(template)).items():
+        targets = {t for t, _ in pairs}
+        targets.update(waits)
+        graph[title] = {t for t in targets if t in resources and t != title}
+    return graph
+
+
+def check_cycles(template, refs=None):
+    graph = dependency_graph(template, refs)
+    waiting = {title: len(targets) for title, targets in graph.items()}
+    dependents = {title: [] for title in graph}
+    for title, targets in graph.items():
+        for target in targets:
+            dependents[target].append(title)
+    ready = deque(title for title, count in waiting.items() if not count)
+    while ready:
+        for dependent in dependents[ready.popleft()]:
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                ready.append(dependent)
+    return [
+        Problem("cycle", title, "part of or waiting on a dependency cycle")
+        for title in sorted(title for title, count in waiting.items() if count)
+    ]
+
+
+def check_properties(template, refs=None):
+    problems = []
+    for title, resource in template.get("Resources", {}).items():
+        cls = resource_class(resource.get("Type", ""))
+        if cls is None:
+            continue
+        properties = resource.get("Properties", {})
+        for name, (_, required) in cls.props.items():
+            if required and name not in properties:
+                problems.append(Problem("property", title, "required property %s missing" % name))
+        for name in properties:
+            if name not in cls.props:
+                problems.append(Problem("property", title, "unknown property %s" % name))
+    return problems
+
+
+def _ref(value):
+    """Logical ID ``value`` is a Ref to, or None."""
+    if isinstance(value, ir.Fn):
+        return value.value if value.name == "Ref" else None
+    return value.get("Ref") if isinstance(value, dict) else None
+
+
+def check_cidrs(template, refs=None):
+    resources = template.get("Resources", {})
+    problems = []
+    vpcs = CidrIndex()
+    subnets = {}
+    for title, resource in sorted(resources.items()):
+        cidr = resource.get("Properties", {}).get("CidrBlock")
+        if resource.get("Type") == "AWS::EC2::VPC" and isinstance(cidr, str):
+            try:
+                vpcs.add(cidr, title)
+                subnets[title] = CidrAllocator(cidr)
+            except (CidrError, ValueError) as e:
+                problems.append(Problem("cidr", title, str(e)))
+    for title, resource in sorted(resources.items()):
+        properties = resource.get("Properties", {})
+        cidr = properties.get("CidrBlock")
+        vpc = properties.get("VpcId")
+        if resource.get("Type") != "AWS::EC2::Subnet" or not isinstance(cidr, str):
+            continue
+        if _ref(vpc) in subnets:
+            try:
+                subnets[_ref(vpc)].reserve(cidr, title)
+            except (CidrError, ValueError) as e:
+                problems.append(Problem("cidr", title, str(e)))
+    return problems
+
+
+CHECKS = (check_references, check_cycles, check_properties, check_cidrs)
+
+
+def validate(template):
+    """Every problem found in a template; empty when valid.
+
+    ``template`` is a template dict, a troposphere Template or a sequence of
+    ir.Resource records, e.g. every group of builder.estate_groups(). Records
+    are a template without parameters or outputs.
+    """
+    problems = []
+    if not isinstance(template, (dict, Template)):
+        template = list(template)
+        seen = set()
+        for resource in template:
+            if resource.title in seen:
+                problems.append(Problem("duplicate", resource.title, "logical ID used more than once"))
+            seen.add(resource.title)
+    template = _as_dict(template)
+    refs = _resource_refs(template)
+    for check in CHECKS:
+        problems.extend(check(template, refs))
+    return problems
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python3 -m cfvpc.validate TEMPLATE.json [...]", file=sys.stderr)
+        return 2
+    failed = False
+    for path in paths:
+        try:
+            problems = validate(load_template(path))
+        except ValueError as e:
+            problems = [Problem("parse", path, str(e))]
+        for problem in problems:
+            print("%s: %s" % (path, problem))
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+##########################################################################################
+#  Per-target overrides of the base estate.                                              #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import unittest
+
+from cfvpc.batch import apply_overrides
+from cfvpc.spec import DEFAULT_ESTATE, Estate, EnvironmentSpec
+
+BASE = Estate(environments=(
+    EnvironmentSpec(name="Dev", cidr="10.0.0.0/24"),
+    EnvironmentSpec(name="Prod", cidr="10.2.0.0/18", az_count=3, subnet_prefix=24),
+))
+
+
+def prod(estate):
+    return estate.environments[1]
+
+
+class OverrideTest(unittest.TestCase):
+
+    def test_cidr_keeps_layout(self):
+        spec = prod(apply_overrides(BASE, environments={"Prod": {"cidr": "10.20.0.0/18"}}))
+        self.assertEqual(spec.az_count, 3)
+        self.assertEqual([tier for tier, _ in spec.subnets], ["private", "public", "protected"])
+        self.assertEqual(spec.tier("private"), ("10.20.0.0/24", "10.20.1.0/24", "10.20.2.0/24"))
+        self.assertEqual(spec.tier("protected")[-1], "10.20.8.0/24")
+
+    def test_layout_override_wins(self):
+        spec = prod(apply_overrides(BASE, environments={"Prod": {"cidr": "10.20.0.0/18", "az_count": 2}}))
+        self.assertEqual(spec.tier("private"), ("10.20.0.0/21", "10.20.8.0/21"))
+        spec = prod(apply_overrides(BASE, environments={"Prod": {"subnet_prefix": 23}}))
+        self.assertEqual(spec.tier("public"), ("10.2.6.0/23", "10.2.8.0/23", "10.2.10.0/23"))
+        spec = prod(apply_overrides(BASE, environments={"Prod": {"tiers": ["public", "protected"]}}))
+        self.assertEqual((spec.tiers, spec.az_count), (("public", "protected"), 3))
+
+    def test_default_estate(self):
+        # The override advertised in the targets file header
+        estate = apply_overrides(DEFAULT_ESTATE, environments={"Prod": {"cidr": "10.20.0.0/18", "az_count": 3}})
+        self.assertEqual(estate.environments[2].tier("private"), ("10.20.0.0/22", "10.20.4.0/22", "10.20.8.0/22"))
+        self.assertEqual(estate.environments[:2], DEFAULT_ESTATE.environments[:2])
+
+    def test_tags(self):
+        estate = apply_overrides(BASE, {"CostCenter": "999", "Owner": "net"}, {"Prod": {"tags": {"Owner": "ops"}}})
+        self.assertEqual(dict(estate.environments[0].tags), {"CostCenter": "999", "Owner": "net"})
+        self.assertEqual(dict(prod(estate).tags), {"CostCenter": "999", "Owner": "ops"})
+        self.assertEqual(prod(estate).subnets, prod(BASE).subnets)
+
+    def test_unknown_environment(self):
+        with self.assertRaises(ValueError):
+            apply_overrides(BASE, environments={"Stg": {"cidr": "10.1.0.0/18"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
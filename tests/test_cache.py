@@ -0,0 +1,105 @@
+##########################################################################################
+#  Incremental builds.                                                                  #
+#                                                                                        #
+#  A build served from the build cache (cfvpc/cache.py) has to have the same bytes as  #
+#  a cold build, however the estate changed in between.                                 #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from cfvpc import cli
+from cfvpc.cache import BuildCache, MemoryCache
+from cfvpc.emit import stream_estate
+from cfvpc.shard import write_shards
+from cfvpc.spec import DEFAULT_ESTATE, Estate, EnvironmentSpec, TransitGatewaySpec
+
+HUB_ESTATE = Estate(
+    environments=(
+        EnvironmentSpec(name="Dev", cidr="10.0.0.0/24"),
+        EnvironmentSpec(name="Prod", cidr="10.2.0.0/18"),
+        EnvironmentSpec(name="Ops", cidr="10.3.0.0/18"),
+    ),
+    transit_gateway=TransitGatewaySpec(routes=("10.0.0.0/8",)),
+)
+
+
+def build(estate, cache=None, fmt="json"):
+    out = io.StringIO()
+    stream_estate(estate, out, fmt, cache)
+    return out.getvalue()
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = BuildCache(self.tmp.name)
+
+    def assertWarmEqualsCold(self, *estates):
+        for estate in estates:
+            self.assertEqual(build(estate, self.cache), build(estate))
+
+    def test_warm_equals_cold(self):
+        for fmt in ("json", "yaml", "compact"):
+            build(DEFAULT_ESTATE, self.cache, fmt)
+            self.assertEqual(build(DEFAULT_ESTATE, self.cache, fmt), build(DEFAULT_ESTATE, fmt=fmt))
+        self.assertGreater(self.cache.hits, 0)
+
+    def test_changed_environment(self):
+        changed = dataclasses.replace(DEFAULT_ESTATE, environments=(
+            DEFAULT_ESTATE.environments[:2]
+            + (dataclasses.replace(DEFAULT_ESTATE.environments[2], nat_per_az=True),)
+        ))
+        self.assertWarmEqualsCold(DEFAULT_ESTATE, changed)
+
+    def test_reachability_added(self):
+        # Without rules Ops gets every hub route; with rules that leave it out, none
+        reachable = dataclasses.replace(HUB_ESTATE, reachability=(("Dev", "Prod"),))
+        self.assertWarmEqualsCold(HUB_ESTATE, reachable)
+        self.assertNotIn("OpsPrivateRouteTableTransit1", build(reachable, self.cache))
+        self.assertWarmEqualsCold(HUB_ESTATE)
+
+    def test_shards(self):
+        cold, warm = os.path.join(self.tmp.name, "cold"), os.path.join(self.tmp.name, "warm")
+        write_shards(HUB_ESTATE, warm, 40, 1, self.cache)
+        paths = write_shards(HUB_ESTATE, warm, 40, 1, self.cache)
+        self.assertEqual(paths, [p.replace(cold, warm) for p in write_shards(HUB_ESTATE, cold, 40, 1)])
+        for path in paths:
+            with open(path) as w, open(path.replace(warm, cold)) as c:
+                self.assertEqual(w.read(), c.read())
+
+    def test_watch_targets(self):
+        # --watch --targets without --cache-dir renders through the in-memory cache
+        targets = os.path.join(self.tmp.name, "targets.json")
+        with open(targets, "w") as f:
+            json.dump({"targets": [
+                {"account": "111122223333", "region": "eu-central-1", "environments": {"Prod": {"cidr": "10.20.0.0/18"}}},
+                {"account": "444455556666", "region": "us-east-1"},
+            ]}, f)
+        out_dir = os.path.join(self.tmp.name, "build")
+        args = cli.parse_args([
+            "--targets", targets, "--out-dir", out_dir, "--watch", "--processes", "2", "--format", "yaml",
+        ])
+        cache = MemoryCache()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cli.build(args, cache)
+            first = dict(hits=cache.hits, misses=cache.misses)
+            cli.build(args, cache)
+        # Dev and Stg are shared between the targets, Prod is not
+        self.assertEqual(first, {"hits": 2, "misses": 4})
+        self.assertEqual((cache.hits, cache.misses), (8, 4))
+        with open(os.path.join(out_dir, "444455556666-us-east-1.yaml")) as f:
+            self.assertEqual(f.read(), build(DEFAULT_ESTATE, fmt="yaml"))
+
+
+if __name__ == "__main__":
+    unittest.main()
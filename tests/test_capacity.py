@@ -0,0 +1,68 @@
+##########################################################################################
+#  Capacity planning: the numpy and plain-list paths have to agree.                      #
+#                                                                                        #
+#  numpy is optional; the comparison is skipped without it.                              #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import json
+import unittest
+from unittest import mock
+
+from cfvpc import capacity
+from cfvpc.spec import DEFAULT_ESTATE, synthetic_estate
+
+WORKLOAD = capacity.Workload(
+    growth=1.1,
+    tiers={"private": {"db": 10, "cache": 6}, "public": {"alb": 8}, "protected": {"app": 480, "lambda": 1500}},
+    environments={"Dev": {"growth": 3.0, "tiers": {"protected": {"app": 20}}}},
+)
+
+
+def plain():
+    """Force the plain-list path."""
+    return mock.patch.object(capacity, "_numpy", return_value=None)
+
+
+class CapacityTest(unittest.TestCase):
+
+    def test_plain(self):
+        with plain():
+            plan = capacity.plan_capacity(DEFAULT_ESTATE, WORKLOAD)
+        dev, stg, _ = plan.vpc_rows()
+        # Dev: 30 protected ENIs per AZ (20 grown by 3) do not fit a /27's 27 usable addresses
+        self.assertEqual((dev["projected"], dev["reserved"], dev["short_subnets"]), (132, 30, 2))
+        self.assertEqual((dev["subnet_prefix"], dev["vpc_prefix"], dev["fits"]), (26, 23, False))
+        # Stg: 1,089 protected ENIs per AZ fit the /21s it has
+        self.assertEqual((stg["projected"], stg["short_subnets"]), (2206, 0))
+        self.assertEqual((stg["subnet_prefix"], stg["vpc_prefix"], stg["fits"]), (21, 18, True))
+        json.dumps(plan.to_dict())
+
+    def test_growth_rounding(self):
+        with plain():
+            projected = capacity.fit_subnets([10, 5], [1.1, 1.0], [24, 28])[0]
+        self.assertEqual(projected, [11, 5])
+
+
+@unittest.skipIf(capacity._numpy() is None, "numpy is not installed")
+class NumpyTest(unittest.TestCase):
+
+    def test_same_as_plain(self):
+        estate = synthetic_estate(300)
+        for workload in (WORKLOAD, capacity.Workload(), capacity.Workload(2.5, WORKLOAD.tiers)):
+            with plain():
+                expected = capacity.plan_capacity(estate, workload).to_dict()
+            got = capacity.plan_capacity(estate, workload).to_dict()
+            self.assertEqual(json.dumps(got, sort_keys=True), json.dumps(expected, sort_keys=True))
+
+    def test_columns(self):
+        demand, growth, prefix = [0, 1, 11, 250, 1e6], [1.0, 1.1, 1.1, 3.0, 1.0], [28, 28, 24, 16, 16]
+        with plain():
+            expected = capacity.fit_subnets(demand, growth, prefix)
+        for got, want in zip(capacity.fit_subnets(demand, growth, prefix), expected):
+            self.assertEqual(got.tolist(), want)
+
+
+if __name__ == "__main__":
+    unittest.main()
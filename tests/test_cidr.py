@@ -0,0 +1,103 @@
+##########################################################################################
+#  CIDR allocation and overlap checks.                                                   #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import ipaddress
+import unittest
+
+from cfvpc.cidr import CidrAllocator, CidrError, CidrIndex, carve_subnets, check_estate, subnet_prefix, supernet
+from cfvpc.spec import DEFAULT_ESTATE, Estate, EnvironmentSpec
+
+
+class CidrIndexTest(unittest.TestCase):
+
+    def test_overlap(self):
+        index = CidrIndex()
+        index.add("10.0.0.0/16", "a")
+        index.add("10.2.0.0/16", "c")
+        index.add("10.1.0.0/16", "b")
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.find("10.1.128.0/17"), "b")
+        self.assertEqual(index.find("10.0.0.0/8"), "a")
+        self.assertIsNone(index.find("10.3.0.0/16"))
+        with self.assertRaises(CidrError):
+            index.add("10.2.255.0/24", "d")
+
+
+class CidrAllocatorTest(unittest.TestCase):
+
+    def test_first_fit_aligned(self):
+        allocator = CidrAllocator("10.0.0.0/24")
+        self.assertEqual(str(allocator.allocate(26, "a")), "10.0.0.0/26")
+        self.assertEqual(str(allocator.allocate(27, "b")), "10.0.0.64/27")
+        # The next /26 skips past the /27, realigned
+        self.assertEqual(str(allocator.allocate(26, "c")), "10.0.0.128/26")
+        self.assertEqual(str(allocator.allocate(27, "d")), "10.0.0.96/27")
+        self.assertEqual(str(allocator.allocate(26, "e")), "10.0.0.192/26")
+        with self.assertRaises(CidrError):
+            allocator.allocate(28, "f")
+
+    def test_reserved_blocks(self):
+        allocator = CidrAllocator("10.0.0.0/24")
+        allocator.reserve("10.0.0.32/27", "existing")
+        self.assertEqual(str(allocator.allocate(27, "a")), "10.0.0.0/27")
+        self.assertEqual(str(allocator.allocate(26, "b")), "10.0.0.64/26")
+        with self.assertRaises(CidrError):
+            allocator.reserve("10.0.1.0/27", "outside")
+        with self.assertRaises(CidrError):
+            allocator.reserve("10.0.0.48/28", "overlap")
+        with self.assertRaises(CidrError):
+            allocator.allocate(23, "too large")
+
+    def test_matches_exhaustive_search(self):
+        # First fit against a brute-force scan of the pool
+        allocator = CidrAllocator("10.0.0.0/20")
+        taken = []
+        for n, prefix in enumerate([24, 22, 26, 24, 21, 23, 28, 22, 25, 24] * 3):
+            pool = ipaddress.ip_network("10.0.0.0/20")
+            expected = next((
+                block for block in pool.subnets(new_prefix=prefix)
+                if not any(block.overlaps(other) for other in taken)
+            ), None)
+            if expected is None:
+                with self.assertRaises(CidrError):
+                    allocator.allocate(prefix, n)
+                continue
+            self.assertEqual(allocator.allocate(prefix, n), expected)
+            taken.append(expected)
+
+
+class CarveTest(unittest.TestCase):
+
+    def test_default_layout(self):
+        # The Dev/Stg/Prod layout this repository has always generated
+        dev, stg, _ = DEFAULT_ESTATE.environments
+        self.assertEqual(carve_subnets(dev.cidr, ("private", "public", "protected"), 2), dict(dev.subnets))
+        self.assertEqual(dict(stg.subnets)["protected"], ("10.1.32.0/21", "10.1.40.0/21"))
+
+    def test_prefix(self):
+        self.assertEqual(subnet_prefix("10.0.0.0/24", 6), 27)
+        self.assertEqual(subnet_prefix("10.0.0.0/18", 9), 22)
+        with self.assertRaises(CidrError):
+            subnet_prefix("10.0.0.0/26", 6)
+        self.assertEqual(supernet(["10.0.0.0/24", "10.0.3.0/24"]), "10.0.0.0/22")
+
+    def test_check_estate(self):
+        check_estate(DEFAULT_ESTATE)
+        overlapping = Estate(environments=(
+            EnvironmentSpec(name="A", cidr="10.0.0.0/16"),
+            EnvironmentSpec(name="B", cidr="10.0.128.0/17"),
+        ))
+        with self.assertRaises(CidrError):
+            check_estate(overlapping)
+        outside = Estate(environments=(
+            EnvironmentSpec(name="A", cidr="10.0.0.0/24", subnets={"private": ["10.0.1.0/26"]}),
+        ))
+        with self.assertRaises(CidrError):
+            check_estate(outside)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+##########################################################################################
+#  Semantic template diff and the rollout plan between two --targets builds.            #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import copy
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from cfvpc import diff
+from cfvpc.api import render
+from cfvpc.batch import Target, apply_overrides, render_targets
+from cfvpc.emit import stream_estate
+from cfvpc.spec import DEFAULT_ESTATE
+
+
+def changes(old, new):
+    return {c.logical_id: (c.action, c.properties, c.cause) for c in diff.diff_templates(old, new).changes}
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old = json.loads(render(DEFAULT_ESTATE))
+        self.new = copy.deepcopy(self.old)
+        self.resources = self.new["Resources"]
+
+    def test_unchanged_across_formats(self):
+        out = io.StringIO()
+        stream_estate(DEFAULT_ESTATE, out, "compact")
+        self.assertFalse(diff.diff_templates(self.old, json.loads(out.getvalue())).changed)
+
+    def test_add_and_remove(self):
+        self.resources["ExtraTable"] = {"Type": "AWS::EC2::RouteTable", "Properties": {"VpcId": {"Ref": "DEVVPC"}}}
+        del self.resources["StgNat"]
+        found = changes(self.old, self.new)
+        self.assertEqual(found["ExtraTable"], (diff.ADD, [], None))
+        self.assertEqual(found["StgNat"], (diff.REMOVE, [], None))
+
+    def test_modify(self):
+        self.resources["DEVVPC"]["Properties"]["EnableDnsHostnames"] = True
+        self.assertEqual(changes(self.old, self.new), {"DEVVPC": (diff.MODIFY, ["EnableDnsHostnames"], None)})
+
+    def test_replace_cascades(self):
+        # A new subnet CIDR replaces the subnet, and with it what points at it
+        # through a property that requires replacement
+        self.resources["prodpublicsubnet1"]["Properties"]["CidrBlock"] = "10.2.48.0/21"
+        found = changes(self.old, self.new)
+        self.assertEqual(found["prodpublicsubnet1"], (diff.REPLACE, ["CidrBlock"], None))
+        self.assertEqual(found["ProdNat"], (diff.REPLACE, ["SubnetId"], "prodpublicsubnet1"))
+        self.assertEqual(found["ProdPublicSubnet1RouteTable"], (diff.REPLACE, ["SubnetId"], "prodpublicsubnet1"))
+        # NatGatewayId is updated in place
+        self.assertEqual(found["ProdNatRoute"], (diff.MODIFY, ["NatGatewayId"], "ProdNat"))
+        self.assertEqual(len(found), 4)
+
+    def test_type_change(self):
+        self.resources["DevInternetGateway"]["Type"] = "AWS::EC2::EgressOnlyInternetGateway"
+        self.assertEqual(changes(self.old, self.new)["DevInternetGateway"][:2], (diff.REPLACE, ["Type"]))
+
+    def test_sections(self):
+        self.new["Description"] = "another"
+        result = diff.diff_templates(self.old, self.new)
+        self.assertEqual((result.changes, result.sections), ([], ["Description"]))
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_plan_targets(self):
+        base = [
+            Target("111122223333", "eu-central-1", DEFAULT_ESTATE),
+            Target("444455556666", "us-east-1", DEFAULT_ESTATE),
+            Target("999900001111", "ap-south-1", DEFAULT_ESTATE),
+        ]
+        changed = apply_overrides(DEFAULT_ESTATE, {"CostCenter": "999"})
+        new = [base[0], Target("444455556666", "us-east-1", changed), Target("777788889999", "eu-west-1", changed)]
+        with tempfile.TemporaryDirectory() as tmp:
+            old_dir, new_dir = os.path.join(tmp, "old"), os.path.join(tmp, "new")
+            render_targets(base, old_dir, processes=1)
+            render_targets(new, new_dir, processes=1, fmt="yaml")
+            plan = diff.plan_targets(old_dir, new_dir)
+        self.assertEqual(plan.unchanged, 1)
+        # Only tags changed: every change is in place
+        self.assertEqual([e["account"] for e in plan.update], ["444455556666"])
+        self.assertEqual({(c["action"], tuple(c["properties"])) for c in plan.update[0]["changes"]}, {
+            (diff.MODIFY, ("Tags",)),
+        })
+        self.assertEqual(plan.create, [{
+            "account": "777788889999", "region": "eu-west-1", "template": "777788889999-eu-west-1.yaml",
+            "parameters": diff.address_plan("777788889999", "eu-west-1"),
+        }])
+        self.assertEqual(plan.delete, [{"account": "999900001111", "region": "ap-south-1"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
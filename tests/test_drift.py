@@ -0,0 +1,138 @@
+##########################################################################################
+#  Drift detection against the in-process backend.                                      #
+#                                                                                        #
+#  The Dev/Stg/Prod template is deployed to cfvpc.drift.FakeBackend, the EC2 state is   #
+#  drifted by hand and compare_stack()/detect_drift() have to find exactly that.         #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import asyncio
+import io
+import json
+import unittest
+
+from cfvpc import drift
+from cfvpc.api import render
+from cfvpc.emit import common_tags, stream_estate
+from cfvpc.spec import DEFAULT_ESTATE
+
+ACCOUNT, REGION = "111122223333", "eu-central-1"
+
+
+class DriftTest(unittest.TestCase):
+
+    def setUp(self):
+        self.template = json.loads(render(DEFAULT_ESTATE))
+        self.backend = drift.FakeBackend()
+        self.ids = self.backend.deploy(ACCOUNT, REGION, self.template)
+
+    def check(self, account=ACCOUNT, template=None):
+        report = asyncio.run(drift.detect_drift(self.backend, [(account, REGION, template or self.template)]))
+        self.assertEqual(len(report.targets), 1)
+        return report.targets[0]
+
+    def drifts(self, target):
+        return {d.logical_id: d for d in target.resources}
+
+    def test_in_sync(self):
+        target = self.check()
+        self.assertEqual(target.status, drift.IN_SYNC)
+        self.assertEqual(target.resources, [])
+        self.assertTrue(target.stack_id.startswith("arn:aws:cloudformation:%s:%s:" % (REGION, ACCOUNT)))
+        counted = {r["Type"] for r in self.template["Resources"].values()} & set(drift.CHECKED)
+        self.assertEqual(counted, set(drift.CHECKED))
+        self.assertEqual(target.checked + target.not_checked, len(self.template["Resources"]))
+
+    def test_changed_cidr(self):
+        subnet = self.ids["prodprotectedsubnet1"]
+        self.backend.subnets[ACCOUNT, REGION][subnet]["CidrBlock"] = "10.99.0.0/24"
+        target = self.check()
+        self.assertEqual(target.status, drift.DRIFTED)
+        found = self.drifts(target)
+        self.assertEqual(list(found), ["prodprotectedsubnet1"])
+        self.assertEqual(found["prodprotectedsubnet1"].status, drift.MODIFIED)
+        self.assertEqual(found["prodprotectedsubnet1"].physical_id, subnet)
+        self.assertEqual(found["prodprotectedsubnet1"].differences, [("CidrBlock", "10.2.32.0/21", "10.99.0.0/24")])
+
+    def test_changed_route(self):
+        table = self.backend.route_tables[ACCOUNT, REGION][self.ids["ProdProtectedRouteTable"]]
+        route = next(r for r in table["Routes"] if r.get("DestinationCidrBlock") == "0.0.0.0/0")
+        route["NatGatewayId"] = "nat-0000000000000000f"
+        table["Routes"].append({"DestinationCidrBlock": "192.168.0.0/16", "GatewayId": "igw-0000000000000000f"})
+        target = self.check()
+        self.assertEqual(target.status, drift.DRIFTED)
+        found = self.drifts(target)
+        self.assertEqual(list(found), ["ProdProtectedRouteTable"])
+        self.assertEqual(found["ProdProtectedRouteTable"].differences, [
+            ("Routes[0.0.0.0/0]", "NatGatewayId=%s" % self.ids["ProdNat"], "NatGatewayId=nat-0000000000000000f"),
+            ("Routes[192.168.0.0/16]", None, "GatewayId=igw-0000000000000000f"),
+        ])
+
+    def test_moved_association(self):
+        table = self.backend.route_tables[ACCOUNT, REGION][self.ids["ProdPrivateRouteTable"]]
+        table["Associations"].pop()
+        found = self.drifts(self.check())
+        self.assertEqual(list(found), ["ProdPrivateRouteTable"])
+        self.assertEqual([d[0] for d in found["ProdPrivateRouteTable"].differences], ["Associations"])
+
+    def test_deleted_subnet(self):
+        subnet = self.ids["devprivatesubnet2"]
+        del self.backend.subnets[ACCOUNT, REGION][subnet]
+        target = self.check()
+        self.assertEqual(target.status, drift.DRIFTED)
+        found = self.drifts(target)
+        self.assertEqual(list(found), ["devprivatesubnet2"])
+        self.assertEqual(found["devprivatesubnet2"].status, drift.DELETED)
+        self.assertEqual(found["devprivatesubnet2"].physical_id, subnet)
+
+    def test_changed_tag(self):
+        vpc = self.backend.vpcs[ACCOUNT, REGION][self.ids["STGVPC"]]
+        vpc["Tags"] = [tag for tag in vpc["Tags"] if tag["Key"] != "CostCenter"]
+        found = self.drifts(self.check())
+        self.assertEqual(found["STGVPC"].differences, [("Tags[CostCenter]", "12345", None)])
+
+    def test_missing_stack(self):
+        target = self.check(account="444455556666")
+        self.assertEqual(target.status, drift.NO_STACK)
+        self.assertIsNone(target.stack_id)
+        self.assertEqual(target.resources, [])
+
+    def test_stack_tags(self):
+        # Built with --stack-tags: CostCenter is a stack tag CloudFormation copies onto every resource
+        stack_tags = common_tags(DEFAULT_ESTATE)
+        out = io.StringIO()
+        stream_estate(DEFAULT_ESTATE, out, stack_tags=stack_tags)
+        template = json.loads(out.getvalue())
+        tags = [{"Key": key, "Value": value} for key, value in stack_tags.items()]
+        self.backend.deploy("444455556666", REGION, template, tags)
+        self.assertEqual(self.check("444455556666", template).status, drift.IN_SYNC)
+
+        stack = self.backend.stacks["444455556666", REGION]
+        subnet = self.backend.subnets["444455556666", REGION][stack["Resources"]["devprivatesubnet1"]]
+        subnet["Tags"] = [t for t in subnet["Tags"] if t["Key"] != "CostCenter"]
+        found = self.drifts(self.check("444455556666", template))
+        self.assertEqual(found["devprivatesubnet1"].differences, [("Tags[CostCenter]", "12345", None)])
+
+    def test_compare_stack(self):
+        stack = self.backend.stacks[ACCOUNT, REGION]
+        live = {}
+        for resource_type, state in ((drift.VPC, self.backend.vpcs), (drift.SUBNET, self.backend.subnets),
+                                     (drift.ROUTE_TABLE, self.backend.route_tables)):
+            for physical, description in state[ACCOUNT, REGION].items():
+                live[physical] = (resource_type, description)
+        azs = ["%s%s" % (REGION, zone) for zone in self.backend.zones]
+        deployed = drift.Stack(stack["StackId"], REGION, stack["Resources"], azs)
+        drifts, checked, not_checked = drift.compare_stack(self.template, deployed, live)
+        self.assertEqual(drifts, [])
+        self.assertEqual(checked + not_checked, len(self.template["Resources"]))
+
+        # A different region's AZs put every subnet in the wrong place
+        moved = drift.Stack(stack["StackId"], REGION, stack["Resources"], ["us-east-1a", "us-east-1b"])
+        drifts, _, _ = drift.compare_stack(self.template, moved, live)
+        self.assertEqual({d.resource_type for d in drifts}, {drift.SUBNET})
+        self.assertTrue(all(d.differences[0][0] == "AvailabilityZone" for d in drifts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+##########################################################################################
+#  Parameterized single-template mode.                                                   #
+#                                                                                        #
+#  Resolving the template for one address plan has to give that plan's own template.   #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import dataclasses
+import io
+import json
+import unittest
+
+from cfvpc.api import render
+from cfvpc.batch import apply_overrides
+from cfvpc.parameterize import PLAN_MAPPING, PLAN_PARAMETER, plan_name, write_parameterized
+from cfvpc.spec import DEFAULT_ESTATE
+from cfvpc.validate import validate
+
+PLANS = {
+    "111122223333-eu-central-1": DEFAULT_ESTATE,
+    "444455556666-us-east-1": apply_overrides(
+        DEFAULT_ESTATE, {"CostCenter": "999"}, {"Prod": {"cidr": "10.20.0.0/18"}},
+    ),
+    "777788889999-eu-west-1": apply_overrides(DEFAULT_ESTATE, environments={"Stg": {"az_count": 3}}),
+}
+
+
+def parameterized(plans):
+    out = io.StringIO()
+    write_parameterized(plans, out)
+    return json.loads(out.getvalue())
+
+
+def resolve(template, plan, parameters=None):
+    """Resources of ``template`` as deployed with AddressPlan ``plan``."""
+    defaults = {name: p.get("Default") for name, p in template["Parameters"].items()}
+    parameters = dict(defaults, **dict(parameters or {}, **{PLAN_PARAMETER: plan}))
+
+    def value(v):
+        if isinstance(v, list):
+            return [value(item) for item in v]
+        if not isinstance(v, dict):
+            return v
+        if "Ref" in v and v["Ref"] in parameters:
+            return parameters[v["Ref"]]
+        if "Fn::FindInMap" in v:
+            mapping, key, name = value(v["Fn::FindInMap"])
+            return template["Mappings"][mapping][key][name]
+        if "Fn::If" in v:
+            name, yes, no = v["Fn::If"]
+            return value(yes if condition(template["Conditions"][name]) else no)
+        return {k: value(item) for k, item in v.items() if value(item) != {"Ref": "AWS::NoValue"}}
+
+    def condition(c):
+        if "Fn::Not" in c:
+            return not condition(c["Fn::Not"][0])
+        if "Fn::Equals" in c:
+            left, right = value(c["Fn::Equals"])
+            return str(left) == str(right)
+        if "Condition" in c:
+            return condition(template["Conditions"][c["Condition"]])
+        if "Fn::Or" in c:
+            return any(condition(item) for item in c["Fn::Or"])
+        raise AssertionError("unexpected condition %r" % c)
+
+    resources = {}
+    for title, resource in template["Resources"].items():
+        if "Condition" in resource and not condition(template["Conditions"][resource["Condition"]]):
+            continue
+        resource = {k: v for k, v in resource.items() if k != "Condition"}
+        resources[title] = value(resource)
+    return resources
+
+
+class ParameterizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.template = parameterized(PLANS)
+
+    def test_plans_resolve_to_their_template(self):
+        self.assertEqual(sorted(self.template["Mappings"][PLAN_MAPPING]), sorted(plan_name(p) for p in PLANS))
+        for name, estate in PLANS.items():
+            self.assertEqual(resolve(self.template, plan_name(name)), json.loads(render(estate))["Resources"], name)
+
+    def test_tag_parameter(self):
+        resources = resolve(self.template, plan_name("111122223333-eu-central-1"), {"CostCenter": "42"})
+        tags = {
+            tag["Value"] for r in resources.values() for tag in r["Properties"].get("Tags", ())
+            if tag["Key"] == "CostCenter"
+        }
+        self.assertEqual(tags, {"42"})
+
+    def test_valid(self):
+        self.assertEqual(validate(self.template), [])
+
+    def test_layout_must_match(self):
+        other = apply_overrides(DEFAULT_ESTATE, environments={"Prod": {"tiers": ["public", "protected"]}})
+        with self.assertRaises(ValueError):
+            parameterized({"a": DEFAULT_ESTATE, "b": other})
+        fewer = dataclasses.replace(DEFAULT_ESTATE, environments=DEFAULT_ESTATE.environments[:2])
+        with self.assertRaises(ValueError):
+            parameterized({"a": DEFAULT_ESTATE, "b": fewer})
+
+
+if __name__ == "__main__":
+    unittest.main()
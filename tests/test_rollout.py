@@ -0,0 +1,66 @@
+##########################################################################################
+#  Rolling a cfvpc.diff plan out to the in-process stack set backend.                   #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+
+from cfvpc import rollout
+from cfvpc.diff import address_plan
+
+FAST = rollout.Backoff(initial=0.005, maximum=0.005)
+
+
+def target(account, region="eu-central-1", **entry):
+    return dict(entry, account=account, region=region)
+
+
+class RolloutPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = rollout.FakeBackend(latency=lambda account, region: 0.001)
+        asyncio.run(rollout.rollout(self.backend, "Vpc", ["111", "222", "333"], ["eu-central-1"], backoff=FAST))
+
+    def run_plan(self, plan):
+        return asyncio.run(rollout.rollout_plan(self.backend, "Vpc", plan, "{}", backoff=FAST))
+
+    def test_plan_groups(self):
+        plan = {
+            "create": [target("444", parameters=address_plan("444", "eu-central-1"))],
+            "update": [target("111")],
+            "delete": [target("222"), target("333")],
+        }
+        self.assertEqual([(op, accounts) for op, accounts, _, _ in rollout.plan_groups(plan)], [
+            ("update", ["111"]), ("create", ["444"]), ("delete", ["222", "333"]),
+        ])
+
+    def test_delete(self):
+        reports = self.run_plan({"create": [], "update": [target("111")], "delete": [target("333")]})
+        self.assertEqual([r.operation for r in reports], ["update", "delete"])
+        self.assertFalse(any(r.aborted for r in reports))
+        self.assertEqual(sorted(a for _, a, _ in self.backend.instances), ["111", "222"])
+        self.assertEqual(self.backend.templates["Vpc"], "{}")
+
+    def test_create_only(self):
+        parameters = address_plan("444", "eu-central-1")
+        reports = self.run_plan({"create": [target("444", parameters=parameters)]})
+        self.assertEqual([(r.operation, len(r.instances)) for r in reports], [("update", 3), ("create", 1)])
+        self.assertEqual(self.backend.instances["Vpc", "444", "eu-central-1"], parameters)
+
+    def test_refused_without_delete(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump({"delete": [target("333")]}, f)
+            f.flush()
+            argv = ["--stack-set", "Vpc", "--plan", f.name, "--template", "https://example.com/t.json", "--fake"]
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                rollout.main(argv)
+
+
+if __name__ == "__main__":
+    unittest.main()
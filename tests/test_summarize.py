@@ -0,0 +1,110 @@
+##########################################################################################
+#  Reachability rules compiled into summarized routes and network ACLs.                  #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import dataclasses
+import json
+import unittest
+
+from cfvpc.api import render
+from cfvpc.groups import group_specs, tier_policies
+from cfvpc.spec import Estate, EnvironmentSpec, TransitGatewaySpec
+from cfvpc.summarize import compile_reachability, report, summarize
+
+ESTATE = Estate(
+    environments=(
+        EnvironmentSpec(name="Dev", cidr="10.0.0.0/24"),
+        EnvironmentSpec(name="Stg", cidr="10.1.0.0/18"),
+        EnvironmentSpec(name="Prod", cidr="10.2.0.0/18"),
+        EnvironmentSpec(name="Ops", cidr="10.3.0.0/18", tiers=("public", "protected")),
+    ),
+    transit_gateway=TransitGatewaySpec(),
+    reachability=(("Dev.private", "Stg"), ("Dev.private", "Prod.private"), ("Ops", "Stg.protected")),
+)
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def test_summarize(self):
+        self.assertEqual(summarize(["10.0.1.0/24", "10.0.0.0/24", "10.0.0.128/25", "10.0.3.0/24"]), [
+            "10.0.0.0/23", "10.0.3.0/24",
+        ])
+        # Exactly the blocks given, never a supernet reaching past them
+        self.assertEqual(summarize(["10.0.0.0/24", "10.2.0.0/24"]), ["10.0.0.0/24", "10.2.0.0/24"])
+
+
+class ReachabilityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policies = compile_reachability(ESTATE)
+
+    def test_routes(self):
+        self.assertEqual(sorted((name, tier) for name, tiers in self.policies.items() for tier in tiers), [
+            ("Dev", "private"), ("Ops", "protected"), ("Ops", "public"), ("Prod", "private"),
+            ("Stg", "private"), ("Stg", "protected"), ("Stg", "public"),
+        ])
+        # All of Stg plus Prod's private subnets, as three blocks
+        self.assertEqual(self.policies["Dev"]["private"].routes, ["10.1.0.0/19", "10.1.32.0/20", "10.2.0.0/20"])
+        self.assertEqual(self.policies["Stg"]["protected"].routes, ["10.0.0.0/26", "10.3.0.0/18"])
+
+    def test_acl(self):
+        private = [entry[1:3] for entry in self.policies["Prod"]["private"].acl]
+        self.assertEqual(private, [["allow", "10.2.0.0/18"], ["allow", "10.0.0.0/26"]])
+        protected = self.policies["Ops"]["protected"].acl
+        self.assertEqual([entry[0] for entry in protected], list(range(100, 170, 10)))
+        self.assertEqual([entry[1:3] for entry in protected[:5]], [
+            ["allow", "10.3.0.0/18"], ["allow", "10.1.32.0/20"],
+            ["deny", "10.0.0.0/24"], ["deny", "10.1.0.0/18"], ["deny", "10.2.0.0/18"],
+        ])
+        self.assertEqual([entry[3:] for entry in protected[5:]], [[6, [1024, 65535]], [17, [1024, 65535]]])
+        self.assertEqual(self.policies["Ops"]["public"].acl[-1][1:], ["allow", "0.0.0.0/0", -1, None])
+
+    def test_ipv6(self):
+        dual = dataclasses.replace(ESTATE, environments=(
+            ESTATE.environments[:3] + (dataclasses.replace(ESTATE.environments[3], ipv6=True),)
+        ))
+        policy = compile_reachability(dual)["Ops"]["protected"]
+        self.assertEqual([entry[:3] for entry in policy.acl_ipv6], [
+            [170, "allow", None], [180, "allow", "::/0"], [190, "allow", "::/0"],
+        ])
+
+    def test_report(self):
+        rows = {(row["environment"], row["tier"]): row for row in report(ESTATE)["tiers"]}
+        self.assertEqual((rows["Dev", "private"]["routes_before"], rows["Dev", "private"]["routes_after"]), (8, 3))
+        self.assertEqual((rows["Stg", "protected"]["acl_before"], rows["Stg", "protected"]["acl_after"]), (12, 8))
+
+    def test_errors(self):
+        for rules in ((("Dev", "Nope"),), (("Dev.nope", "Stg"),), (("Dev", "Stg", "Prod"),)):
+            with self.assertRaises(ValueError):
+                compile_reachability(dataclasses.replace(ESTATE, reachability=rules))
+        with self.assertRaises(ValueError):
+            compile_reachability(dataclasses.replace(ESTATE, transit_gateway=None))
+
+    def test_policies(self):
+        # None: no rules, every hub route; {}: left out by the rules, no hub routes
+        self.assertEqual(tier_policies(dataclasses.replace(ESTATE, reachability=()))["Ops"], None)
+        self.assertEqual(tier_policies(dataclasses.replace(ESTATE, reachability=(("Dev", "Stg"),)))["Ops"], {})
+        specs = [
+            group_specs(dataclasses.replace(ESTATE, reachability=rules))["Ops"]
+            for rules in ((), (("Dev", "Stg"),))
+        ]
+        self.assertNotEqual(specs[0], specs[1])
+
+    def test_template(self):
+        resources = json.loads(render(ESTATE))["Resources"]
+        routes = sorted(
+            r["Properties"]["DestinationCidrBlock"] for r in resources.values()
+            if r["Type"] == "AWS::EC2::Route" and r["Properties"]["RouteTableId"] == {"Ref": "DevPrivateRouteTable"}
+            and "TransitGatewayId" in r["Properties"]
+        )
+        self.assertEqual(routes, ["10.1.0.0/19", "10.1.32.0/20", "10.2.0.0/20"])
+        entries = [r for r in resources.values() if r["Type"] == "AWS::EC2::NetworkAclEntry"]
+        self.assertEqual(len(entries), sum(
+            len(policy.acl) + 1 for tiers in self.policies.values() for policy in tiers.values()
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
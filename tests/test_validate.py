@@ -0,0 +1,63 @@
+##########################################################################################
+#  Offline validation of generated templates, as JSON and as the builder's IR records.  #
+#                                                                                        #
+#  Usage: python3 -m unittest discover tests                                            #
+##########################################################################################
+
+import json
+import unittest
+
+from cfvpc import ir
+from cfvpc.api import render
+from cfvpc.builder import Subnet, VPC, estate_groups
+from cfvpc.spec import DEFAULT_ESTATE
+from cfvpc.validate import validate
+
+
+def records(estate):
+    return [resource for _, group in estate_groups(estate) for resource in group]
+
+
+def found(problems):
+    return sorted((p.check, p.logical_id) for p in problems)
+
+
+BROKEN = [
+    VPC("Vpc", CidrBlock="10.0.0.0/24"),
+    Subnet("Inside", CidrBlock="10.0.0.0/25", VpcId=ir.ref("Vpc")),
+    Subnet("Outside", CidrBlock="10.9.0.0/25", VpcId=ir.ref("Vpc")),
+    Subnet("Dangling", CidrBlock="10.0.0.128/25", VpcId=ir.ref("Missing"), DependsOn=["Vpc"]),
+    Subnet("Inside", CidrBlock="10.0.0.128/26", VpcId=ir.ref("Vpc")),
+    ir.Resource("NoVpc", "AWS::EC2::Subnet", {"CidrBlock": "10.0.0.192/26"}),
+]
+
+
+class ValidateTest(unittest.TestCase):
+
+    def test_generated(self):
+        self.assertEqual(validate(json.loads(render(DEFAULT_ESTATE))), [])
+        self.assertEqual(validate(records(DEFAULT_ESTATE)), [])
+
+    def test_records(self):
+        self.assertEqual(found(validate(BROKEN)), [
+            ("cidr", "Outside"),
+            ("duplicate", "Inside"),
+            ("property", "NoVpc"),
+            ("reference", "Dangling"),
+        ])
+
+    def test_records_match_json(self):
+        unique = {r.title: r for r in BROKEN}.values()
+        template = {"Resources": {r.title: r.to_dict() for r in unique}}
+        self.assertEqual(found(validate(unique)), found(validate(template)))
+
+    def test_cycle(self):
+        a = Subnet("A", CidrBlock=ir.get_att("B", "CidrBlock"), VpcId=ir.ref("Vpc"))
+        b = Subnet("B", CidrBlock="10.0.0.0/25", VpcId=ir.ref("Vpc"), DependsOn="A")
+        self.assertEqual(found(validate([VPC("Vpc", CidrBlock="10.0.0.0/24"), a, b])), [
+            ("cycle", "A"), ("cycle", "B"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()